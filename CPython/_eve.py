@@ -5,18 +5,27 @@
 import struct
 
 class _EVE:
+    # Bytes of commands sent by one write, sized by register() after the host
+    buffer_len = 512
 
     def cc(self, s):
         assert (len(s) % 4) == 0
         self.buf += s
-        while len(self.buf) > 512:
-            self.write(self.buf[:512])
-            self.buf = self.buf[512:]
+        buffer_len = self.buffer_len
+        while len(self.buf) > buffer_len:
+            self.write(self.buf[:buffer_len])
+            self.buf = self.buf[buffer_len:]
 
     def register(self, sub):
         self.buf = b''
         getattr(sub, 'write') # Confirm that there is a write method
 
+        # BrtEveModule.setup_transfer_size() sizes buffer_len from the transfer
+        # capabilities of the host, up to half the command FIFO (FIFO_MAX // 2)
+        setup_transfer_size = getattr(sub, 'setup_transfer_size', None)
+        if setup_transfer_size is not None:
+            setup_transfer_size()
+
     def flush(self):
         self.write(self.buf)
         self.buf = b''
@@ -27,8 +27,16 @@ def spilock(f):
     return wrapper
 
 class Brt_PicoEve_Module(Brt_Eve_Module):
+    # Transfer capabilities, read by BrtEveModule.setup_transfer_size() to size the transfers
+    # spidev rejects transfers bigger than its bufsiz parameter, 4096 by default
+    max_transfer_size = 4096
+    max_read_size = 4096
+    transfer_alignment = 4
+
     def __init__(self):
         Brt_Eve_Module.__init__(self)
+        # This module is its own host: it declares the transfer capabilities and transfer()
+        self.host = self
         mach = os.uname().machine
         # FIXME: Impvove the handling here
         if mach == 'armv7l':
@@ -37,22 +45,22 @@ class Brt_PicoEve_Module(Brt_Eve_Module):
             print("Unknown arch, assuming this is still a Raspberry  Pi")
             self.sp = busio.SPI(board.SCLK, MOSI=board.MOSI, MISO=board.MISO)  #SPI for Eve
 
-		#cs of SPI for Eve - seems we need to use CE1 - https://github.com/adafruit/Adafruit_Blinka/issues/329
+        #cs of SPI for Eve - seems we need to use CE1 - https://github.com/adafruit/Adafruit_Blinka/issues/329
         self.cs = self.pin(board.CE1) #cs of SPI for Eve
         self.pdn = self.pin(board.D26) #power down pin of Eve
-		
+
         #self.cs_ili9488 = self.pin(board.GP9) #CSX pin of ILI9488
-        #self.dcx_ili9488 = self.pin(board.GP8) #D/CX pin of ILI9488      
-        
+        #self.dcx_ili9488 = self.pin(board.GP8) #D/CX pin of ILI9488
+
         #self.sdcs = board.GP13 #cs of SPI for SD card
-		
+
         #if not self.setup_sd(self.sdcs):
         #    self.pin(self.sdcs)
-		
-		#configure SPI for Eve
+
+        #configure SPI for Eve
         self.setup_spi()
-		# A delay is required for raspberry pi
-		time.sleep(2)
+        # A delay is required for raspberry pi
+        time.sleep(2)
 
     def pin(self,p):
         r = digitalio.DigitalInOut(p)
@@ -0,0 +1,43 @@
+# Measure SPI transfer throughput of the CPython/spidev host
+# Copy it beside the files of this folder, in the bteve directory's parent, then run:
+#   python3 transfer-benchmark.py
+
+import time
+from bteve.brt_picoEve_module import Brt_PicoEve_Module
+
+RAM_G = 0
+TOTAL = 64 * 1024
+
+eve = Brt_PicoEve_Module()
+eve.init(resolution="1280x800")
+
+def report(name, size, duration):
+    print("%-24s %6d bytes in %.3f s: %.1f KB/s"
+        % (name, size, duration, size / 1024 / duration))
+
+# 3 address bytes go with each write, 1 dummy byte with each read
+write_chunk = eve.max_transfer_size - 3
+write_chunk -= write_chunk % eve.transfer_alignment
+read_chunk = eve.max_read_size - 1
+read_chunk -= read_chunk % eve.transfer_alignment
+print("write_chunk=%d read_chunk=%d buffer_len=%d" % (write_chunk, read_chunk, eve.buffer_len))
+
+data = bytes(range(256)) * (TOTAL // 256)
+for chunk in (256, 1024, write_chunk):
+    start = time.monotonic()
+    for offset in range(0, TOTAL, chunk):
+        eve.wr(RAM_G + offset, data[offset:offset + chunk])
+    report("write %d" % chunk, TOTAL, time.monotonic() - start)
+
+start = time.monotonic()
+readback = b''
+for offset in range(0, TOTAL, read_chunk):
+    readback += eve.rd(RAM_G + offset, min(read_chunk, TOTAL - offset))
+report("read %d" % read_chunk, TOTAL, time.monotonic() - start)
+print("readback", "ok" if readback == data else "MISMATCH")
+
+start = time.monotonic()
+for i in range(TOTAL // 8):
+    eve.cmd_memset(RAM_G, i & 0xff, 4)
+eve.finish()
+report("command buffer", TOTAL // 8 * 16, time.monotonic() - start)
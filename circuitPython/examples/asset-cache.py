@@ -0,0 +1,39 @@
+""" Draw bitmaps from flash through the RAM_G asset cache, and count its hits and misses
+    Uses the screensaver frames of the ev-charge-point flash image. The first draw of a
+    frame reads it from flash, later draws only set the bitmap up. Drawing more frames in
+    turn than the budget holds evicts the least recently used one on every draw.
+"""
+from brteve.brt_eve_bt817_8 import BrtEve
+from brteve.brt_eve_rp2040 import BrtEveRP2040
+from brteve.brt_eve_asset_cache import BrtEveAssetCache
+
+host = BrtEveRP2040()
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+eve.storage.flash_state(eve.FLASH_STATUS_FULL)
+
+FRAME_SIZE = 163840
+FRAMES = [{'addr':814208 + i * FRAME_SIZE, 'size':FRAME_SIZE, 'format':eve.ASTC_10x10,
+           'width':1280, 'height':800} for i in range(4)]
+
+cache = BrtEveAssetCache(eve, budget=3 * FRAME_SIZE)
+
+def draw(frames, count):
+    """ Draw the frames in turn, count times"""
+    for i in range(count):
+        eve.cmd_dlstart()
+        eve.Clear(1, 1, 1)
+        eve.BitmapHandle(1)
+        cache.setbitmap(frames[i % len(frames)])
+        eve.Begin(eve.BITMAPS)
+        eve.Vertex2f(0, 0)
+        eve.End()
+        eve.Display()
+        eve.cmd_swap()
+        eve.finish()
+    print(cache.stats())
+
+# 3 misses, then hits only: no flash traffic
+draw(FRAMES[:3], 30)
+# 4 frames in turn with room for 3: every draw misses and evicts a frame
+draw(FRAMES, 8)
@@ -18,9 +18,8 @@ class audio_playback():
         self.eve = eve
         self.ui = ui(eve)
 
-        fifo_start = 1024*512
         fifo_len = 1024*16
-        self.audio_eve = audio_eve(eve, fifo_start, fifo_len)
+        self.audio_eve = audio_eve(eve, fifo_len)
         self.helper_gesture = helper_gesture(eve)
 
         self.next_command = 0
@@ -34,6 +33,7 @@ class audio_playback():
 
         self.time_interrupt = 0
         self.file_size = 0
+        self.seek_fraction = None
 
         self.vol = 10
         self.last_angle_volume = 0
@@ -48,45 +48,10 @@ class audio_playback():
         self.ui.file_list(self.files)
         while 1: self.event()
     
-    def fifo_interrupt(self, byte_num):
-        ges = self.helper_gesture.renew()
-        tag = ges.tagReleased
-
-        ms = time.monotonic_ns() / 1000_000
-        refresh = 0
-        if ms - self.time_interrupt > 1000:
-            self.time_interrupt = ms
-            percent = byte_num * 100 / self.file_size
-            self.ui.progress((int)(percent))
-            refresh = 1
-
-        if tag == tag_play: # play/pause is same button
-            self.play_pause()
-        elif tag == tag_stop: 
-            self.stop()
-        elif tag == tag_loop: 
-            self.set_loop()
-        elif tag == tag_next:
-            self.stop() #this exit the blocking playback
-            self.next_command = self.next_file
-        elif tag == tag_prev: 
-            self.stop() #this exit the blocking playback
-            self.next_command = self.prev_file
-        elif tag == tag_random: 
-            self.set_random()
-
-        if ges.tagPressed == tag_volume: 
-            self.set_volume()
-
-        if ges.tagReleased != 0 or ges.tagPressed == tag_volume or refresh == 1 or ges.tagPressed == tag_filelist:
-            file_selected_id = self.ui.file_selected
-            if file_selected_id > -1:
-                self.file_selected_id = file_selected_id
-                self.stop() #this exit the blocking playback
-                self.next_command = self.select_file
-            self.ui.render()
-
     def event(self):
+        # Refill the playback ring when it runs low, then draw the UI
+        self.audio_eve.service()
+        self.update_progress()
         self.ui.render()
         
         eve = self.eve
@@ -94,7 +59,6 @@ class audio_playback():
         tag = ges.tagReleased
 
         if tag == tag_play: # play/pause is same button
-            # blocking function
             self.play_pause()        
         elif tag == tag_stop: 
             self.stop()
@@ -110,6 +74,12 @@ class audio_playback():
         if ges.tagPressed == tag_volume: 
             self.set_volume()
 
+        if ges.tagPressed == tag_seek:
+            self.scrub()
+        elif tag == tag_seek and self.seek_fraction is not None:
+            self.jump_to(self.seek_fraction * self.audio_eve.duration())
+            self.seek_fraction = None
+
         file_selected_id = self.ui.file_selected
         is_playing_end = self.audio_eve.is_end
 
@@ -134,9 +104,18 @@ class audio_playback():
             if self.loop == 2:
                 self.next_file()
 
+    def update_progress(self):
+        if not self.audio_eve.is_playing() or self.file_size == 0 or self.seek_fraction is not None:
+            return
+        ms = time.monotonic_ns() / 1000_000
+        if ms - self.time_interrupt > 1000:
+            self.time_interrupt = ms
+            percent = self.audio_eve.position() * 100 / self.file_size
+            self.ui.progress((int)(percent))
+
     def scan_file(self, path):
         for f in os.listdir(path):
-            if '.raw' in f:
+            if f.endswith('.raw'):
                 self.files.append(f)
 
     def play_pause(self):
@@ -151,10 +130,8 @@ class audio_playback():
                 self.file_size = file_handler.tell()
                 file_handler.seek(0, SEEK_SET)
 
-        #self.ui.render()
-        # this is a blocking function, use callback function (fifo_interrupt) to check playback status
-        self.audio_eve.play(self.fifo_interrupt, 
-            self.media_location +'/'+ self.files[self.file_selected_id],
+        # returns at once, event() keeps the playback going
+        self.audio_eve.play(self.media_location +'/'+ self.files[self.file_selected_id],
             44100, self.eve.LINEAR_SAMPLES);
 
     def stop(self):
@@ -237,15 +214,23 @@ class audio_playback():
             self.last_angle_volume = 0
         
     def jump_to(self, time):
-        print("Function is not implemented")
-        pass
+        self.audio_eve.jump_to(time)
+        self.time_interrupt = 0 # show the new position at once
+        self.update_progress()
 
-    def fast_forward(self, file):
-        print("Function is not implemented")
-        pass
+    def fast_forward(self):
+        self.audio_eve.fast_forward()
+        self.time_interrupt = 0
+        self.update_progress()
 
-    def fast_backward(self, file):
-        print("Function is not implemented")
-        pass
+    def fast_backward(self):
+        self.audio_eve.fast_backward()
+        self.time_interrupt = 0
+        self.update_progress()
 
-        
\ No newline at end of file
+    def scrub(self):
+        # Follow the finger on the progress bar, seek once released
+        track = self.helper_gesture.get().tagTrackTouched
+        if track & 0xFF == tag_seek:
+            self.seek_fraction = (track >> 16) / 65535
+            self.ui.progress((int)(self.seek_fraction * 100))
@@ -1,5 +1,6 @@
 import time
 from brteve.brt_eve_bt817_8 import BrtEve
+from brteve.brt_eve_asset_cache import BrtEveAssetCache
 
 # Configuration
 USE_COCMD_SETBITMAP = 1
@@ -59,6 +60,11 @@ class helper_image():
         self.misRotate = 0
         self.misScale = 0
 
+        # Images copied to RAM_G by image_copy_to_ramg, read from flash once
+        self.cache = BrtEveAssetCache(eve)
+        # RAM_G of the images decoded from a file by image_draw
+        self.file_block = None
+
     def getformatW(self, format):
         if format == self.eve.ASTC_4x4  :
             return 4
@@ -194,30 +200,15 @@ class helper_image():
         self.misRotate = 0
 
     def image_copy_to_ramg(self, img: _image, isRestart) :
-        ramgAddr = self.eve.RAM_G
-
-        if (isRestart == 1) :
-            ramgAddr = 0
-
+        # The cache places the image in RAM_G, and reads it from flash on a miss only.
+        # isRestart is kept for the callers: the cache evicts the least recently used images.
         img.isFlash = 0
-        img.addressRamg = ramgAddr
-        self.eve.cmd_flashread(ramgAddr, img.addressFlash, img.size)
-        ramgAddr += img.size
+        img.addressRamg = self.cache.load(img.addressFlash, img.size)
         return 1
 
     def image_copy_to_ramg_and_draw_image(self, img: _image, isRestart) :
-        ramgAddr = self.eve.RAM_G
-
-        if (isRestart == 1) :
-            ramgAddr = 0
-
-        img.isFlash = 0
-        img.addressRamg = ramgAddr
-
-        self.eve.cmd_flashread(ramgAddr, img.addressFlash, img.size)
+        self.image_copy_to_ramg(img, isRestart)
         self.image_draw(img)
-
-        ramgAddr += img.size
         return 1
 
     def image_draw(self, img: _image) :
@@ -225,7 +216,13 @@ class helper_image():
 
         if not img.file_location == '':
 
-            self.eve.cmd_loadimage(0, img.opt)
+            # Decoded to 2 bytes per pixel at most, such as RGB565 or ARGB4
+            size = int(img.w * img.h * 2)
+            if self.file_block is None or self.file_block.size < size:
+                if self.file_block is not None:
+                    self.eve.ramg.free(self.file_block)
+                self.file_block = self.eve.ramg.alloc(size, name="image file")
+            self.eve.cmd_loadimage(self.file_block.addr, img.opt)
             file_handler = open(img.file_location, "rb")
             self.eve.load(file_handler)
             file_handler.close()
@@ -8,4 +8,5 @@ tag_loop      = _cout ; _cout = _cout + 1
 tag_next      = _cout ; _cout = _cout + 1
 tag_prev      = _cout ; _cout = _cout + 1
 tag_filelist  = _cout ; _cout = _cout + 1
+tag_seek      = _cout ; _cout = _cout + 1
 tag_          = _cout ; _cout = _cout + 1
\ No newline at end of file
@@ -77,7 +77,10 @@ class ui():
             self.images[img][4] = count
             count+=1
 
-        eve.cmd_flashread(0, 4096, eve.RAM_G_SIZE)
+        # The images sit at the start of RAM_G, keep them out of eve.ramg
+        ramg_size = max(img[0] + img[1] for img in self.images.values())
+        self.ramg_block = eve.ramg.reserve(0, ramg_size, name="ui images")
+        eve.cmd_flashread(0, 4096, ramg_size)
         eve.finish()
 
         self.render()
@@ -175,8 +178,12 @@ class ui():
         if self.play_icon != 'pause_36x28':
             return
 
-        eve.cmd_progress(x, self.file_list_box_h + 20 + _margin,
-            500, _scroller_h, 0, (int)(self.percent), 100)
+        y = self.file_list_box_h + 20 + _margin
+        # drag on the progress bar to seek
+        eve.cmd_track(x, y, box_w, _scroller_h, tag_seek)
+        eve.Tag(tag_seek)
+        eve.cmd_progress(x, y, box_w, _scroller_h, 0, (int)(self.percent), 100)
+        eve.Tag(0)
 
     def render_volume(self):
         eve = self.eve
@@ -33,6 +33,10 @@ SS_FRAME_COUNT         = (97) # 16Mb Flash
 SS_FRAME_SIZE          = (163840)
 SS_FLASH_ADDR_FRAME_0  = (814208)
 
+# Fonts and images, copied to RAM_G at 0 on start
+UI_FLASH_ADDR          = (4096)
+UI_SIZE                = (SS_FLASH_ADDR_FRAME_0 - UI_FLASH_ADDR)
+
 # Choose language
 CIRCLE_NUM             = (3)
 
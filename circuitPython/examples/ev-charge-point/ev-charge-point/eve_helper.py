@@ -1,5 +1,6 @@
 import time
 from brteve.brt_eve_bt817_8 import BrtEve
+from brteve.brt_eve_asset_cache import BrtEveAssetCache
 
 EVE_CMD_FIFO_SIZE = ((4) * 1024)
 EVE_CMD_FIFO_MASK = (EVE_CMD_FIFO_SIZE - 1)
@@ -8,6 +9,8 @@ class eve_helper():
     RAM_G_SIZE = (1024*1024)
     def __init__(self, eve: BrtEve):
         self.eve = eve
+        # Bitmaps drawn from flash, read from flash on their first draw only
+        self.cache = BrtEveAssetCache(eve)
 
         self.VertextFormat=4
         self.VertextPrecision=16
@@ -76,5 +79,10 @@ class eve_helper():
         self.eve.End()
         self.eve.Tag(0)
 
+    def setbitmap_from_flash(self, addr, size, format, width, height):
+        # Bitmap setup of the current handle, with the data copied to RAM_G on a cache miss
+        self.cache.setbitmap({'addr':addr, 'size':size, 'format':format,
+            'width':width, 'height':height})
+
     def current_milli_time(self):
         return round(time.time() * 1000)
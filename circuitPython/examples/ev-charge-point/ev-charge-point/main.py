@@ -4,6 +4,7 @@ from brteve.brt_eve_bt817_8 import BrtEve
 
 from .eve_helper import eve_helper
 from . import language
+from . import common
 
 from .page_screensaver  import page_screensaver
 from .page_language     import page_language
@@ -78,7 +79,9 @@ class demo_evchargepoint:
 
         helper.set_precision(3) # for 1280x800 big screen
         helper.flash_switch_fullmode()
-        eve.cmd_flashread(0, 4096, helper.RAM_G_SIZE)
+        # The rest of RAM_G is left to the asset cache, for the screensaver frames
+        eve.ramg.reserve(0, common.UI_SIZE, name="ui assets")
+        eve.cmd_flashread(0, common.UI_FLASH_ADDR, common.UI_SIZE)
 
         print("System clock=", self.Get_SystemClock())
 
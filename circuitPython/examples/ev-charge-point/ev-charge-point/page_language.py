@@ -80,8 +80,6 @@ class page_language():
         if self.event() == 0:
             return 0 #drawing ends
 
-        self.eve.cmd_flashread(helper.RAM_G_SIZE - common.SS_FRAME_SIZE,
-            self.frame_addr, common.SS_FRAME_SIZE)
         self.eve.cmd_setfont2(common.HF_TITLE, lan.FontTitle["xf_addr"]
             - lan.FontBegin["xf_addr"], 0)
         self.eve.cmd_setfont2(common.HF_LANG_CN, lan.FontLangCH["xf_addr"]
@@ -89,7 +87,7 @@ class page_language():
 
         self.eve.ColorA(85)
         self.eve.BitmapHandle(1)
-        self.eve.cmd_setbitmap(helper.RAM_G_SIZE - common.SS_FRAME_SIZE,
+        helper.setbitmap_from_flash(self.frame_addr, common.SS_FRAME_SIZE,
             self.eve.ASTC_10x10, common.SCREEN_WIDTH, common.SCREEN_HEIGHT)
         self.eve.Begin(eve.BITMAPS)
         self.eve.Vertex2f(0, 0)
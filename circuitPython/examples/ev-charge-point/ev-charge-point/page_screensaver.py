@@ -43,9 +43,6 @@ class page_screensaver():
 
         lan=self.lan
 
-        self.eve.cmd_flashread(self.helper.RAM_G_SIZE - common.SS_FRAME_SIZE,
-            self.frame_addr, common.SS_FRAME_SIZE)
-
         if lan.lan_active == lan.lan_cn:
             self.eve.cmd_setfont2(common.HF_BOTTOM, lan.FontBottomCH["xf_addr"]
                 - lan.FontBegin["xf_addr"], 0)
@@ -54,7 +51,7 @@ class page_screensaver():
                 - lan.FontBegin["xf_addr"], 0)
 
         self.eve.BitmapHandle(0)
-        self.eve.cmd_setbitmap(self.helper.RAM_G_SIZE - common.SS_FRAME_SIZE,
+        self.helper.setbitmap_from_flash(self.frame_addr, common.SS_FRAME_SIZE,
             self.eve.ASTC_10x10, common.SCREEN_WIDTH, common.SCREEN_HEIGHT)
         self.eve.Tag(common.SS_TAG)
         self.eve.Begin(self.eve.BITMAPS)
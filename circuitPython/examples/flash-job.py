@@ -0,0 +1,38 @@
+""" Program an image to flash in the background while the UI stays live
+    The journal lets the job resume after a power loss, without rewriting what is done.
+"""
+import time
+from brteve.brt_eve_bt817_8 import BrtEve
+from brteve.brt_eve_rp2040 import BrtEveRP2040
+
+host = BrtEveRP2040()
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+
+FILE = "/sd/BT81X_Flash.bin"
+JOURNAL = "/sd/flash.journal"
+
+def report(job):
+    """ Rate limited by the job, every 0.5 s"""
+    print("Programmed %d%%" % job.percent())
+
+job = eve.storage.flash_job(FILE, 0, journal=JOURNAL, on_progress=report)
+angle = 0
+while job.step(0.02):
+    # The UI keeps running while the flash is programmed
+    eve.cmd_dlstart()
+    eve.ClearColorRGB(0, 0, 0)
+    eve.Clear(1, 1, 1)
+    eve.cmd_text(eve.lcd_width // 2, eve.lcd_height // 2 - 80, 30, eve.OPT_CENTER,
+                 "Updating assets")
+    eve.cmd_progress(eve.lcd_width // 4, eve.lcd_height // 2, eve.lcd_width // 2, 30, 0,
+                     job.percent(), 100)
+    eve.cmd_clock(eve.lcd_width // 2, eve.lcd_height // 2 + 150, 60, eve.OPT_NOBACK,
+                  0, 0, angle // 60, angle % 60)
+    eve.Display()
+    eve.cmd_swap()
+    eve.flush()
+    angle = (angle + 1) % 3600
+
+print("Done" if job.done() else "Failed", "resumed from", job.resumed_from)
+time.sleep(1)
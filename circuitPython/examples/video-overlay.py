@@ -0,0 +1,31 @@
+""" Play a video with a UI drawn over it
+    Frames are decoded to RAM_G by cmd_videoframe and drawn by the display list,
+    so the application keeps drawing and reading touch during playback.
+"""
+from brteve.brt_eve_bt817_8 import BrtEve
+from brteve.brt_eve_rp2040 import BrtEveRP2040
+
+host = BrtEveRP2040()
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+
+mp = eve.movie_player("/sd/car-1500.avi")
+mp.start(compose=True, fps=30)
+while mp.service(5):
+    if not mp.new_frame:
+        continue
+    eve.cmd_dlstart()
+    eve.ClearColorRGB(0, 0, 0)
+    eve.Clear(1, 1, 1)
+    mp.draw_frame((eve.lcd_width - mp.video_width) // 2, (eve.lcd_height - mp.video_height) // 2)
+
+    eve.Tag(1)
+    eve.cmd_button(eve.lcd_width - 220, eve.lcd_height - 100, 200, 80, 30, 0, "Stop")
+    eve.cmd_text(20, 20, 30, 0, "Frame %d" % mp.video_frames)
+    eve.Display()
+    eve.cmd_swap()
+    eve.flush()
+
+    if eve.rd8(eve.REG_TOUCH_TAG) == 1:
+        break
+mp.stop()
@@ -6,12 +6,14 @@
 import struct
 
 class _EVE:
+    # On Circuitpython's _EVE built-in class, this buffer is 512 bytes
+    # BrtEveModule sizes it from the host's max_transfer_size, see setup_transfer_size()
+    buffer_len = 4096 - 8
+
     def cc(self, s):
         assert (len(s) % 4) == 0
         self.buf += s
-        # On Telemetrix, buffer len = 30, so buffer len can up to 28, included 4 bytes command header
-        # On Circuitpython's _EVE built-in class, this buffer is 512 bytes
-        buffer_len=4096-8 # 7 bytes header: 0xee, size_msb, size_lsb, command, port, size_msb, size_lsb
+        buffer_len = self.buffer_len
         while len(self.buf) > buffer_len:
             self.write(self.buf[:buffer_len])
             self.buf = self.buf[buffer_len:]
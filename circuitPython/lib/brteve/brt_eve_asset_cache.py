@@ -0,0 +1,110 @@
+""" RAM_G cache of flash-resident assets
+    Bitmaps drawn from flash data are copied to RAM_G by cmd_flashread on the first
+    draw only. Later draws emit the bitmap setup commands, with no flash traffic:
+
+        cache = BrtEveAssetCache(eve, budget=256 * 1024)
+        eve.BitmapHandle(1)
+        cache.setbitmap(eve.storage.asset("car"))
+        eve.Begin(eve.BITMAPS)
+        ...
+
+    The least recently used assets are evicted when the byte budget, or RAM_G, is full.
+    An evicted asset may still be on screen: keep the budget above what one frame draws.
+    Flash must be in full mode.
+"""
+from collections import OrderedDict
+
+class BrtEveAssetCache():
+    """ LRU cache of flash data in RAM_G blocks of eve.ramg, keyed by flash address and size"""
+
+    def __init__(self, eve, budget=256 * 1024):
+        """ Create an empty cache
+            :param eve: BrtEve object
+            :param budget: Maximum number of RAM_G bytes used by the cache
+        """
+        self.eve = eve
+        self.budget = budget
+        self.used = 0
+        self.entries = OrderedDict() # (flash address, size): RAM_G block, oldest first
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+
+    def _evict_oldest(self):
+        """ Free the least recently used asset
+            :return: False if the cache is empty
+        """
+        if not self.entries:
+            return False
+        key = next(iter(self.entries))
+        block = self.entries.pop(key)
+        self.eve.ramg.free(block)
+        self.used -= block.size
+        self.evicted_bytes += block.size
+        return True
+
+    def _alloc(self, size):
+        """ Allocate RAM_G for size bytes, evicting as needed"""
+        while self.used + size > self.budget and self._evict_oldest():
+            pass
+        while True:
+            try:
+                return self.eve.ramg.alloc(size, self.eve.ramg.ALIGN_FLASH_READ, name="cache")
+            except MemoryError:
+                if not self._evict_oldest():
+                    raise
+
+    def load(self, flash_address, size):
+        """ Get flash data in RAM_G, reading it from flash on a miss
+            :param flash_address: Address in flash, 64-byte aligned
+            :param size: Number of bytes
+            :return: Address of the data in RAM_G
+        """
+        key = (flash_address, size)
+        block = self.entries.pop(key, None)
+        if block is not None:
+            self.hits += 1
+            self.entries[key] = block # most recently used
+            return block.addr
+
+        size4 = (size + 3) & ~3
+        if size4 > self.budget:
+            raise MemoryError("Asset of %d bytes is larger than the cache" % size)
+        self.misses += 1
+        block = self._alloc(size4)
+        self.eve.cmd_flashread(block.addr, flash_address, size4)
+        self.entries[key] = block
+        self.used += block.size
+        return block.addr
+
+    def setbitmap(self, asset):
+        """ Set up the current bitmap handle for an asset, loading it on a miss
+            :param asset: dict with keys addr (in flash), size, format, width, height,
+                          such as returned by eve.storage.asset()
+            :return: Address of the bitmap in RAM_G
+        """
+        addr = self.load(asset["addr"], asset["size"])
+        self.eve.cmd_setbitmap(addr, asset["format"], asset["width"], asset["height"])
+        return addr
+
+    def invalidate(self, flash_address=None, size=None):
+        """ Drop one asset, such as after re-flashing it, or all of them"""
+        if flash_address is None:
+            for block in self.entries.values():
+                self.eve.ramg.free(block)
+            self.entries = OrderedDict()
+            self.used = 0
+            return
+
+        block = self.entries.pop((flash_address, size), None)
+        if block is not None:
+            self.eve.ramg.free(block)
+            self.used -= block.size
+
+    def stats(self):
+        """ Cache counters
+            :return: dict with keys hits, misses, evicted_bytes, used, budget, assets
+        """
+        return {'hits':self.hits, 'misses':self.misses, 'evicted_bytes':self.evicted_bytes,
+            'used':self.used, 'budget':self.budget, 'assets':len(self.entries)}
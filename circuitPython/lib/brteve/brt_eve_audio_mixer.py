@@ -0,0 +1,178 @@
+""" Audio mixer for EVE's single playback channel, for CPython hosts such as Telemetrix
+    Sums several sources, such as music and UI sound effects, with a gain each, and
+    encodes the mix to the playback format in short blocks:
+
+        mixer = BrtEveAudioMixer(22050, eve.ULAW_SAMPLES)
+        player = BrtEveAudioPlayer(eve, size=mixer.ring_size(0.1))
+        player.play(mixer.chunks(), 22050, eve.ULAW_SAMPLES)
+        music = mixer.play("song.wav", gain=0.6)
+        click = mixer.load("click.wav")
+        while True:
+            player.service()
+            if touched():
+                mixer.play(click)
+
+    A sound starts once the samples already in the playback ring are played: the ring
+    size bounds the latency. chunks() never ends, it yields silence when nothing plays,
+    until close().
+"""
+import numpy as np
+
+from .brt_eve_common import BrtEveCommon
+from .brt_eve_audio_player import audio_bytes_per_second
+from .brt_eve_audio_transcode import BrtEveAdpcmEncoder, BrtEveResampler, read_wav_blocks, \
+    encode_linear, encode_ulaw
+
+# Time mixed at once
+MIXER_BLOCK_MS = 20
+
+class BrtEveMixerVoice():
+    """ A sound playing in the mixer, its gain can change while it plays"""
+
+    def __init__(self, source, freq, gain, loop):
+        """ :param source: Path of a WAV file, streamed, or a float32 array of mono
+                           samples at the mixer rate, such as from load()
+            :param freq: Sample rate of the mixer
+            :param gain: Gain, 1 for unchanged
+            :param loop: Play again from the start at the end
+        """
+        self.gain = gain
+        self.loop = loop
+        self.done = False
+        self.path = None
+        self.freq = freq
+        self.clip = None
+        self.blocks = None
+        self.pending = np.zeros(0, np.float32)
+        if isinstance(source, str):
+            self.path = source
+            self.blocks = self._wav_blocks()
+        else:
+            self.clip = np.asarray(source, np.float32)
+        self.offset = 0
+
+    def _wav_blocks(self):
+        """ Mono blocks of the WAV file at the mixer rate"""
+        resampler = None
+        for rate, block in read_wav_blocks(self.path):
+            if resampler is None:
+                resampler = BrtEveResampler(rate, self.freq)
+            yield resampler.process(block.mean(axis=1))
+
+    def read(self, count):
+        """ Next samples, with the gain applied
+            :return: float32 array, shorter than count at the end
+        """
+        if self.clip is not None:
+            samples = self.clip[self.offset:self.offset + count]
+            self.offset += len(samples)
+            while self.loop and len(samples) < count and len(self.clip):
+                more = self.clip[:count - len(samples)]
+                self.offset = len(more)
+                samples = np.concatenate((samples, more))
+        else:
+            restarted = False # A new pass gave no samples yet
+            while len(self.pending) < count:
+                block = next(self.blocks, None)
+                if block is None:
+                    # A file without samples ends even when looping
+                    if not self.loop or restarted:
+                        break
+                    self.blocks = self._wav_blocks()
+                    restarted = True
+                    continue
+                if len(block):
+                    restarted = False
+                self.pending = np.concatenate((self.pending, block))
+            samples = self.pending[:count]
+            self.pending = self.pending[count:]
+
+        if len(samples) < count:
+            self.done = True
+        return samples * self.gain
+
+    def stop(self):
+        """ Remove the sound from the mix"""
+        self.done = True
+
+class BrtEveAudioMixer():
+    """ Mix sounds into one stream of EVE playback samples"""
+
+    def __init__(self, freq=22050, sample_format=BrtEveCommon.ULAW_SAMPLES,
+                 block_ms=MIXER_BLOCK_MS):
+        """ :param freq: Sample rate in Hz, for REG_PLAYBACK_FREQ
+            :param sample_format: LINEAR_SAMPLES, ULAW_SAMPLES or ADPCM_SAMPLES
+            :param block_ms: Time mixed and encoded at once, in milliseconds
+        """
+        self.freq = freq
+        self.sample_format = sample_format
+        self.block = max(2, freq * block_ms // 1000)
+        self.voices = []
+        self.closed = False
+        self.adpcm = BrtEveAdpcmEncoder()
+        self.clipped = 0 # Samples clipped since the start
+
+    def ring_size(self, latency):
+        """ Size of a playback ring holding about latency seconds of the mix
+            :param latency: Longest time before a new sound is heard, in seconds
+            :return: Size in bytes, for BrtEveAudioPlayer
+        """
+        size = int(audio_bytes_per_second(self.freq, self.sample_format) * latency)
+        return max(1024, size - size % 4)
+
+    def load(self, path):
+        """ Read a whole WAV file at the mixer rate, for short sounds played often
+            :return: float32 array of mono samples, for play()
+        """
+        resampler = None
+        blocks = []
+        for rate, block in read_wav_blocks(path):
+            if resampler is None:
+                resampler = BrtEveResampler(rate, self.freq)
+            blocks.append(resampler.process(block.mean(axis=1)))
+        return np.concatenate(blocks) if blocks else np.zeros(0, np.float32)
+
+    def play(self, source, gain=1.0, loop=False):
+        """ Add a sound to the mix, from the next block
+            :param source: Path of a WAV file, streamed, or samples from load()
+            :param gain: Gain, 1 for unchanged
+            :param loop: Play again from the start at the end
+            :return: BrtEveMixerVoice, to change its gain or stop it
+        """
+        voice = BrtEveMixerVoice(source, self.freq, gain, loop)
+        self.voices.append(voice)
+        return voice
+
+    def mix(self):
+        """ Mix the next block
+            :return: float32 array of block samples, from -1 to 1
+        """
+        output = np.zeros(self.block, np.float32)
+        for voice in self.voices:
+            samples = voice.read(self.block)
+            output[:len(samples)] += samples
+        self.voices = [voice for voice in self.voices if not voice.done]
+
+        clipped = np.abs(output) > 1
+        if clipped.any():
+            self.clipped += int(clipped.sum())
+            np.clip(output, -1, 1, out=output)
+        return output
+
+    def chunks(self):
+        """ Encoded blocks of the mix, a source for BrtEveAudioPlayer.play()
+            :return: Generator which ends after close()
+        """
+        while not self.closed:
+            samples = self.mix()
+            if self.sample_format == BrtEveCommon.ULAW_SAMPLES:
+                yield encode_ulaw(samples)
+            elif self.sample_format == BrtEveCommon.ADPCM_SAMPLES:
+                yield self.adpcm.encode(samples)
+            else:
+                yield encode_linear(samples)
+
+    def close(self):
+        """ End chunks(), playback ends once the ring is played"""
+        self.closed = True
+        self.voices = []
@@ -0,0 +1,394 @@
+""" Audio player for BridgeTek's EVE chips
+    Plays a file or a stream through EVE's playback ring without blocking. Call
+    service() from the application loop, between frames:
+
+        player = BrtEveAudioPlayer(eve)
+        player.play("/sd/song.raw", 44100, eve.LINEAR_SAMPLES)
+        while True:
+            player.service()
+            draw_ui(player.position())
+
+    service() reads the playback registers once, and refills the ring only when less
+    than low_water bytes are left in it, so most calls cost one short SPI read. It must
+    run more often than the ring lasts: 16 KB of 8-bit samples at 44100 Hz last 0.37 s.
+    From a background thread, guard it and the UI with the same lock, as both use EVE.
+
+    The ring is allocated from the top of eve.ramg, unless base is given.
+
+    Files played by path get a seek index: the byte offset of each slice of playback
+    time, built once and cached beside the file as <file>.idx. seek_time() and time()
+    then take no file access:
+
+        player.seek_time(90)
+        print(player.time(), player.duration())
+
+    Index file layout, little endian:
+        header: magic "EVAI", version (u16), slice in ms (u16), file size (u32),
+                sample rate (u32), sample format (u32), count (u32)
+        entry:  byte offset in the file (u32), of time entry * slice, and last the end
+                of the samples
+"""
+import time
+import array
+import struct
+
+from .brt_eve_common import BrtEveCommon, const
+from .brt_eve_media_fifo import BrtEveMediaFifoStreamer
+
+AUDIO_RING_SIZE = const(16 * 1024)
+AUDIO_INDEX_SLICE_MS = const(500)
+AUDIO_INDEX_MAGIC = b"EVAI"
+AUDIO_INDEX_VERSION = const(1)
+_INDEX_HEADER = "<4sHHIIII"
+# Delay before unmuting, the amplifier pops while the ring starts
+AUDIO_UNMUTE_DELAY = 0.3
+
+_STOPPED = 0
+_PLAYING = 1
+_PAUSED = 2
+
+# Snapshot of REG_PLAYBACK_READPTR up to REG_PLAYBACK_PLAY
+_SNAPSHOT_SIZE = const(20)
+_SNAPSHOT_PLAY = const(16)
+
+def audio_bytes_per_second(freq, sample_format):
+    """ Data rate of samples: ADPCM packs 2 samples per byte, the others take one"""
+    if sample_format == BrtEveCommon.ADPCM_SAMPLES:
+        return freq // 2
+    return freq
+
+def _audio_data_range(handler, file_size):
+    """ Samples of a file: the data chunk of a WAV file, else the whole file
+        :return: Offset and size of the samples
+    """
+    handler.seek(0)
+    header = handler.read(12)
+    if len(header) < 12 or header[0:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return 0, file_size
+    offset = 12
+    while offset + 8 <= file_size:
+        handler.seek(offset)
+        chunk, size = struct.unpack("<4sI", handler.read(8))
+        if chunk == b"data":
+            return offset + 8, min(size, file_size - offset - 8)
+        offset += 8 + size + (size & 1)
+    return 0, file_size
+
+def audio_seek_index(path, freq, sample_format, slice_ms=AUDIO_INDEX_SLICE_MS):
+    """ Seek index of an audio file, loaded from path + ".idx" when it matches the file,
+        else built and saved there if the file system is writable
+        :param path: Path of a raw sample file or a WAV file
+        :param freq: Sample rate in Hz
+        :param sample_format: LINEAR_SAMPLES, ULAW_SAMPLES or ADPCM_SAMPLES
+        :param slice_ms: Time between two entries, in milliseconds
+        :return: array('I'), entry i is the offset of time i * slice_ms, the last entry
+                 is the end of the samples
+    """
+    with open(path, "rb") as handler:
+        handler.seek(0, 2)
+        file_size = handler.tell()
+        expected = (AUDIO_INDEX_MAGIC, AUDIO_INDEX_VERSION, slice_ms, file_size, freq,
+            sample_format)
+        header_size = struct.calcsize(_INDEX_HEADER)
+
+        try:
+            with open(path + ".idx", "rb") as cache:
+                header = struct.unpack(_INDEX_HEADER, cache.read(header_size))
+                if header[:6] == expected:
+                    index = array.array("I", (0 for _ in range(header[6])))
+                    if cache.readinto(index) == header[6] * 4:
+                        return index
+        except (OSError, struct.error):
+            pass
+
+        start, size = _audio_data_range(handler, file_size)
+
+    step = audio_bytes_per_second(freq, sample_format) * slice_ms // 1000
+    count = (size + step - 1) // step + 1
+    index = array.array("I", (start + min(i * step, size) for i in range(count)))
+    try:
+        with open(path + ".idx", "wb") as cache:
+            cache.write(struct.pack(_INDEX_HEADER, *(expected + (count,))))
+            cache.write(index)
+    except OSError:
+        pass # Read-only file system, such as CircuitPython's drive
+    return index
+
+class BrtEveAudioPlayer(): # pylint: disable=too-many-instance-attributes
+    """ Stream audio samples to EVE's playback ring, advanced by service()"""
+
+    def __init__(self, eve, base=None, size=AUDIO_RING_SIZE, low_water=None):
+        """ Set up the playback ring
+            :param eve: BrtEve object
+            :param base: Address of the ring in RAM_G, allocated from eve.ramg if None
+            :param size: Size of the ring in bytes, multiple of 4
+            :param low_water: Refill the ring when fewer bytes are left in it, size / 2 if None
+        """
+        self.eve = eve
+        self.block = None
+        if base is None:
+            self.block = eve.ramg.alloc(size, pinned=True, name="audio ring", top=True)
+            base = self.block.addr
+        self.base = base
+        self.size = size
+        self.low_water = size // 2 if low_water is None else low_water
+
+        # REG_PLAYBACK_READPTR is an address in RAM_G, playback has no write pointer
+        self.streamer = BrtEveMediaFifoStreamer(eve, base, size,
+            eve.REG_PLAYBACK_READPTR, None, base)
+        self.snapshot = bytearray(_SNAPSHOT_SIZE)
+
+        self.state = _STOPPED
+        self.ended = False # Set when the source played to its end
+        self.source = None
+        self.file_handler = None # File opened by play()
+        self.freq = 0
+        self.sample_format = 0
+        self.volume = 0xff
+        self.unmute_at = 0
+
+        self.index = None # Seek index of a file played by path
+        self.slice_ms = AUDIO_INDEX_SLICE_MS
+
+        self.origin = 0 # Offset in the source of the first byte in the ring
+        self.played = 0 # Bytes played since origin
+        self.last_read = 0
+
+    def play(self, source, freq, sample_format, volume=None, index=True): # pylint: disable=too-many-arguments
+        """ Start playing, returns at once
+            :param source: Path of a file, or a source of BrtEveMediaFifoStreamer: an opened
+                           file, a socket, or a generator of bytes
+            :param freq: Sample rate in Hz
+            :param sample_format: LINEAR_SAMPLES, ULAW_SAMPLES or ADPCM_SAMPLES
+            :param volume: Playback volume, 0 to 255, unchanged if None
+            :param index: Load or build the seek index of a file given by path
+        """
+        self.stop()
+        self.index = None
+        if isinstance(source, str):
+            if index:
+                self.index = audio_seek_index(source, freq, sample_format, self.slice_ms)
+            self.file_handler = source = open(source, "rb") # pylint: disable=consider-using-with
+            if self.index:
+                # Skip the header of a WAV file
+                source.seek(self.index[0])
+        self.source = source
+        self.freq = freq
+        self.sample_format = sample_format
+        if volume is not None:
+            self.volume = volume
+        self.ended = False
+
+        origin = source.tell() if hasattr(source, "tell") else 0
+        self._begin(origin)
+        self.state = _PLAYING
+
+    def _begin(self, origin):
+        """ Fill the ring from the source, then start the playback engine at its base"""
+        eve = self.eve
+        self.origin = origin
+        self.played = 0
+        self.last_read = 0
+
+        self.streamer.start(self.source, 0)
+        self.streamer.service(self.base)
+        if self.streamer.eof:
+            self._fill_silence()
+
+        eve.wr32(eve.REG_VOL_PB, 0)
+        eve.wr32(eve.REG_PLAYBACK_START, self.base)
+        eve.wr32(eve.REG_PLAYBACK_LENGTH, self.size)
+        eve.wr32(eve.REG_PLAYBACK_FREQ, self.freq)
+        eve.wr32(eve.REG_PLAYBACK_FORMAT, self.sample_format)
+        eve.wr32(eve.REG_PLAYBACK_LOOP, 1)
+        eve.wr32(eve.REG_PLAYBACK_PLAY, 1)
+        self.unmute_at = time.monotonic() + AUDIO_UNMUTE_DELAY
+
+    def _halt(self):
+        """ Stop the playback engine"""
+        eve = self.eve
+        eve.wr32(eve.REG_VOL_PB, 0)
+        eve.wr32(eve.REG_PLAYBACK_LOOP, 0)
+        eve.wr32(eve.REG_PLAYBACK_LENGTH, 0)
+        eve.wr32(eve.REG_PLAYBACK_PLAY, 1)
+        self.unmute_at = 0
+
+    def _fill_silence(self):
+        """ Fill the free part of the ring with silence, once the source ended
+            Otherwise, old samples play between the end and the next service().
+        """
+        eve = self.eve
+        streamer = self.streamer
+        silence = 0xff if self.sample_format == eve.ULAW_SAMPLES else 0
+        free = self.size - 4 - (streamer.write_pointer - streamer.read_pointer) % self.size
+        first = min(free, self.size - streamer.write_pointer)
+        if first > 0:
+            eve.cmd_memset(self.base + streamer.write_pointer, silence, first)
+        if free > first:
+            eve.cmd_memset(self.base, silence, free - first)
+        eve.flush()
+
+    def service(self):
+        """ Refill the ring when it runs low, and detect the end of the source
+            :return: True while playing or paused
+        """
+        if self.state != _PLAYING:
+            return self.state == _PAUSED
+
+        eve = self.eve
+        eve.read_mem_into(eve.REG_PLAYBACK_READPTR, self.snapshot)
+        read_pointer, = struct.unpack_from("<I", self.snapshot, 0)
+        streamer = self.streamer
+
+        offset = (read_pointer - self.base) % self.size
+        self.played += (offset - self.last_read) % self.size
+        self.last_read = offset
+
+        if self.unmute_at and time.monotonic() >= self.unmute_at:
+            self.unmute_at = 0
+            eve.wr8(eve.REG_GPIOX_DIR, 0xff)
+            eve.wr8(eve.REG_GPIOX, 0xff)
+            eve.wr32(eve.REG_VOL_PB, self.volume)
+
+        if streamer.eof:
+            # The end is reached once the last byte written is played
+            if self.played >= streamer.written or \
+                    struct.unpack_from("<I", self.snapshot, _SNAPSHOT_PLAY)[0] == 0:
+                self._halt()
+                self._release()
+                self.ended = True
+            return self.state == _PLAYING
+
+        if streamer.fullness(read_pointer) < self.low_water:
+            streamer.service(read_pointer)
+            if streamer.eof:
+                self._fill_silence()
+        return True
+
+    def pause(self):
+        """ Pause playback, resume() continues from there"""
+        if self.state != _PLAYING:
+            return
+        eve = self.eve
+        if hasattr(eve, "REG_PLAYBACK_PAUSE"):
+            eve.wr32(eve.REG_PLAYBACK_PAUSE, 1)
+        else:
+            # No pause register before BT815: stop, and restart from the position
+            self.played = self.position() - self.origin
+            self._halt()
+        self.state = _PAUSED
+
+    def resume(self):
+        """ Continue a paused playback"""
+        if self.state != _PAUSED:
+            return
+        eve = self.eve
+        self.state = _PLAYING
+        if hasattr(eve, "REG_PLAYBACK_PAUSE"):
+            eve.wr32(eve.REG_PLAYBACK_PAUSE, 0)
+        else:
+            self._restart(self.origin + self.played)
+
+    def seek(self, offset):
+        """ Continue playback from a byte offset of the source, which must be seekable
+            The ring is refilled from there, without reading the source up to the offset.
+
+            :param offset: Offset in the source, a multiple of the block size for ADPCM
+        """
+        if self.state == _STOPPED or not hasattr(self.source, "seek"):
+            return
+        self._halt()
+        if self.state == _PAUSED and not hasattr(self.eve, "REG_PLAYBACK_PAUSE"):
+            # resume() starts from there
+            self.origin = offset
+            self.played = 0
+            return
+        # A paused playback stays paused, REG_PLAYBACK_PAUSE is kept
+        self._restart(offset)
+
+    def seek_time(self, seconds):
+        """ Continue playback from a time, with the seek index of a file played by path
+            :param seconds: Time from the start of the file
+        """
+        index = self.index
+        if not index:
+            return
+        entry = max(0, min(int(seconds * 1000) // self.slice_ms, len(index) - 1))
+        self.seek(index[entry])
+
+    def time(self):
+        """ Time of the sample playing now, in seconds, from the start of the file"""
+        return self.time_of(self.position())
+
+    def duration(self):
+        """ Time of the whole file, in seconds, 0 without seek index"""
+        return self.time_of(self.index[-1]) if self.index else 0
+
+    def time_of(self, offset):
+        """ Time of a byte offset of the source, in seconds"""
+        rate = audio_bytes_per_second(self.freq, self.sample_format) or 1
+        index = self.index
+        if not index:
+            return offset / rate
+        # Last entry at or before offset, which is not the end entry
+        low = 0
+        high = len(index) - 2
+        while low < high:
+            middle = (low + high + 1) // 2
+            if index[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low * self.slice_ms / 1000 + max(0, offset - index[low]) / rate
+
+    def _restart(self, offset):
+        """ Refill the ring from an offset of the source, and start the playback engine"""
+        if hasattr(self.source, "seek"):
+            self.source.seek(offset)
+        self.ended = False
+        self._begin(offset)
+
+    def stop(self):
+        """ Stop playback, and release the file opened by play()"""
+        if self.state == _STOPPED:
+            return
+        eve = self.eve
+        self._halt()
+        if hasattr(eve, "REG_PLAYBACK_PAUSE"):
+            eve.wr32(eve.REG_PLAYBACK_PAUSE, 0)
+        eve.wr8(eve.REG_GPIOX_DIR, 0xf0)
+        eve.wr8(eve.REG_GPIOX, 0xf0)
+        self._release()
+
+    def _release(self):
+        """ Close the file opened by play()"""
+        self.state = _STOPPED
+        self.source = None
+        if self.file_handler is not None:
+            self.file_handler.close()
+            self.file_handler = None
+
+    def is_playing(self):
+        """ True while playing, False when paused or stopped"""
+        return self.state == _PLAYING
+
+    def is_paused(self):
+        """ True when paused"""
+        return self.state == _PAUSED
+
+    def position(self):
+        """ Offset in the source of the byte playing now, as of the last service()"""
+        return self.origin + min(self.played, self.streamer.written)
+
+    def set_volume(self, volume):
+        """ Set the playback volume, 0 to 255"""
+        self.volume = volume
+        if self.state == _PLAYING and not self.unmute_at:
+            self.eve.wr32(self.eve.REG_VOL_PB, volume)
+
+    def close(self):
+        """ Stop, and free the ring allocated from eve.ramg"""
+        self.stop()
+        if self.block is not None:
+            self.eve.ramg.free(self.block)
+            self.block = None
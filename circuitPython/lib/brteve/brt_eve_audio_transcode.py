@@ -0,0 +1,271 @@
+""" Audio transcoding to EVE playback formats, for CPython hosts such as Telemetrix
+    Reads a WAV file block by block, downmixes it to mono, resamples it and encodes it
+    to 8-bit linear, u-law or IMA ADPCM with NumPy. The output streams in chunks, so a
+    long file never sits in memory:
+
+        transcoder = BrtEveAudioTranscoder(22050, eve.ULAW_SAMPLES, cache_dir="cache")
+        player.play(transcoder.source("song.wav"), 22050, eve.ULAW_SAMPLES)
+
+    source() returns the cached file when the WAV was transcoded before, so it plays with
+    a seek index. Otherwise it returns a generator of chunks, which fills the cache while
+    playing. Cached files are named after the SHA-1 of the WAV content and the output
+    format, so a changed file is transcoded again.
+
+    WAV files must hold integer PCM samples, 8 to 32 bits. IMA ADPCM is sequential by
+    nature: its quantizer runs per sample, on values prepared with NumPy.
+"""
+import os
+import wave
+import hashlib
+
+import numpy as np
+
+from .brt_eve_common import BrtEveCommon
+
+# Input frames processed at once
+TRANSCODE_BLOCK_FRAMES = 8192
+
+_FORMAT_NAMES = {BrtEveCommon.LINEAR_SAMPLES:"linear", BrtEveCommon.ULAW_SAMPLES:"ulaw",
+    BrtEveCommon.ADPCM_SAMPLES:"adpcm"}
+
+_ADPCM_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8)
+_ADPCM_STEP = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55,
+    60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411,
+    1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358,
+    5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500,
+    20350, 22385, 24623, 27086, 29794, 32767)
+
+def read_wav_blocks(path, block_frames=TRANSCODE_BLOCK_FRAMES):
+    """ Read a WAV file in blocks
+        :param path: Path of the WAV file
+        :param block_frames: Frames per block
+        :return: Generator of (sample rate, float32 array of shape (frames, channels),
+                 values from -1 to 1)
+    """
+    with wave.open(path, "rb") as wav:
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        while True:
+            data = wav.readframes(block_frames)
+            if not data:
+                return
+            yield rate, _pcm_to_float(data, width).reshape(-1, channels)
+
+def _pcm_to_float(data, width):
+    """ Convert little endian PCM bytes to float32, 8-bit WAV samples are unsigned"""
+    if width == 1:
+        return (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+    if width == 3:
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+        value = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        value = np.where(value & 0x800000, value - 0x1000000, value)
+        return value.astype(np.float32) / 0x800000
+    dtype = {2:"<i2", 4:"<i4"}[width]
+    return np.frombuffer(data, dtype).astype(np.float32) / float(1 << (8 * width - 1))
+
+def encode_linear(samples):
+    """ Encode float samples to EVE's 8-bit signed linear format"""
+    return np.clip(np.round(samples * 127), -128, 127).astype(np.int8).tobytes()
+
+def encode_ulaw(samples):
+    """ Encode float samples to G.711 u-law"""
+    pcm = np.clip(np.round(samples * 32767), -32768, 32767).astype(np.int32)
+    sign = (pcm < 0).astype(np.int32) << 7
+    magnitude = np.minimum(np.abs(pcm), 32635) + 0x84
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0f
+    return (~(sign | (exponent << 4) | mantissa) & 0xff).astype(np.uint8).tobytes()
+
+class BrtEveAdpcmEncoder():
+    """ IMA ADPCM encoder, keeping its state between blocks
+        Two samples per byte, the first one in the low nibble.
+    """
+    def __init__(self):
+        self.predicted = 0
+        self.index = 0
+        self.pending = None # Nibble of an odd sample, waiting for the next block
+
+    def encode(self, samples):
+        """ Encode float samples
+            :return: Encoded bytes, an odd sample waits for the next call or flush()
+        """
+        pcm = np.clip(np.round(samples * 32767), -32768, 32767).astype(np.int32).tolist()
+        nibbles = bytearray(len(pcm))
+        predicted = self.predicted
+        index = self.index
+        for i, sample in enumerate(pcm):
+            step = _ADPCM_STEP[index]
+            diff = sample - predicted
+            code = 0
+            if diff < 0:
+                code = 8
+                diff = -diff
+            delta = step >> 3
+            if diff >= step:
+                code |= 4
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                code |= 2
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                code |= 1
+                delta += step
+            predicted = predicted - delta if code & 8 else predicted + delta
+            predicted = max(-32768, min(32767, predicted))
+            index = max(0, min(88, index + _ADPCM_INDEX[code & 7]))
+            nibbles[i] = code
+        self.predicted = predicted
+        self.index = index
+        return self._pack(np.frombuffer(bytes(nibbles), np.uint8))
+
+    def _pack(self, nibbles):
+        """ Pack nibbles two per byte"""
+        if self.pending is not None:
+            nibbles = np.concatenate((np.array([self.pending], np.uint8), nibbles))
+            self.pending = None
+        if len(nibbles) & 1:
+            self.pending = int(nibbles[-1])
+            nibbles = nibbles[:-1]
+        return (nibbles[0::2] | (nibbles[1::2] << 4)).astype(np.uint8).tobytes()
+
+    def flush(self):
+        """ Encoded byte of an odd last sample, b"" if none"""
+        if self.pending is None:
+            return b""
+        pending = self.pending
+        self.pending = None
+        return bytes((pending,))
+
+class BrtEveResampler():
+    """ Streaming resampler: box filter against aliasing, then linear interpolation"""
+
+    def __init__(self, rate_in, rate_out):
+        self.step = rate_in / rate_out
+        self.taps = max(1, int(self.step))
+        self.tail = np.zeros(self.taps - 1, np.float32) # Filter input kept between blocks
+        self.previous = None # Last filtered sample of the previous block
+        self.position = 0.0 # Position of the next output sample, from previous
+
+    def process(self, samples):
+        """ Resample a block of mono samples"""
+        if self.step == 1:
+            return samples
+        if self.taps > 1:
+            padded = np.concatenate((self.tail, samples))
+            self.tail = padded[len(padded) - (self.taps - 1):]
+            samples = np.convolve(padded, np.full(self.taps, 1 / self.taps, np.float32),
+                "valid").astype(np.float32)
+        if self.previous is not None:
+            samples = np.concatenate((np.array([self.previous], np.float32), samples))
+        if len(samples) == 0:
+            return samples
+
+        last = len(samples) - 1
+        count = int((last - self.position) / self.step) + 1 if last >= self.position else 0
+        times = self.position + np.arange(count) * self.step
+        output = np.interp(times, np.arange(len(samples)), samples).astype(np.float32)
+        self.position = self.position + count * self.step - last
+        self.previous = samples[-1]
+        return output
+
+class BrtEveAudioTranscoder():
+    """ WAV to EVE playback format, streamed in chunks, with an optional file cache"""
+
+    def __init__(self, freq=22050, sample_format=BrtEveCommon.ULAW_SAMPLES, cache_dir=None,
+                 block_frames=TRANSCODE_BLOCK_FRAMES):
+        """ :param freq: Output sample rate in Hz, for REG_PLAYBACK_FREQ
+            :param sample_format: LINEAR_SAMPLES, ULAW_SAMPLES or ADPCM_SAMPLES
+            :param cache_dir: Directory of transcoded files, None for no cache
+            :param block_frames: Input frames processed at once
+        """
+        if sample_format not in _FORMAT_NAMES:
+            raise ValueError("Unknown sample format: %s" % sample_format)
+        self.freq = freq
+        self.sample_format = sample_format
+        self.cache_dir = cache_dir
+        self.block_frames = block_frames
+
+    def chunks(self, path):
+        """ Transcode a WAV file
+            :return: Generator of encoded chunks, about block_frames input frames each
+        """
+        resampler = None
+        adpcm = BrtEveAdpcmEncoder()
+        for rate, block in read_wav_blocks(path, self.block_frames):
+            if resampler is None:
+                resampler = BrtEveResampler(rate, self.freq)
+            mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            samples = resampler.process(mono)
+            if self.sample_format == BrtEveCommon.ULAW_SAMPLES:
+                data = encode_ulaw(samples)
+            elif self.sample_format == BrtEveCommon.ADPCM_SAMPLES:
+                data = adpcm.encode(samples)
+            else:
+                data = encode_linear(samples)
+            if data:
+                yield data
+        data = adpcm.flush()
+        if data:
+            yield data
+
+    def cache_path(self, path):
+        """ Path of the cached transcoding of a WAV file, None without cache_dir
+            The name is the SHA-1 of the file content and of the output format.
+        """
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1()
+        with open(path, "rb") as handler:
+            for block in iter(lambda: handler.read(65536), b""):
+                digest.update(block)
+        name = "%s-%d-%s.raw" % (digest.hexdigest()[:20], self.freq,
+            _FORMAT_NAMES[self.sample_format])
+        return os.path.join(self.cache_dir, name)
+
+    def source(self, path):
+        """ Source for BrtEveAudioPlayer.play()
+            :return: Path of the cached transcoding, or a generator of chunks which
+                     writes the cache as it goes
+        """
+        cached = self.cache_path(path)
+        if cached is None:
+            return self.chunks(path)
+        if os.path.exists(cached):
+            return cached
+        return self._chunks_to_cache(path, cached)
+
+    def _chunks_to_cache(self, path, cached):
+        """ Yield the chunks, and keep them as the cached file once complete"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial = cached + ".part"
+        with open(partial, "wb") as handler:
+            for data in self.chunks(path):
+                handler.write(data)
+                yield data
+        os.replace(partial, cached)
+
+    def transcode_file(self, path, output=None):
+        """ Transcode a whole WAV file
+            :param path: Path of the WAV file
+            :param output: Path of the output, the cache file if None
+            :return: Path of the output
+        """
+        if output is None:
+            output = self.cache_path(path)
+            if output is None:
+                raise ValueError("No output path and no cache directory")
+            if os.path.exists(output):
+                return output
+            os.makedirs(self.cache_dir, exist_ok=True)
+        with open(output + ".part", "wb") as handler:
+            for data in self.chunks(path):
+                handler.write(data)
+        os.replace(output + ".part", output)
+        return output
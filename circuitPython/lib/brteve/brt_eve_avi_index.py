@@ -0,0 +1,163 @@
+""" Frame index of AVI files, for seekable video playback
+    The idx1 chunk of an AVI file lists its chunks. It is parsed once into an offset
+    table of the video frames, so that playback can start at any frame:
+
+        index = BrtEveAviIndex(reader, size)
+        frame = index.frame_at_time(12.5)
+        offset = index.frames[frame]    # Offset of the frame's chunk header in the file
+
+    EVE parses the AVI header before the frames: a player feeds the first
+    movi_start bytes, then the chunks from the offset of a frame. The chunks in between,
+    audio included, keep their order.
+
+    Only the frame offsets are kept, 4 bytes per frame. The idx1 chunk is read in
+    blocks, so a long video does not need its whole index in memory.
+"""
+import array
+import struct
+
+from .brt_eve_common import const
+
+# Bytes of idx1 read at once, 16 bytes per entry
+AVI_INDEX_BLOCK = const(1024)
+_IDX1_ENTRY = const(16)
+
+class BrtEveAviIndex(): # pylint: disable=too-many-instance-attributes
+    """ Offsets of the video frames of an AVI file"""
+
+    def __init__(self, read_at, size):
+        """ Parse the headers and the idx1 chunk
+            :param read_at: Function called with an offset and a size, returns the bytes
+                            of the file there
+            :param size: Size of the file in bytes
+            :raise ValueError: if the file is not an AVI file, or has no idx1 chunk
+        """
+        self.frames = array.array("I")
+        self.usec_per_frame = 0
+        self.total_frames = 0
+        self.width = 0
+        self.height = 0
+        self.movi_start = 0 # Offset of the first chunk of the movi list
+        self.movi_end = 0 # Offset after the last chunk of the movi list
+
+        header = read_at(0, 12)
+        if len(header) < 12 or header[0:4] != b"RIFF" or header[8:12] != b"AVI ":
+            raise ValueError("Not an AVI file")
+        size = min(size, 8 + struct.unpack_from("<I", header, 4)[0])
+
+        idx1 = None
+        offset = 12
+        while offset + 12 <= size:
+            chunk, chunk_size, kind = struct.unpack("<4sI4s", read_at(offset, 12))
+            if chunk == b"LIST" and kind == b"hdrl":
+                self._parse_hdrl(read_at(offset + 12, min(chunk_size - 4, 256)))
+            elif chunk == b"LIST" and kind == b"movi":
+                self.movi_start = offset + 12
+                self.movi_end = offset + 8 + chunk_size
+            elif chunk == b"idx1":
+                idx1 = (offset + 8, chunk_size)
+            offset += 8 + chunk_size + (chunk_size & 1)
+
+        if idx1 is None or self.movi_start == 0:
+            raise ValueError("AVI file without index")
+        self._parse_idx1(read_at, idx1[0], idx1[1])
+
+    def _parse_hdrl(self, data):
+        """ Read frame duration, frame count and size from the avih chunk"""
+        if len(data) >= 48 and data[0:4] == b"avih":
+            self.usec_per_frame, = struct.unpack_from("<I", data, 8)
+            self.total_frames, = struct.unpack_from("<I", data, 24)
+            self.width, self.height = struct.unpack_from("<II", data, 40)
+
+    def _parse_idx1(self, read_at, start, size):
+        """ Keep the offsets of the video chunks, ##dc or ##db"""
+        base = None
+        done = 0
+        size -= size % _IDX1_ENTRY
+        while done < size:
+            block = read_at(start + done, min(AVI_INDEX_BLOCK, size - done))
+            if len(block) < _IDX1_ENTRY:
+                break
+            for entry in range(0, len(block) - _IDX1_ENTRY + 1, _IDX1_ENTRY):
+                chunk, _, offset = struct.unpack_from("<4sII", block, entry)
+                if base is None:
+                    # Offsets are from the movi fourcc, or from the file start
+                    base = self.movi_start - 4 if offset < self.movi_start else 0
+                if chunk[2:4] in (b"dc", b"db"):
+                    self.frames.append(base + offset)
+            done += len(block) - len(block) % _IDX1_ENTRY
+        if not self.total_frames:
+            self.total_frames = len(self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def fps(self):
+        """ Frames per second from the AVI header, 0 if unknown"""
+        return 1000000 / self.usec_per_frame if self.usec_per_frame else 0
+
+    def frame_at_time(self, seconds):
+        """ Frame shown at a time from the start, within the video"""
+        frame = int(seconds * 1000000 / self.usec_per_frame) if self.usec_per_frame else 0
+        return max(0, min(frame, len(self.frames) - 1))
+
+    def time_of_frame(self, frame):
+        """ Time from the start at which a frame is shown, in seconds"""
+        return frame * self.usec_per_frame / 1000000
+
+    def frame_at_offset(self, offset):
+        """ Last frame starting at or before an offset of the file"""
+        low = 0
+        high = len(self.frames) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.frames[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def end_of_frame(self, frame):
+        """ Offset after the chunks of a frame and the audio which follows it"""
+        if frame + 1 < len(self.frames):
+            return self.frames[frame + 1]
+        return self.movi_end
+
+class BrtEveAviSegment(): # pylint: disable=too-few-public-methods
+    """ Source for BrtEveMediaFifoStreamer: the AVI header, then the chunks of a range of
+        frames, repeated when looping
+    """
+
+    def __init__(self, handler, index, first, last, loop=False): # pylint: disable=too-many-arguments
+        """ :param handler: AVI file opened in binary mode
+            :param index: BrtEveAviIndex of the file
+            :param first: First frame
+            :param last: Last frame, included
+            :param loop: Play the range again after its last frame
+        """
+        self.handler = handler
+        self.header_end = index.movi_start
+        self.start = index.frames[first]
+        self.end = index.end_of_frame(last)
+        self.loop = loop
+        self.offset = 0 # Offset in the file of the next byte to read
+        handler.seek(0)
+
+    def readinto(self, view):
+        """ Read the next bytes of the segment
+            :return: Number of bytes read, 0 at the end
+        """
+        if self.offset == self.header_end:
+            self.offset = self.start
+            self.handler.seek(self.start)
+        elif self.offset == self.end and self.loop:
+            self.offset = self.start
+            self.handler.seek(self.start)
+
+        limit = self.header_end if self.offset < self.header_end else self.end
+        num = min(len(view), limit - self.offset)
+        if num <= 0:
+            return 0
+        num = self.handler.readinto(view[:num]) or 0
+        self.offset += num
+        return num
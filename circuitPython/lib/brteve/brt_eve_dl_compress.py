@@ -0,0 +1,117 @@
+""" Compressed display list transport
+    On slow links, runs of display list commands are compressed on the host with zlib,
+    inflated by EVE into a RAM_G scratch area, and added to the display list with
+    cmd_append:
+
+        eve.dl_compress(True)
+        eve.cmd_dlstart()
+        ...                 # Vertex2f, ColorRGB... are compressed, when it pays off
+        eve.cmd_swap()
+        print(eve.dl_compressor.last_frame) # raw, sent, saved, runs, compressed
+
+    Only display list commands can go through cmd_append: coprocessor commands, such
+    as cmd_text, are sent as before and split the runs. A run is compressed when that
+    saves at least threshold of its size, commands included.
+
+    Needs zlib with compression, so a CPython host such as Telemetrix. On CircuitPython,
+    the built-in _EVE class writes the display list commands itself.
+"""
+import struct
+
+try:
+    import zlib
+    HOST_DEFLATE = hasattr(zlib, "compressobj")
+except ImportError:
+    HOST_DEFLATE = False
+
+CMD_INFLATE = 0xffffff22
+CMD_APPEND = 0xffffff1e
+CMD_SWAP = 0xffffff01
+
+# RAM_DL size: a run never needs more
+DL_SCRATCH_SIZE = 8 * 1024
+DL_COMPRESS_THRESHOLD = 0.2
+DL_COMPRESS_MIN_RUN = 256
+
+class BrtEveDlCompressor():
+    """ Collect runs of display list commands, and encode each one raw or compressed"""
+
+    def __init__(self, eve, threshold=DL_COMPRESS_THRESHOLD, min_run=DL_COMPRESS_MIN_RUN):
+        """ Allocate the scratch area from eve.ramg
+            :param eve: BrtEve object
+            :param threshold: Part of a run which compressing must save, 0.2 for 20%
+            :param min_run: Runs shorter than this, in bytes, are sent raw
+        """
+        self.eve = eve
+        self.threshold = threshold
+        self.min_run = min_run
+        self.block = eve.ramg.alloc(DL_SCRATCH_SIZE, pinned=True, name="dl scratch", top=True)
+        self.run = bytearray()
+
+        self.frame = self._zero()
+        self.last_frame = self._zero()
+        self.total = self._zero()
+        self.frames = 0
+
+    @staticmethod
+    def _zero():
+        """ Empty counters"""
+        return {'raw':0, 'sent':0, 'saved':0, 'runs':0, 'compressed':0}
+
+    def word(self, value):
+        """ Add a display list command to the current run
+            :return: Encoded run to send when the scratch area is full, else None
+        """
+        self.run += struct.pack("I", value)
+        if len(self.run) >= DL_SCRATCH_SIZE:
+            return self.flush_run()
+        return None
+
+    def flush_run(self):
+        """ End the current run
+            :return: Bytes to send to the command FIFO: the run itself, or cmd_inflate
+                     with the compressed run then cmd_append
+        """
+        run = self.run
+        self.run = bytearray()
+        raw = len(run)
+        data = run
+        if raw >= self.min_run:
+            compressed = zlib.compress(run)
+            compressed += bytes(-len(compressed) & 3)
+            addr = self.block.addr
+            encoded = struct.pack("II", CMD_INFLATE, addr) + compressed + \
+                struct.pack("III", CMD_APPEND, addr, raw)
+            if len(encoded) <= raw * (1 - self.threshold):
+                data = encoded
+                self.frame['compressed'] += 1
+
+        self.frame['raw'] += raw
+        self.frame['sent'] += len(data)
+        self.frame['runs'] += 1
+        return bytes(data)
+
+    def end_frame(self):
+        """ Move the counters of the frame to last_frame and total"""
+        frame = self.frame
+        frame['saved'] = frame['raw'] - frame['sent']
+        for key, value in frame.items():
+            self.total[key] += value
+        self.last_frame = frame
+        self.frame = self._zero()
+        self.frames += 1
+
+    def stats(self):
+        """ Counters since enabled
+            :return: dict with keys raw, sent, saved, runs, compressed, frames, and
+                     saved_per_frame
+        """
+        stats = dict(self.total)
+        stats['frames'] = self.frames
+        stats['saved_per_frame'] = self.total['saved'] / self.frames if self.frames else 0
+        return stats
+
+    def close(self):
+        """ Free the scratch area"""
+        self.eve.ramg.free(self.block)
+        self.block = None
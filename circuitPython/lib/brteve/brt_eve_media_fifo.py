@@ -0,0 +1,180 @@
+""" Media FIFO streamer for BridgeTek's EVE chips
+    Feeds a ring in RAM_G from a source, for cmd_playvideo with OPT_MEDIAFIFO, audio
+    playback, or any command reading the media FIFO:
+
+        streamer = BrtEveMediaFifoStreamer(eve, block.addr, block.size,
+                                           eve.REG_MEDIAFIFO_READ, eve.REG_MEDIAFIFO_WRITE)
+        streamer.start(open("/sd/video.avi", "rb"))
+        while not eve.is_finished():
+            streamer.service()
+
+    The source is a file or stream with readinto(), a socket with recv_into(), or an
+    iterable of byte chunks, such as a generator. Data is read into one buffer reused
+    for every write, writes are split at the end of the ring, and the write pointer is
+    updated once per service() call.
+
+    The counters in stats() include the host time spent reading the source and
+    writing EVE, see BrtEveMediaStats for per-interval metrics.
+"""
+import time
+import struct
+
+class BrtEveMediaFifoStreamer(): # pylint: disable=too-many-instance-attributes
+    """ Keep a RAM_G ring filled from a source"""
+
+    def __init__(self, eve, base, size, read_register, write_register=None, # pylint: disable=too-many-arguments
+                 read_origin=0):
+        """ Describe the ring
+            :param eve: BrtEve object
+            :param base: Address of the ring in RAM_G, 4-byte aligned
+            :param size: Size of the ring, multiple of 4
+            :param read_register: Register of EVE's read pointer, such as REG_MEDIAFIFO_READ
+            :param write_register: Register of the write pointer, such as REG_MEDIAFIFO_WRITE,
+                                   None when EVE does not need it, such as for audio playback
+            :param read_origin: Value of the read pointer at the start of the ring: 0 for
+                                REG_MEDIAFIFO_READ, base for REG_PLAYBACK_READPTR
+        """
+        self.eve = eve
+        self.base = base
+        self.size = size
+        self.read_register = read_register
+        self.write_register = write_register
+        self.read_origin = read_origin
+
+        # 3 bytes for the SPI address, then the data
+        chunk = min(eve.write_chunk, size) & ~3
+        self.buffer = bytearray(3 + chunk)
+        self.view = memoryview(self.buffer)
+
+        self.source = None
+        self.pending = None # Rest of the last chunk of an iterable source
+        self.write_pointer = 0
+        self.read_pointer = 0
+        self.eof = True
+
+        self.written = 0
+        self.underruns = 0
+        self.min_fullness = size # Lowest fullness seen by service(), reset by the caller
+        self.read_ns = 0 # Host time in source reads
+        self.write_ns = 0 # Host time in SPI writes
+
+    def start(self, source, write_pointer=0):
+        """ Start streaming a source
+            :param source: Object with readinto() or recv_into(), or an iterable of bytes
+            :param write_pointer: Offset in the ring of the first byte to write
+        """
+        if not hasattr(source, "readinto") and not hasattr(source, "recv_into"):
+            source = iter(source)
+        self.source = source
+        self.pending = None
+        self.write_pointer = self.read_pointer = write_pointer
+        self.eof = False
+        self.written = 0
+        self.underruns = 0
+        self.min_fullness = self.size
+        self.read_ns = 0
+        self.write_ns = 0
+        if self.write_register is not None:
+            self.eve.wr32(self.write_register, write_pointer)
+
+    def _read_pointer(self, value=None):
+        """ Read EVE's read pointer, as an offset in the ring
+            :param value: Value of read_register already read by the caller, None to read it
+        """
+        if value is None:
+            value = self.eve.rd32(self.read_register)
+        self.read_pointer = (value - self.read_origin) % self.size
+        return self.read_pointer
+
+    def fullness(self, read_pointer=None):
+        """ Number of bytes waiting in the ring, reads the read pointer
+            :param read_pointer: Value of read_register already read, None to read it
+        """
+        return (self.write_pointer - self._read_pointer(read_pointer)) % self.size
+
+    def free(self, read_pointer=None):
+        """ Number of bytes which can be written, reads the read pointer
+            A word stays free, so that a full ring does not look empty.
+
+            :param read_pointer: Value of read_register already read, None to read it
+        """
+        return self.size - 4 - self.fullness(read_pointer)
+
+    def _read(self, view):
+        """ Read from the source into a memoryview
+            :return: Number of bytes read, 0 when the source has nothing now
+        """
+        source = self.source
+        if hasattr(source, "readinto"):
+            num = source.readinto(view)
+        elif hasattr(source, "recv_into"):
+            num = source.recv_into(view)
+        else:
+            if not self.pending:
+                try:
+                    self.pending = memoryview(next(source))
+                except StopIteration:
+                    self.eof = True
+                    return 0
+            num = min(len(view), len(self.pending))
+            view[:num] = self.pending[:num]
+            self.pending = self.pending[num:]
+            return num
+
+        if num is None: # Non-blocking stream with no data yet
+            return 0
+        if num == 0:
+            self.eof = True
+        return num
+
+    def service(self, read_pointer=None):
+        """ Write as much of the source as the ring takes now
+            :param read_pointer: Value of read_register already read, such as from a snapshot
+                                 of several registers, None to read it
+            :return: Number of bytes written
+        """
+        if self.eof:
+            return 0
+
+        fullness = self.fullness(read_pointer)
+        if fullness == 0 and self.written > 0:
+            self.underruns += 1
+        self.min_fullness = min(self.min_fullness, fullness)
+        free = self.size - 4 - fullness
+
+        eve = self.eve
+        buffer = self.buffer
+        view = self.view
+        written = 0
+        while free > 0:
+            # Up to the end of the ring
+            num = min(len(buffer) - 3, free, self.size - self.write_pointer)
+            # SPI write address, its 4th byte is overwritten by the data
+            struct.pack_into(">I", buffer, 0, (0x800000 | (self.base + self.write_pointer)) << 8)
+            started = time.monotonic_ns()
+            num = self._read(view[3:3 + num])
+            read = time.monotonic_ns()
+            self.read_ns += read - started
+            if num == 0:
+                break
+
+            eve.host.transfer(view[:3 + num])
+            self.write_ns += time.monotonic_ns() - read
+            self.write_pointer = (self.write_pointer + num) % self.size
+            free -= num
+            written += num
+
+        if written and self.write_register is not None:
+            started = time.monotonic_ns()
+            eve.wr32(self.write_register, self.write_pointer)
+            self.write_ns += time.monotonic_ns() - started
+        self.written += written
+        return written
+
+    def stats(self):
+        """ Streaming counters
+            :return: dict with keys written, underruns, fullness, eof, read_ms, write_ms
+        """
+        return {'written':self.written, 'underruns':self.underruns,
+            'fullness':(self.write_pointer - self.read_pointer) % self.size, 'eof':self.eof,
+            'read_ms':self.read_ns // 1000000, 'write_ms':self.write_ns // 1000000}
@@ -0,0 +1,147 @@
+""" Media playback metrics
+    Samples a BrtEveMediaFifoStreamer at a fixed interval, to tune the media fifo size
+    and the chunk size of a deployment:
+
+        mp = eve.movie_player("/sd/video.avi")
+        mp.instrument(interval=1.0, trace_size=60, csv="/sd/video.csv")
+        mp.play()
+        print(mp.media_stats.counters())
+        for row in mp.media_stats.trace():
+            print(row)
+
+    Each row covers one interval:
+        time        seconds since start()
+        bytes_per_s bytes written to the fifo per second
+        fullness    bytes waiting in the fifo at the end of the interval
+        min_fullness lowest fullness seen by service() during the interval
+        underruns   times service() found the fifo empty
+        frames      REG_FRAMES increments, the frames displayed
+        read_ms     host time spent reading the source
+        write_ms    host time spent writing EVE over SPI
+
+    Rows go to an optional ring buffer of the last trace_size rows, and to an optional
+    CSV file. The audio player's streamer can be sampled the same way, calling sample()
+    after its service().
+"""
+import time
+
+CSV_HEADER = "time,bytes_per_s,fullness,min_fullness,underruns,frames,read_ms,write_ms\n"
+
+class BrtEveMediaStats(): # pylint: disable=too-many-instance-attributes
+    """ Per-interval metrics of a media fifo streamer"""
+
+    def __init__(self, eve, streamer, interval=1.0, trace_size=0, csv=None): # pylint: disable=too-many-arguments
+        """ :param eve: BrtEve object
+            :param streamer: BrtEveMediaFifoStreamer to sample
+            :param interval: Time covered by a row, in seconds
+            :param trace_size: Number of rows kept in the ring buffer, 0 for none
+            :param csv: Optional path of a CSV file, or an object with write(), for the rows
+        """
+        self.eve = eve
+        self.streamer = streamer
+        self.interval = interval
+        self.csv = csv
+        self.csv_file = None # File opened by start() when csv is a path
+
+        self.rows = [None] * trace_size
+        self.next_row = 0
+        self.row_count = 0
+
+        self.running = False
+        self.started = 0
+        self.last_time = 0
+        self.last_written = 0
+        self.last_underruns = 0
+        self.last_frames = 0
+        self.last_read_ns = 0
+        self.last_write_ns = 0
+        self.total_frames = 0
+
+    def start(self):
+        """ Start a measure, called after the streamer's start()"""
+        eve = self.eve
+        streamer = self.streamer
+        self.started = self.last_time = time.monotonic()
+        self.last_written = streamer.written
+        self.last_underruns = streamer.underruns
+        self.last_read_ns = streamer.read_ns
+        self.last_write_ns = streamer.write_ns
+        self.last_frames = eve.rd32(eve.REG_FRAMES)
+        self.total_frames = 0
+        streamer.min_fullness = streamer.size
+        self.next_row = self.row_count = 0
+        self.running = True
+
+        if isinstance(self.csv, str):
+            self.csv_file = open(self.csv, "w") # pylint: disable=consider-using-with,unspecified-encoding
+            self.csv_file.write(CSV_HEADER)
+        elif self.csv is not None:
+            self.csv.write(CSV_HEADER)
+
+    def sample(self, force=False):
+        """ Record a row once the interval elapsed, called after the streamer's service()
+            :param force: Record the interval so far, such as at the end of playback
+            :return: The row recorded, None if the interval is not over
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed <= 0 or (elapsed < self.interval and not force):
+            return None
+
+        eve = self.eve
+        streamer = self.streamer
+        frames = eve.rd32(eve.REG_FRAMES)
+        row = (round(now - self.started, 3),
+            int((streamer.written - self.last_written) / elapsed),
+            streamer.fullness(),
+            streamer.min_fullness,
+            streamer.underruns - self.last_underruns,
+            (frames - self.last_frames) & 0xffffffff,
+            (streamer.read_ns - self.last_read_ns) // 1000000,
+            (streamer.write_ns - self.last_write_ns) // 1000000)
+
+        self.last_time = now
+        self.last_written = streamer.written
+        self.last_underruns = streamer.underruns
+        self.last_frames = frames
+        self.last_read_ns = streamer.read_ns
+        self.last_write_ns = streamer.write_ns
+        self.total_frames += row[5]
+        streamer.min_fullness = streamer.size
+
+        if self.rows:
+            self.rows[self.next_row] = row
+            self.next_row = (self.next_row + 1) % len(self.rows)
+        self.row_count += 1
+        output = self.csv_file or self.csv
+        if output is not None:
+            output.write(",".join(str(value) for value in row) + "\n")
+        return row
+
+    def trace(self):
+        """ Rows of the ring buffer, oldest first"""
+        if self.row_count < len(self.rows):
+            return self.rows[:self.row_count]
+        return self.rows[self.next_row:] + self.rows[:self.next_row]
+
+    def counters(self):
+        """ Totals since start()
+            :return: dict with keys seconds, written, bytes_per_s, underruns, frames,
+                     read_ms, write_ms
+        """
+        streamer = self.streamer
+        seconds = self.last_time - self.started
+        return {'seconds':seconds, 'written':streamer.written,
+            'bytes_per_s':int(streamer.written / seconds) if seconds > 0 else 0,
+            'underruns':streamer.underruns, 'frames':self.total_frames,
+            'read_ms':streamer.read_ns // 1000000, 'write_ms':streamer.write_ns // 1000000}
+
+    def close(self):
+        """ Record the last interval, and close the CSV file opened by start()"""
+        if not self.running:
+            return
+        self.running = False
+        self.sample(force=True)
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
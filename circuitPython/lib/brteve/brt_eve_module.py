@@ -4,6 +4,9 @@ import struct
 from collections import namedtuple
 
 from .brt_eve_movie_player import BrtEveMoviePlayer
+from .brt_eve_ramg import BrtEveRamG
+from .brt_eve_dl_compress import BrtEveDlCompressor, HOST_DEFLATE, CMD_SWAP, \
+    DL_COMPRESS_THRESHOLD, DL_COMPRESS_MIN_RUN
 from .brt_eve_common import BrtEveCommon, align4
 
 # Order matches the register layout, so can fill with a single block read
@@ -70,11 +73,22 @@ class BrtEveModule(BrtEveCommon, BrtEveMoviePlayer): # pylint: disable=too-many-
         self.prev_touching = 0
         self.inputs = 0
 
+        # Transfer sizes, see setup_transfer_size()
+        self.write_chunk = 1000
+        self.read_chunk = 1000
+
+        # RAM_G heap
+        self.ramg = BrtEveRamG(self)
+
+        # Compressed display list transport, see dl_compress()
+        self.dl_compressor = None
+
     def init(self, resolution = "", touch = ""):
         """Start up EVE and light up LCD"""
 
         print("Initialing for MCU " + self.eve.eve_type)
         self.eve.register(self)
+        self.setup_transfer_size()
         self.coldstart()
 
         # Programming Guide 2.4: Initialization Sequence during Boot Up
@@ -120,6 +134,29 @@ class BrtEveModule(BrtEveCommon, BrtEveMoviePlayer): # pylint: disable=too-many-
         self.lcd_width = self.rd32(self.eve.REG_HSIZE)
         self.lcd_height = self.rd32(self.eve.REG_VSIZE)
 
+    def setup_transfer_size(self):
+        """ Size data chunks after the capabilities the host advertises
+
+        A host may set max_transfer_size, max_read_size and transfer_alignment,
+        otherwise the previous fixed sizes are kept.
+        The command buffer of _EVE.cc is bounded by half the FIFO size as well:
+        a flush may end in the middle of a command, which holds its FIFO space
+        until the rest arrives, so a flush close to FIFO_MAX could wait forever.
+        """
+        address_bytes = 3
+        dummy_bytes = 1
+        alignment = getattr(self.host, "transfer_alignment", 4)
+        max_transfer_size = getattr(self.host, "max_transfer_size", 0)
+        max_read_size = getattr(self.host, "max_read_size", max_transfer_size)
+
+        if max_transfer_size > address_bytes + alignment:
+            size = max_transfer_size - address_bytes
+            self.write_chunk = size - size % alignment
+            self.buffer_len = min(self.write_chunk, self.FIFO_MAX // 2 & ~3)
+        if max_read_size > dummy_bytes + alignment:
+            size = max_read_size - dummy_bytes
+            self.read_chunk = size - size % alignment
+
     def spi_sdcard(self):
         """ Return SPI sdcard object"""
         return self.host.spi_sdcard
@@ -229,16 +266,37 @@ class BrtEveModule(BrtEveCommon, BrtEveMoviePlayer): # pylint: disable=too-many-
         self.transfer_write(address, struct.pack("I", value))
 
     def write_mem(self, address, buff):
-        """Write a buffer to EVE"""
-        self.transfer_write(address, buff)
+        """Write a buffer to EVE, in chunks the host can transfer at once"""
+        chunk = self.write_chunk
+        if len(buff) <= chunk:
+            self.transfer_write(address, buff)
+            return
+
+        view = memoryview(buff)
+        for offset in range(0, len(buff), chunk):
+            self.transfer_write(address + offset, bytes(view[offset:offset + chunk]))
 
     def read_mem(self, address, size):
-        """Write a buffer to EVE"""
-        return self.transfer_read(address, size)
+        """Read a buffer from EVE, in chunks the host can transfer at once"""
+        chunk = self.read_chunk
+        if size <= chunk:
+            return self.transfer_read(address, size)
+
+        buff = bytearray(size)
+        self.read_mem_into(address, buff)
+        return bytes(buff)
+
+    def read_mem_into(self, address, buff):
+        """Read from EVE into a bytearray or memoryview, such as a buffer reused between reads"""
+        view = memoryview(buff)
+        chunk = self.read_chunk
+        for offset in range(0, len(view), chunk):
+            num = min(chunk, len(view) - offset)
+            view[offset:offset + num] = self.transfer_read(address + offset, num)
 
     def write_file(self, address, file):
         """Write a buffer to EVE's RAM_G"""
-        chunksize = 1000
+        chunksize = self.write_chunk
         with open(file, 'rb') as file_handle:
             while True:
                 buff = file_handle.read(chunksize)
@@ -302,6 +360,53 @@ class BrtEveModule(BrtEveCommon, BrtEveMoviePlayer): # pylint: disable=too-many-
         self.flush()
         self.reserve(self.FIFO_MAX)
 
+    def dl_compress(self, enable=True, threshold=DL_COMPRESS_THRESHOLD,
+                    min_run=DL_COMPRESS_MIN_RUN):
+        """ Send display list commands compressed, inflated to RAM_G and run by cmd_append
+            See brt_eve_dl_compress. Statistics are in dl_compressor.
+
+            :param enable: False to send every command raw again
+            :param threshold: Part of a run which compressing must save, 0.2 for 20%
+            :param min_run: Runs shorter than this, in bytes, are sent raw
+            :return: True if enabled
+        """
+        if self.dl_compressor is not None:
+            self.flush()
+            self.dl_compressor.close()
+            self.dl_compressor = None
+        if not enable:
+            return False
+        if not HOST_DEFLATE:
+            print("zlib compression not available, display list sent raw")
+            return False
+        self.dl_compressor = BrtEveDlCompressor(self, threshold, min_run)
+        return True
+
+    def c4(self, i):
+        """Send a 32-bit value, display list commands go to the compressor when enabled"""
+        compressor = self.dl_compressor
+        if compressor is None or i >> 24 == 0xff:
+            super().c4(i)
+            if compressor is not None and i == CMD_SWAP:
+                compressor.end_frame()
+            return
+
+        run = compressor.word(i)
+        if run:
+            super().cc(run)
+
+    def cc(self, s):
+        """Buffer commands, after the display list commands being compressed"""
+        if self.dl_compressor is not None and self.dl_compressor.run:
+            super().cc(self.dl_compressor.flush_run())
+        super().cc(s)
+
+    def flush(self):
+        """Send the buffered commands"""
+        if self.dl_compressor is not None and self.dl_compressor.run:
+            super().cc(self.dl_compressor.flush_run())
+        super().flush()
+
     def VertexFormat(self, fmt):  # pylint: disable=invalid-name
         """Overwride function VertexFormat of _EVE class, do nothing if ft80x is in use"""
         if self.eve.eve_type == "ft80x":
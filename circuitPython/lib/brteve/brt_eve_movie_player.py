@@ -1,11 +1,76 @@
 
-""" Movie player for BridgeTek's EVE chips"""
+""" Movie player for BridgeTek's EVE chips
+    play() blocks until the end of the video. To keep the application running, call
+    service() from its loop instead:
+
+        mp = eve.movie_player("/sd/video.avi")
+        mp.start(compose=True)
+        while mp.service(5):
+            if mp.new_frame:
+                eve.cmd_dlstart()
+                mp.draw_frame(0, 0)
+                ...             # overlays
+                eve.cmd_swap()
+                eve.flush()
+            ...                 # touch, sensors
+        mp.stop()
+
+    Without compose, cmd_playvideo draws the video itself and holds the coprocessor
+    until the end. With compose, cmd_videoframe decodes each frame to RAM_G, drawn
+    as a bitmap by the application's display list, but without sound.
+
+    The idx1 index of an AVI file gives the offset of each frame, to start at a frame
+    or a time, or to loop a range of frames:
+
+        mp = eve.movie_player("/sd/video.avi").segment_time(30, 40, loop=True)
+        mp.start(compose=True)
+        while mp.service(5):
+            ...
+            progress = mp.progress()
+"""
+import time
 from .brt_eve_common import const
+from .brt_eve_media_fifo import BrtEveMediaFifoStreamer
+from .brt_eve_avi_index import BrtEveAviIndex, BrtEveAviSegment
+from .brt_eve_media_stats import BrtEveMediaStats
 
 _SOURCE_FILE = 0
 _SOURCE_FLASH = 1
-class BrtEveMoviePlayer:
+
+# Completion word of cmd_videoframe while the frame decodes
+_FRAME_PENDING = const(0xffffffff)
+# Longest wait of stop() for the frame being decoded, in seconds
+_STOP_TIMEOUT = 1.0
+
+class BrtEveMoviePlayer: # pylint: disable=too-many-instance-attributes
     """ Helper class to play movie with EVE """
+    mf_block = None # Media fifo allocated from eve.ramg
+    streamer = None # BrtEveMediaFifoStreamer of the media fifo
+
+    # Stepwise playback, see start()
+    playing = False
+    compose = False
+    file_handler = None # File opened by start()
+    frame_block = None # Frame and completion word, allocated from eve.ramg
+    frame_pending = False
+    new_frame = False
+    video_frames = 0
+    video_width = 0
+    video_height = 0
+    frame_interval = 0
+    next_frame = 0
+
+    # Seeking, see segment()
+    avi = None # BrtEveAviIndex, parsed once per movie
+    flash_address = 0
+    first_frame = 0
+    last_frame = None
+    loop = False
+    avi_segment = None # BrtEveAviSegment fed to the media fifo
+
+    # Metrics, see instrument()
+    stats_config = None
+    media_stats = None # BrtEveMediaStats of the last playback
     def __init__(self):
         self.source = _SOURCE_FILE
         self.file = ''
@@ -25,11 +90,25 @@ class BrtEveMoviePlayer:
 
         self.flag = eve.OPT_FLASH | eve.OPT_FULLSCREEN | eve.OPT_NOTEAR | eve.OPT_SOUND
         eve.cmd_flashsource(flash_address)
+        self.flash_address = flash_address
+        self._reset_segment()
         return self
 
-    def movie_player(self, file: str, mf_base=const(0xF0000), mf_size=const(0x8000)):
-        """ Play video from a file handler via media fifo"""
+    def movie_player(self, file, mf_base=None, mf_size=const(0x8000)):
+        """ Play video from a file via media fifo
+            The media fifo is allocated from the top of eve.ramg, unless mf_base is given.
+
+            :param file: Path of the file, or a source of BrtEveMediaFifoStreamer: an
+                         opened file, a socket, or a generator of bytes
+        """
         eve = self.eve
+        if self.mf_block is not None:
+            eve.ramg.free(self.mf_block)
+            self.mf_block = None
+        if mf_base is None:
+            self.mf_block = eve.ramg.alloc(mf_size, pinned=True, name="mediafifo", top=True)
+            mf_base = self.mf_block.addr
+
         self.file = file
         self.mf_base = mf_base
         self.mf_size = mf_size
@@ -38,8 +117,140 @@ class BrtEveMoviePlayer:
         eve.cmd_mediafifo(mf_base, mf_size)
         self.write_pointer = 0
         eve.cmd_regwrite(eve.REG_MEDIAFIFO_WRITE, 0)
+        self.streamer = BrtEveMediaFifoStreamer(eve, mf_base, mf_size,
+            eve.REG_MEDIAFIFO_READ, eve.REG_MEDIAFIFO_WRITE)
 
         self.flag = eve.OPT_MEDIAFIFO | eve.OPT_FULLSCREEN | eve.OPT_NOTEAR | eve.OPT_SOUND
+        self._reset_segment()
+        return self
+
+    def _reset_segment(self):
+        """ Forget the index of the previous movie, and play the whole new one"""
+        self.avi = None
+        self.first_frame = 0
+        self.last_frame = None
+        self.loop = False
+
+    def avi_index(self):
+        """ Parse the idx1 index of the AVI file, once per movie
+            :return: BrtEveAviIndex, None if the movie has no index or its source cannot seek
+        """
+        if self.avi is not None:
+            return self.avi
+        try:
+            if self.source == _SOURCE_FLASH:
+                self.avi = self._flash_avi_index()
+            elif isinstance(self.file, str):
+                with open(self.file, "rb") as handler:
+                    self.avi = self._file_avi_index(handler)
+            elif hasattr(self.file, "seek"):
+                position = self.file.tell()
+                self.avi = self._file_avi_index(self.file)
+                self.file.seek(position)
+        except (OSError, ValueError) as exception:
+            print("No AVI index:", exception)
+        return self.avi
+
+    @staticmethod
+    def _file_avi_index(handler):
+        """ Parse the index of an opened AVI file"""
+        handler.seek(0, 2)
+        size = handler.tell()
+        def read_at(offset, num):
+            handler.seek(offset)
+            return handler.read(num)
+        return BrtEveAviIndex(read_at, size)
+
+    def _flash_avi_index(self):
+        """ Parse the index of an AVI file in flash, read through a RAM_G scratch block"""
+        eve = self.eve
+        storage = eve.storage
+        block = eve.ramg.alloc(2048, name="avi index")
+        def read_at(offset, num):
+            address = self.flash_address + offset
+            aligned = address - address % 64
+            skip = address - aligned
+            data = storage.read_flash_via_ramg(block.addr, aligned, (skip + num + 3) & ~3)
+            return bytes(data[skip:skip + num])
+        try:
+            # The RIFF header bounds the reads
+            return BrtEveAviIndex(read_at, eve.rd32(eve.REG_FLASH_SIZE) * 1024 * 1024)
+        finally:
+            eve.ramg.free(block)
+
+    def frame_address(self, frame):
+        """ Flash address of the chunk of a frame, for cmd_flashsource, of a movie in flash"""
+        return self.flash_address + self.avi_index().frames[frame]
+
+    def segment(self, first=0, last=None, loop=False):
+        """ Play a range of frames, before start()
+            A movie in flash can start at a frame with compose only, and plays to its end.
+
+            :param first: First frame
+            :param last: Last frame, included, None for the end of the movie
+            :param loop: Play the range again after its last frame
+            :return: self, or None without AVI index
+        """
+        index = self.avi_index()
+        if index is None or len(index) == 0:
+            return None
+        self.first_frame = max(0, min(first, len(index) - 1))
+        self.last_frame = None if last is None else max(self.first_frame, min(last, len(index) - 1))
+        self.loop = loop
+        return self
+
+    def segment_time(self, start, end=None, loop=False):
+        """ Play a range of time, before start(), see segment()
+            :param start: Start time in seconds
+            :param end: End time in seconds, None for the end of the movie
+            :param loop: Play the range again after its end
+            :return: self, or None without AVI index
+        """
+        index = self.avi_index()
+        if index is None:
+            return None
+        last = None if end is None else index.frame_at_time(end)
+        return self.segment(index.frame_at_time(start), last, loop)
+
+    def current_frame(self):
+        """ Frame playing now, estimated from the data EVE took from the media fifo
+            A movie in flash reports the frames decoded with compose only.
+        """
+        index = self.avi
+        if index is None or len(index) == 0:
+            return self.first_frame
+        if self.source == _SOURCE_FLASH:
+            return min(self.first_frame + max(0, self.video_frames - 1), len(index) - 1)
+
+        streamer = self.streamer
+        if streamer is None or streamer.written == 0:
+            return self.first_frame
+        consumed = streamer.written - streamer.fullness()
+        segment = self.avi_segment
+        if segment is None:
+            return index.frame_at_offset(consumed)
+        if consumed < segment.header_end:
+            return self.first_frame
+        position = consumed - segment.header_end
+        if self.loop:
+            position %= segment.end - segment.start
+        return index.frame_at_offset(segment.start + position)
+
+    def progress(self):
+        """ Part of the movie played, 0 to 1, 0 without AVI index"""
+        index = self.avi
+        if index is None or len(index) < 2:
+            return 0
+        return self.current_frame() / (len(index) - 1)
+
+    def instrument(self, interval=1.0, trace_size=0, csv=None):
+        """ Record media fifo metrics of the next playbacks from file, in media_stats
+            :param interval: Time covered by a row, in seconds, None to stop recording
+            :param trace_size: Number of rows kept in memory, 0 for none
+            :param csv: Optional path of a CSV file, or an object with write(), for the rows
+            :return: self
+        """
+        self.stats_config = None if interval is None else (interval, trace_size, csv)
         return self
 
     def set_flag(self, flag):
@@ -56,36 +267,234 @@ class BrtEveMoviePlayer:
         eve.wr8(eve.REG_VOL_PB, vol)
         
     def play(self):
-        """ Start playback a movie"""
+        """ Play the movie, return at the end"""
+        self.start()
+        while self.service(50):
+            pass
+        self.stop()
+
+    def start(self, compose=False, width=0, height=0, fps=0):
+        """ Start playback, then call service() until it returns False, and stop()
+            :param compose: False to let cmd_playvideo draw the video, True to decode frames
+                            to RAM_G for draw_frame()
+            :param width: Video width with compose, read from the video if 0
+            :param height: Video height with compose, read from the video if 0
+            :param fps: Frames per second with compose, 0 to decode as fast as possible
+        """
         eve = self.eve
+        self.compose = compose
+        self.playing = True
+        self.video_frames = 0
+        self.new_frame = False
+        self.frame_pending = False
+        self.frame_interval = 1 / fps if fps else 0
+        self.next_frame = time.monotonic()
+
         eve.wr8(eve.REG_GPIOX_DIR,0xFF)
         eve.wr8(eve.REG_GPIOX,0xFF)
-
         self.set_volume(0xFF)
-        eve.cmd_playvideo(self.flag)
 
+        self.avi_segment = None
+        seeking = self.first_frame > 0 or self.last_frame is not None or self.loop
         if self.source == _SOURCE_FILE:
+            source = self.file
+            if isinstance(source, str):
+                self.file_handler = source = open(source, "rb") # pylint: disable=consider-using-with
+            if seeking:
+                last = self.last_frame
+                if last is None:
+                    last = len(self.avi) - 1
+                source = self.avi_segment = BrtEveAviSegment(source, self.avi,
+                    self.first_frame, last, self.loop)
+            self.streamer.start(source)
+            self.media_stats = None
+            if self.stats_config is not None:
+                interval, trace_size, csv = self.stats_config
+                self.media_stats = BrtEveMediaStats(eve, self.streamer, interval, trace_size, csv)
+                self.media_stats.start()
+        elif seeking and not compose:
+            print("Starting a movie in flash at a frame needs compose")
+
+        if not compose:
+            eve.cmd_playvideo(self.flag)
             eve.Nop()
             eve.flush()
-            with open(self.file, "rb") as file_handler:
-                while not eve.is_finished():
-                    self._file_service(file_handler)
+            return
+        self._start_compose(width, height)
+
+    def _start_compose(self, width, height):
+        """ Start decoding frames to RAM_G: read the video size if not given, allocate
+            the frame, and move a flash source to the first frame
+        """
+        eve = self.eve
+        if self.source == _SOURCE_FLASH:
+            eve.cmd_videostartf()
+        else:
+            eve.cmd_videostart()
+        if (not width or not height) and self.avi is not None and self.avi.width:
+            width = self.avi.width
+            height = self.avi.height
+        if not width or not height:
+            # The header is parsed once its data is in the media fifo
+            eve.cmd_getprops()
+            self._wait_idle()
+            width = eve.result(2)
+            height = eve.result(1)
+        self.video_width = width
+        self.video_height = height
+        self.frame_block = eve.ramg.alloc(width * height * 2 + 4, pinned=True,
+            name="video frame", top=True)
+        if self.source == _SOURCE_FLASH and self.first_frame > 0:
+            self._skip_flash_frames(self.first_frame)
 
-        eve.Nop()
+    def _skip_flash_frames(self, first):
+        """ Move the flash source to a frame: cmd_flashsource takes 64-byte aligned
+            addresses, so jump to the last aligned frame before, and decode the frames
+            left without showing them
+        """
+        eve = self.eve
+        frame = first
+        while frame > 0 and self.frame_address(frame) % 64 != 0:
+            frame -= 1
+        if frame > 0:
+            eve.cmd_flashsource(self.frame_address(frame))
+        done = self.frame_block.addr + self.frame_block.size - 4
+        for _ in range(first - frame):
+            eve.cmd_videoframe(self.frame_block.addr, done)
         eve.finish()
 
-    def _file_service(self, file_handler):
-        """ Send movie data chunk by chunk"""
+    def _wait_idle(self, timeout=None):
+        """ Feed the media fifo until the coprocessor is idle
+            :param timeout: Longest wait in seconds, None to wait until idle
+            :return: True once idle, False on timeout
+        """
+        eve = self.eve
+        eve.flush()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not eve.is_finished():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            if self.source == _SOURCE_FILE:
+                self.streamer.service()
+        return True
+
+    def _starved(self):
+        """ True when the file is read to the end and the media fifo is empty"""
+        return self.source == _SOURCE_FILE and self.streamer.eof and \
+            self.streamer.fullness() == 0
+
+    def service(self, budget_ms=5):
+        """ Feed the media fifo and decode frames, for about budget_ms
+            With compose, returns as soon as a frame is decoded, new_frame is then True.
+
+            :param budget_ms: Time to spend, in milliseconds
+            :return: True while the video plays, and once more for the last frame
+        """
         eve = self.eve
+        deadline = time.monotonic() + budget_ms / 1000
+        self.new_frame = False
+        stats = self.media_stats if self.source == _SOURCE_FILE else None
+        while self.playing:
+            if self.source == _SOURCE_FILE:
+                self.streamer.service()
+                if stats is not None:
+                    stats.sample()
+
+            if self.compose:
+                self._service_frame()
+            elif eve.is_finished():
+                self.playing = False
+            elif self.avi_segment is not None and self._starved():
+                # cmd_playvideo waits for the frames after the range
+                self._exit_playvideo()
+                self.playing = False
 
-        read_pointer = eve.rd32(eve.REG_MEDIAFIFO_READ)
-        fullness = (self.write_pointer - read_pointer) % self.mf_size
-        chunk_size = 2048
-        while fullness < (self.mf_size - chunk_size):
-            chunk = file_handler.read(chunk_size)
-            if not chunk:
+            if self.new_frame or time.monotonic() >= deadline:
+                break
+        return self.playing or self.new_frame
+
+    def _service_frame(self):
+        """ Queue the decoding of the next frame, or collect the decoded one"""
+        eve = self.eve
+        done = self.frame_block.addr + self.frame_block.size - 4
+        if not self.frame_pending:
+            if time.monotonic() < self.next_frame:
                 return
-            eve.write_mem(self.mf_base + self.write_pointer, chunk)
-            self.write_pointer = (self.write_pointer + len(chunk)) % self.mf_size
-            eve.wr32(eve.REG_MEDIAFIFO_WRITE, self.write_pointer)
-            fullness += len(chunk)
+            self.next_frame += self.frame_interval
+            eve.wr32(done, _FRAME_PENDING)
+            eve.cmd_videoframe(self.frame_block.addr, done)
+            eve.flush()
+            self.frame_pending = True
+            return
+
+        status = eve.rd32(done)
+        if status == _FRAME_PENDING:
+            return
+        self.frame_pending = False
+        self.new_frame = True
+        self.video_frames += 1
+        if status == 0: # Last frame
+            self.playing = False
+        segment = self.avi_segment
+        if segment is not None and not self.loop and self.last_frame is not None and \
+                self.video_frames > self.last_frame - self.first_frame:
+            # The decoder would wait for the frames after the range
+            self.playing = False
+
+    def _exit_playvideo(self, timeout=None):
+        """ End cmd_playvideo or cmd_videoframe: BT815 and later exit the video, FT81X
+            plays it to the end
+            :param timeout: Longest wait in seconds, None to wait until idle
+            :return: True once the coprocessor is idle, False on timeout
+        """
+        eve = self.eve
+        control = getattr(eve, "REG_PLAY_CONTROL", None)
+        if control is not None:
+            eve.wr8(control, 0xff) # exit
+        idle = self._wait_idle(timeout)
+        if control is not None:
+            eve.wr8(control, 1)
+        return idle
+
+    def draw_frame(self, x=0, y=0):
+        """ Draw the last decoded frame, with compose
+            :param x: x-coordinate of the top left corner, in pixels
+            :param y: y-coordinate of the top left corner, in pixels
+        """
+        eve = self.eve
+        eve.cmd_setbitmap(self.frame_block.addr, eve.RGB565, self.video_width, self.video_height)
+        eve.Begin(eve.BITMAPS)
+        eve.Vertex2f(x, y)
+        eve.End()
+
+    def stop(self):
+        """ End playback, early or at the end, and release the file and RAM_G"""
+        eve = self.eve
+        idle = True
+        if self.playing and not self.compose:
+            self._exit_playvideo()
+        deadline = time.monotonic() + _STOP_TIMEOUT
+        while self.frame_pending and not self._starved() and time.monotonic() < deadline:
+            # The coprocessor waits for the rest of the frame
+            self.service()
+        if self.frame_pending:
+            self.service(0)
+        if self.frame_pending:
+            # The rest of the frame never comes
+            idle = self._exit_playvideo(_STOP_TIMEOUT)
+        self.playing = False
+        self.frame_pending = False
+        if idle:
+            eve.Nop()
+            eve.finish()
+        else:
+            print("The video decoder does not stop, the coprocessor is busy")
+
+        if self.file_handler is not None:
+            self.file_handler.close()
+            self.file_handler = None
+        if self.media_stats is not None:
+            self.media_stats.close()
+        if self.frame_block is not None:
+            eve.ramg.free(self.frame_block)
+            self.frame_block = None
@@ -0,0 +1,214 @@
+""" RAM_G heap for BridgeTek's EVE chips
+    Bitmaps, media FIFOs and audio buffers get their RAM_G from one allocator,
+    instead of hardcoded addresses which may overlap:
+
+        block = eve.ramg.alloc(64 * 1024, align=eve.ramg.ALIGN_FLASH_READ, name="car")
+        eve.cmd_flashread(block.addr, flash_address, block.size)
+        ...
+        eve.ramg.free(block)
+
+    Blocks are handles: compact() moves the blocks which are not pinned with cmd_memcpy,
+    so read block.addr again after compacting.
+
+    Long-lived buffers, such as media FIFOs and audio rings, are allocated from the top
+    of RAM_G with top=True, so the short-lived blocks of bitmaps and BrtEveStorage
+    staging do not split the heap around them.
+"""
+
+FIRST_FIT = 0
+BEST_FIT = 1
+
+class BrtEveRamGBlock(): # pylint: disable=too-few-public-methods
+    """ An allocated RAM_G block"""
+    def __init__(self, addr, size, align, pinned, name):
+        self.addr = addr
+        self.size = size
+        self.align = align
+        self.pinned = pinned
+        self.name = name
+
+    def __repr__(self):
+        return "<RAM_G %s 0x%x+%d%s>" % (self.name, self.addr, self.size,
+            " pinned" if self.pinned else "")
+
+class BrtEveRamG():
+    """ First-fit or best-fit allocator over a free list of RAM_G holes"""
+
+    ALIGN_BITMAP = 4 # Bitmaps, media FIFOs, and cmd_memcpy/memset/memcrc
+    ALIGN_FLASH_READ = 64 # Whole flash read blocks
+
+    def __init__(self, eve, base=0, size=None, strategy=FIRST_FIT):
+        """ Manage a RAM_G area
+            :param eve: BrtEve object
+            :param base: Start of the area in RAM_G
+            :param size: Size of the area, up to the end of RAM_G by default
+            :param strategy: FIRST_FIT, fastest, or BEST_FIT, less fragmentation
+        """
+        self.eve = eve
+        self.base = base
+        self.size = eve.RAM_G_SIZE - base if size is None else size
+        self.strategy = strategy
+        self.holes = [] # [address, size], sorted by address
+        self.blocks = [] # BrtEveRamGBlock, sorted by address
+        self.reset()
+
+    def reset(self):
+        """ Free every block, such as after a coprocessor reset"""
+        self.holes = [[self.base, self.size]]
+        self.blocks = []
+
+    def _find(self, size, align, top=False):
+        """ Find a hole for size bytes aligned to align
+            :param top: Search from the end of RAM_G, taking the end of the hole
+            :return: Index of the hole and aligned address, or (-1, 0)
+        """
+        found = -1
+        found_addr = 0
+        found_waste = 0
+        holes = list(enumerate(self.holes))
+        for i, (addr, hole_size) in reversed(holes) if top else holes:
+            if top:
+                start = (addr + hole_size - size) // align * align
+            else:
+                start = (addr + align - 1) // align * align
+            waste = hole_size - size - (start - addr)
+            if waste < 0 or start < addr:
+                continue
+            if self.strategy == FIRST_FIT:
+                return i, start
+            if found < 0 or waste < found_waste:
+                found, found_addr, found_waste = i, start, waste
+        return found, found_addr
+
+    def _take(self, index, start, size):
+        """ Remove start..start+size from a hole, keeping what is left on both sides"""
+        addr, hole_size = self.holes[index]
+        end = addr + hole_size
+        parts = []
+        if start > addr:
+            parts.append([addr, start - addr])
+        if start + size < end:
+            parts.append([start + size, end - start - size])
+        self.holes[index:index + 1] = parts
+
+    def _insert(self, block):
+        """ Keep the blocks sorted by address"""
+        i = 0
+        while i < len(self.blocks) and self.blocks[i].addr < block.addr:
+            i += 1
+        self.blocks.insert(i, block)
+
+    def alloc(self, size, align=ALIGN_BITMAP, pinned=False, name=None, top=False): # pylint: disable=too-many-arguments
+        """ Allocate a block
+            :param size: Number of bytes, rounded up to 4
+            :param align: Address alignment, power of 2: ALIGN_BITMAP, ALIGN_FLASH_READ...
+            :param pinned: Set to True to keep the block in place on compact()
+            :param name: Optional name, shown by stats()
+            :param top: Set to True to allocate from the end of RAM_G, for long-lived buffers
+            :return: BrtEveRamGBlock, raise MemoryError when no hole is large enough
+        """
+        size = (size + 3) & ~3
+        align = max(align, 4)
+        index, start = self._find(size, align, top)
+        if index < 0:
+            raise MemoryError("RAM_G: no hole for %d bytes, largest is %d" % (
+                size, self.largest_hole()))
+
+        self._take(index, start, size)
+        block = BrtEveRamGBlock(start, size, align, pinned, name)
+        self._insert(block)
+        return block
+
+    def reserve(self, addr, size, name=None):
+        """ Take a fixed area out of the heap, as a pinned block
+            :param addr: Start of the area
+            :param size: Number of bytes
+            :param name: Optional name, shown by stats()
+            :return: BrtEveRamGBlock, raise MemoryError when the area is not free
+        """
+        for i, (hole_addr, hole_size) in enumerate(self.holes):
+            if hole_addr <= addr and addr + size <= hole_addr + hole_size:
+                self._take(i, addr, size)
+                block = BrtEveRamGBlock(addr, size, 4, True, name)
+                self._insert(block)
+                return block
+        raise MemoryError("RAM_G: 0x%x+%d is not free" % (addr, size))
+
+    def free(self, block):
+        """ Give a block back to the heap, merging it with the holes around"""
+        self.blocks.remove(block)
+        addr, size = block.addr, block.size
+
+        i = 0
+        while i < len(self.holes) and self.holes[i][0] < addr:
+            i += 1
+        self.holes.insert(i, [addr, size])
+        if i + 1 < len(self.holes) and addr + size == self.holes[i + 1][0]:
+            self.holes[i][1] += self.holes[i + 1][1]
+            del self.holes[i + 1]
+        if i > 0 and self.holes[i - 1][0] + self.holes[i - 1][1] == addr:
+            self.holes[i - 1][1] += self.holes[i][1]
+            del self.holes[i]
+
+    def pin(self, block, pinned=True):
+        """ Keep a block in place on compact(), or let it move again"""
+        block.pinned = pinned
+
+    def _move(self, block, dest):
+        """ Copy a block down to dest with cmd_memcpy
+            Overlapping copies go in pieces no longer than the distance moved.
+        """
+        eve = self.eve
+        step = block.addr - dest
+        for offset in range(0, block.size, step):
+            eve.cmd_memcpy(dest + offset, block.addr + offset, min(step, block.size - offset))
+        block.addr = dest
+
+    def compact(self):
+        """ Move the blocks which are not pinned down, to merge the holes
+            Blocks keep their order and alignment. Read block.addr again afterwards.
+
+            :return: Number of bytes moved
+        """
+        moved = 0
+        dest = self.base
+        for block in self.blocks:
+            if block.pinned:
+                dest = block.addr + block.size
+                continue
+            start = (dest + block.align - 1) // block.align * block.align
+            if start < block.addr:
+                self._move(block, start)
+                moved += block.size
+            dest = block.addr + block.size
+        if moved:
+            self.eve.finish()
+
+        # Rebuild the holes around the blocks
+        self.holes = []
+        addr = self.base
+        for block in self.blocks:
+            if block.addr > addr:
+                self.holes.append([addr, block.addr - addr])
+            addr = block.addr + block.size
+        if addr < self.base + self.size:
+            self.holes.append([addr, self.base + self.size - addr])
+        return moved
+
+    def largest_hole(self):
+        """ Size of the largest free hole"""
+        return max((size for _, size in self.holes), default=0)
+
+    def stats(self):
+        """ Occupancy and fragmentation
+            fragmentation is 0 when all free memory is one hole, and goes to 1 as it splits up.
+
+            :return: dict with keys size, used, free, largest_hole, holes, blocks, pinned,
+                     fragmentation
+        """
+        free = sum(size for _, size in self.holes)
+        largest = self.largest_hole()
+        return {'size':self.size, 'used':self.size - free, 'free':free,
+            'largest_hole':largest, 'holes':len(self.holes), 'blocks':len(self.blocks),
+            'pinned':sum(1 for b in self.blocks if b.pinned),
+            'fragmentation':1 - largest / free if free else 0}
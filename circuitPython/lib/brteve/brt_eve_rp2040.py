@@ -35,8 +35,18 @@ class BrtEveRP2040():
      - write_ili9488_cmd()
      - write_ili9488_data()
      - spi_sdcard -- SPI object of SDcard interface
+
+    And may advertise its transfer capabilities, see BrtEveModule.setup_transfer_size():
+     - max_transfer_size -- largest efficient write, in bytes, address included
+     - max_read_size -- largest efficient read, in bytes, dummy byte included
+     - transfer_alignment -- preferred chunk alignment, in bytes
     """
 
+    # busio.SPI has no size limit, bigger chunks only cost heap
+    max_transfer_size = 8 * 1024
+    max_read_size = 8 * 1024
+    transfer_alignment = 4
+
     def __init__(self):
         mach = os.uname().machine # pylint: disable=no-member
         if mach == 'Raspberry Pi Pico with rp2040':
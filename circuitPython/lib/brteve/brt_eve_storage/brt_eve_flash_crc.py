@@ -0,0 +1,260 @@
+""" CRC32 computed on EVE, to verify flash and RAM_G and to program flash differentially
+    Part of BrtEveStorage: data is checked by cmd_memcrc on EVE, so only 4 bytes per
+    4 KB sector are read back over SPI.
+
+        eve.storage.write_flash_diff("/sd/BT81X_Flash.bin", 0, verify=True)
+"""
+import binascii
+
+from .brt_eve_storage_common import align_to, file_size_of, open_failed, BLOBSIZE, \
+    EVE_CMD_FIFO_SIZE, FIFO_SIZE_MASK, FLASH_SECTOR_SIZE, FLASH_DIFF_SECTORS
+
+class BrtEveFlashCrcMixin():
+    """ CRC checks and differential writes of BrtEveStorage, which provides eve, _stage()
+        and _flash_write_prepare()
+    """
+
+    def flash_crc_sectors(self, address, sizes, ram=None):
+        """ Compute the CRC32 of consecutive flash sectors on EVE, without reading them back
+            Sectors are copied to RAM_G by one cmd_flashread, then each one is
+            checked by cmd_memcrc. The results are collected from the command FIFO
+            in a single read.
+
+            :param address: Flash address of the first sector. Must be 4096-byte aligned
+            :param sizes: Number of bytes to check in each sector, up to FLASH_DIFF_SECTORS
+            :param ram: RAM_G address of the copy, 64-byte aligned, staged from eve.ramg if None
+            :return: List of CRC32, same as binascii.crc32
+        """
+        eve = self.eve
+        count = len(sizes)
+        cmd_size = 16 # cmd_flashread and cmd_memcrc both take 3 arguments
+
+        block = None
+        if ram is None:
+            block = self._stage(count * FLASH_SECTOR_SIZE)
+            ram = block.addr
+        try:
+            eve.finish()
+            start = eve.eve_write_pointer()
+            eve.cmd_flashread(ram, address, count * FLASH_SECTOR_SIZE)
+            for i, size in enumerate(sizes):
+                eve.cmd_memcrc(ram + i * FLASH_SECTOR_SIZE, size)
+            eve.finish()
+        finally:
+            if block is not None:
+                eve.ramg.free(block)
+
+        # The results follow the cmd_flashread
+        return self._memcrc_results(start + cmd_size, count)
+
+    def _memcrc_results(self, start, count):
+        """ Collect the results of consecutive cmd_memcrc in a single read
+            :param start: Offset in RAM_CMD of the first cmd_memcrc
+            :param count: Number of cmd_memcrc
+            :return: List of CRC32
+        """
+        eve = self.eve
+        cmd_size = 16
+
+        # One result every 16 bytes, wrapping in RAM_CMD
+        first = start & FIFO_SIZE_MASK
+        length = count * cmd_size
+        head = min(length, EVE_CMD_FIFO_SIZE - first)
+        results = eve.read_mem(eve.RAM_CMD + first, head)
+        if head < length:
+            results += eve.read_mem(eve.RAM_CMD, length - head)
+
+        return [int.from_bytes(results[i * cmd_size + 12:i * cmd_size + 16], "little")
+                for i in range(count)]
+
+    def ramg_crc_regions(self, address, sizes):
+        """ Compute the CRC32 of consecutive RAM_G regions on EVE, without reading them back
+            :param address: Address of the first region in RAM_G
+            :param sizes: Size of each region, up to FLASH_DIFF_SECTORS regions
+            :return: List of CRC32, same as binascii.crc32
+        """
+        eve = self.eve
+
+        eve.finish()
+        start = eve.eve_write_pointer()
+        for size in sizes:
+            eve.cmd_memcrc(address, size)
+            address += size
+        eve.finish()
+
+        return self._memcrc_results(start, len(sizes))
+
+    def _verify(self, file_handler, offset, num, crc_regions):
+        """ Compare a part of a file with the CRC32 of 4 KB blocks computed on EVE
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param num: Number of bytes to compare
+            :param crc_regions: Function of (position, sizes) returning the CRC32 on EVE
+            :return: Number of 4 KB blocks which differ, -1 on file error
+        """
+        mismatch = 0
+        file_handler.seek(offset)
+        pos = 0
+        while pos < num:
+            sizes = []
+            crcs = []
+            while len(sizes) < FLASH_DIFF_SECTORS and pos < num:
+                data = file_handler.read(min(FLASH_SECTOR_SIZE, num - pos))
+                if len(data) == 0:
+                    return -1
+                sizes.append(len(data))
+                crcs.append(binascii.crc32(data))
+                pos += len(data)
+
+            start = pos - sum(sizes)
+            for crc, eve_crc in zip(crcs, crc_regions(start, sizes)):
+                if crc != eve_crc:
+                    mismatch += 1
+        return mismatch
+
+    def verify_flash(self, file_handler, offset, address, num):
+        """ Check that flash holds a part of a file, reading 4 bytes per 4 KB block back
+            Blocks are copied to RAM_G by cmd_flashread and checked by cmd_memcrc,
+            see flash_crc_sectors. Flash must be in full mode.
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param address: Address of the data in flash. Must be 64-byte aligned
+            :param num: Number of bytes to check
+            :return: Number of 4 KB blocks which differ, 0 when verified, -1 on file error
+        """
+        return self._verify(file_handler, offset, num,
+            lambda pos, sizes: self.flash_crc_sectors(address + pos, sizes))
+
+    def verify_ramg(self, file_handler, offset, address, num):
+        """ Check that RAM_G holds a part of a file, reading 4 bytes per 4 KB block back
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param address: Address of the data in RAM_G
+            :param num: Number of bytes to check
+            :return: Number of 4 KB blocks which differ, 0 when verified, -1 on file error
+        """
+        return self._verify(file_handler, offset, num,
+            lambda pos, sizes: self.ramg_crc_regions(address + pos, sizes))
+
+    def _verify_failed(self, mismatch, file):
+        """ Report the result of verify_flash or verify_ramg
+            :return: True if the data does not match
+        """
+        if mismatch < 0:
+            print("Error on reading file:", file)
+        elif mismatch > 0:
+            print("Verify failed,", mismatch, "blocks of 4 KB differ:", file)
+        return mismatch != 0
+
+    def flash_update_changed_sectors(self, file_handler, offset, dest_flash, num):
+        """ Write a part of a file to flash, skipping the sectors which already match
+            The CRC32 of every sector is computed on both sides, then only the sectors
+            which differ are uploaded to RAM_G and programmed with cmd_flashupdate.
+            Flash must be in full mode.
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param dest_flash: Destination in flash memory. Must be 4096-byte aligned
+            :param num: Number of bytes to write, up to FLASH_DIFF_SECTORS sectors
+            :return: Number of sectors written, -1 on file error
+        """
+        eve = self.eve
+        sizes, crcs = self._file_sector_crcs(file_handler, offset, num)
+        if sizes is None:
+            return -1
+
+        block = self._stage(len(sizes) * FLASH_SECTOR_SIZE)
+        try:
+            ram = block.addr
+            flash_crcs = self.flash_crc_sectors(dest_flash, sizes, ram)
+
+            # The block holds the current flash content, so a partial last sector keeps
+            # its tail. Consecutive changed sectors are programmed together.
+            written = 0
+            run_start = None
+            for i in range(len(sizes) + 1):
+                changed = i < len(sizes) and crcs[i] != flash_crcs[i]
+                if changed:
+                    file_handler.seek(offset + i * FLASH_SECTOR_SIZE)
+                    eve.write_mem(ram + i * FLASH_SECTOR_SIZE, file_handler.read(sizes[i]))
+                    written += 1
+                    if run_start is None:
+                        run_start = i
+                elif run_start is not None:
+                    # Flash the run while the next changed sectors are uploaded
+                    eve.cmd_flashupdate(dest_flash + run_start * FLASH_SECTOR_SIZE,
+                        ram + run_start * FLASH_SECTOR_SIZE,
+                        (i - run_start) * FLASH_SECTOR_SIZE)
+                    eve.flush()
+                    run_start = None
+            eve.finish()
+        finally:
+            eve.ramg.free(block)
+
+        file_handler.seek(offset + num)
+        return written
+
+    @staticmethod
+    def _file_sector_crcs(file_handler, offset, num):
+        """ CRC32 of each 4 KB sector of a part of a file
+            :return: Lists of sector sizes and of CRC32, (None, None) on file error
+        """
+        sizes = []
+        crcs = []
+        for pos in range(0, num, FLASH_SECTOR_SIZE):
+            file_handler.seek(offset + pos)
+            data = file_handler.read(min(FLASH_SECTOR_SIZE, num - pos))
+            if len(data) == 0:
+                return None, None
+            sizes.append(len(data))
+            crcs.append(binascii.crc32(data))
+        return sizes, crcs
+
+    def write_flash_diff(self, file, addr, verify=False):
+        """ Write file to flash, uploading only the 4 KB sectors which changed
+            Re-flashing an image after a small change only sends the changed sectors,
+            plus a CRC32 per sector.
+
+            :param file: File to write
+            :param addr: Address on flash, 0 to update the blob from the file too
+            :param verify: Set to True to check the flash content by CRC32 after writing
+            :return: Number of bytes of the file now in flash on successful, 0 on error
+        """
+        sent = 0
+        written = 0
+        sectors = 0
+
+        if not self._flash_write_prepare(file, addr):
+            return 0 # Error
+
+        try:
+            with open(file, "rb") as file_handler:
+                file_size = file_size_of(file_handler)
+
+                # Ignore Blob data part of file
+                if addr < BLOBSIZE:
+                    sent = addr = BLOBSIZE
+                offset = sent
+                start = addr
+
+                while sent < file_size:
+                    num = min(file_size - sent, FLASH_DIFF_SECTORS * FLASH_SECTOR_SIZE)
+                    ret = self.flash_update_changed_sectors(file_handler, sent, addr, num)
+                    if ret < 0:
+                        print("Error on reading file:", file)
+                        return 0 # Error
+                    written += ret
+                    sectors += align_to(num, FLASH_SECTOR_SIZE) // FLASH_SECTOR_SIZE
+                    sent += num
+                    addr += num
+
+                if verify and self._verify_failed(
+                        self.verify_flash(file_handler, offset, start, sent - offset), file):
+                    return 0 # Error
+        except OSError as exception:
+            return open_failed(file, exception)
+
+        print("Flash sectors written:", written, "of", sectors)
+        return sent
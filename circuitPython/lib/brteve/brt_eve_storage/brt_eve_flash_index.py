@@ -0,0 +1,103 @@
+""" Named asset index stored in EVE's connected flash
+    The index sits at a fixed flash address, right after the blob, so applications
+    look assets up by name instead of hardcoding their flash addresses:
+
+        index = eve.storage.flash_index()
+        car = index.get("car")
+        # {'addr':..., 'size':..., 'format':..., 'width':..., 'height':..., 'crc':...}
+
+    Layout, little endian:
+        header: magic "EVEI", version (u16), count (u16), entry size (u16), reserved (u16),
+                CRC32 of the entries (u32)
+        entry:  name (28 bytes, nul padded), address (u32), size (u32), bitmap format (u16),
+                width (u16), height (u16), reserved (u16), CRC32 of the asset (u32)
+"""
+import array
+import struct
+import binascii
+
+from ..brt_eve_common import const
+
+FLASH_INDEX_ADDRESS = const(4096)
+FLASH_INDEX_MAGIC   = b"EVEI"
+FLASH_INDEX_VERSION = const(1)
+
+_HEADER = "<4sHHHHI"
+_ENTRY = "<28sIIHHHHI"
+HEADER_SIZE = struct.calcsize(_HEADER)
+ENTRY_SIZE = struct.calcsize(_ENTRY)
+NAME_SIZE = const(28)
+
+def pack_flash_index(assets):
+    """ Build the flash image of an index
+        :param assets: List of dict with keys name, addr, size, and optionally
+                       format, width, height, crc
+        :return: Index bytes, to write at FLASH_INDEX_ADDRESS
+    """
+    entries = bytearray()
+    for asset in assets:
+        name = asset["name"].encode()
+        if len(name) > NAME_SIZE:
+            raise ValueError("Asset name too long: " + asset["name"])
+        entries += struct.pack(_ENTRY, name, asset["addr"], asset["size"],
+            asset.get("format", 0), asset.get("width", 0), asset.get("height", 0), 0,
+            asset.get("crc", 0))
+
+    header = struct.pack(_HEADER, FLASH_INDEX_MAGIC, FLASH_INDEX_VERSION, len(assets),
+        ENTRY_SIZE, 0, binascii.crc32(entries))
+    return header + entries
+
+def unpack_flash_index_header(data):
+    """ Check an index header
+        :param data: At least HEADER_SIZE bytes read at FLASH_INDEX_ADDRESS
+        :return: Number of entries and CRC32 of the entries, (0, 0) if there is no index
+    """
+    magic, version, count, entry_size, _, crc = struct.unpack(_HEADER, bytes(data[:HEADER_SIZE]))
+    if magic != FLASH_INDEX_MAGIC or version != FLASH_INDEX_VERSION or entry_size != ENTRY_SIZE:
+        return 0, 0
+    return count, crc
+
+class BrtEveFlashIndex():
+    """ Asset index, one array per field and a dictionary from name to row
+        Lookups by name take no SPI traffic, the index is read once.
+    """
+    def __init__(self, entries=b""):
+        """ Parse the entries of an index
+            :param entries: Entries following the header, ENTRY_SIZE bytes each
+        """
+        self.names = {}
+        self.addr = array.array("I")
+        self.size = array.array("I")
+        self.format = array.array("H")
+        self.width = array.array("H")
+        self.height = array.array("H")
+        self.crc = array.array("I")
+
+        for row in range(len(entries) // ENTRY_SIZE):
+            name, addr, size, fmt, width, height, _, crc = struct.unpack_from(
+                _ENTRY, entries, row * ENTRY_SIZE)
+            self.names[name.split(b"\0", 1)[0].decode()] = row
+            self.addr.append(addr)
+            self.size.append(size)
+            self.format.append(fmt)
+            self.width.append(width)
+            self.height.append(height)
+            self.crc.append(crc)
+
+    def __len__(self):
+        return len(self.addr)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def get(self, name, default=None):
+        """ Look an asset up by name
+            :param name: Asset name
+            :param default: Returned when the asset is not in the index
+            :return: dict with keys addr, size, format, width, height, crc
+        """
+        row = self.names.get(name)
+        if row is None:
+            return default
+        return {'addr':self.addr[row], 'size':self.size[row], 'format':self.format[row],
+            'width':self.width[row], 'height':self.height[row], 'crc':self.crc[row]}
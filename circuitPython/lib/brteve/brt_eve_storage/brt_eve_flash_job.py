@@ -0,0 +1,295 @@
+""" Background flash programming job
+    Programs a file to flash in small steps called from the application main loop,
+    so the UI stays live during the transfer:
+
+        job = eve.storage.flash_job("/sd/BT81X_Flash.bin", 0, journal="/sd/flash.journal")
+        while job.step(0.02):
+            draw_ui(job.percent())
+
+    The journal records how far the flash is programmed. After a power loss, a job
+    created again with the same file, address and journal resumes from there, without
+    writing the blob again. A coprocessor fault stops the job and raises from step(), with
+    the journal up to date.
+
+    Data goes through RAM_G slots allocated from eve.ramg: a slot is uploaded while
+    the coprocessor programs the previous one with cmd_flashupdate, and a fence written
+    by cmd_memwrite tells which slots are done. A step never waits for the coprocessor.
+"""
+import os
+import time
+import binascii
+
+from ..brt_eve_common import const
+from ..brt_eve_module import CoprocessorException
+
+FLASH_JOB_CHUNK = const(16 * 1024)
+FLASH_JOB_SLOTS = const(2)
+# Bytes programmed between two journal updates
+FLASH_JOB_JOURNAL_INTERVAL = const(64 * 1024)
+JOURNAL_MAGIC = "brteve-flash-job 1"
+
+_BLOBSIZE = const(4096)
+_SECTOR_SIZE = const(4096)
+
+_START = 0
+_WRITING = 1
+_DONE = 2
+_ERROR = 3
+
+class BrtEveFlashJob(): # pylint: disable=too-many-instance-attributes
+    """ Resumable flash programming job, advanced by step()"""
+
+    def __init__(self, storage, file, addr, journal=None, on_progress=None, # pylint: disable=too-many-arguments
+                 progress_interval=0.5, chunk=FLASH_JOB_CHUNK, slots=FLASH_JOB_SLOTS):
+        """ Prepare a job, nothing is sent before the first step()
+            :param storage: BrtEveStorage object
+            :param file: File to write
+            :param addr: Address on flash, 0 to update the blob from the file too
+            :param journal: Optional path of the progress journal, to resume after a power loss
+            :param on_progress: Optional function called with the job, at most every
+                                progress_interval seconds, and once done
+            :param progress_interval: Minimum time between two on_progress calls, in seconds
+            :param chunk: Bytes uploaded per slot, multiple of 4096
+            :param slots: Number of RAM_G slots
+        """
+        self.storage = storage
+        self.eve = storage.eve
+        self.file = file
+        self.addr = addr
+        self.journal = journal
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.chunk = chunk
+        self.slots = slots
+
+        self.state = _START
+        self.file_handler = None
+        self.block = None
+        self.fence = 0
+        self.identity = ""
+
+        self.size = 0 # Bytes of the file to program, from start
+        self.start = 0 # Offset in the file of the first byte to program
+        self.issued = 0 # Offset of the next byte to upload
+        self.programmed = 0 # Offset up to which flash is programmed
+        self.journaled = 0 # Offset saved in the journal
+        self.resumed_from = 0
+        self.sequence = 0
+        self.pending = [] # (sequence, end offset) of the slots being programmed
+        self.last_progress = 0
+        self.end_reported = False
+
+    def done(self):
+        """ True once the whole file is programmed"""
+        return self.state == _DONE
+
+    def failed(self):
+        """ True if the job stopped on an error"""
+        return self.state == _ERROR
+
+    def percent(self):
+        """ Programmed part of the file, in percent"""
+        if self.size == 0:
+            return 100 if self.state == _DONE else 0
+        return self.programmed * 100 // self.size
+
+    def step(self, budget=0.01):
+        """ Advance the job for about budget seconds
+            At least one slot is uploaded when one is free, whatever the budget.
+
+            :param budget: Time to spend, in seconds
+            :return: True while there is work left
+        """
+        deadline = time.monotonic() + budget
+        try:
+            if self.state == _START:
+                self._start()
+            while self.state == _WRITING:
+                if not self._advance() or time.monotonic() >= deadline:
+                    break
+        except OSError as exception:
+            print("Flash job error on file:", self.file)
+            print(exception)
+            self._stop(_ERROR)
+        except CoprocessorException:
+            # The slots whose fence was reached are programmed, resume after them
+            try:
+                self._save_progress()
+            finally:
+                self._stop(_ERROR)
+            raise
+
+        self._report()
+        return self.state in (_START, _WRITING)
+
+    def run(self, budget=0.05):
+        """ Run the job to the end, such as from a thread on CPython
+            Nothing else may use EVE meanwhile.
+
+            :return: True on success
+        """
+        while self.step(budget):
+            pass
+        return self.state == _DONE
+
+    def cancel(self):
+        """ Stop the job, the journal is kept to resume later"""
+        if self.state == _WRITING:
+            self.eve.finish()
+            self._save_progress()
+        if self.state in (_START, _WRITING):
+            self._stop(_ERROR)
+
+    def _start(self):
+        """ Open the file, read the journal, update the blob and switch to full mode"""
+        storage = self.storage
+        eve = self.eve
+        update_blob = self.addr < _BLOBSIZE
+
+        self.file_handler = open(self.file, "rb") # pylint: disable=consider-using-with
+        self.file_handler.seek(0, 2)
+        file_size = self.file_handler.tell()
+
+        # Ignore Blob data part of file
+        if update_blob:
+            self.start = self.addr = _BLOBSIZE
+        self.size = max(0, file_size - self.start)
+        self.identity = self._identity(file_size)
+
+        self.programmed = self.journaled = self._read_journal()
+        self.issued = self.resumed_from = self.programmed
+
+        # The blob is written before any data: a journaled offset means it matches the file
+        if update_blob and self.resumed_from == 0:
+            storage.flash_write_blob_file(self.file)
+        if storage.flash_state(eve.FLASH_STATUS_FULL) != 0:
+            storage.flash_write_blob_default()
+            if storage.flash_state(eve.FLASH_STATUS_FULL) != 0:
+                print("Cannot switch flash to fullmode\n")
+                self._stop(_ERROR)
+                return
+
+        self.block = eve.ramg.alloc(self.slots * self.chunk + 4, name="flash job")
+        self.fence = self.block.addr + self.slots * self.chunk
+        eve.wr32(self.fence, 0)
+        self.state = _WRITING
+
+    def _identity(self, file_size):
+        """ Journal key: file name, size, address, and CRC32 of the first and last blocks"""
+        handler = self.file_handler
+        handler.seek(0)
+        crc = binascii.crc32(handler.read(self.chunk))
+        handler.seek(max(0, file_size - self.chunk))
+        crc = binascii.crc32(handler.read(self.chunk), crc)
+        return "%s %d %d %08x" % (self.file, file_size, self.addr, crc)
+
+    def _read_journal(self):
+        """ :return: Offset programmed by a previous run of this job, 0 if none"""
+        if not self.journal:
+            return 0
+        try:
+            with open(self.journal, "r") as journal: # pylint: disable=unspecified-encoding
+                lines = journal.read().split("\n")
+        except OSError:
+            return 0
+        if len(lines) < 3 or lines[0] != JOURNAL_MAGIC or lines[1] != self.identity:
+            return 0
+        try:
+            offset = int(lines[2])
+        except ValueError:
+            return 0
+        # Whole chunks only, a chunk may have been cut by the power loss
+        return min(offset - offset % self.chunk, self.size)
+
+    def _write_journal(self):
+        """ Save the programmed offset"""
+        if not self.journal or self.programmed == self.journaled:
+            return
+        with open(self.journal, "w") as journal: # pylint: disable=unspecified-encoding
+            journal.write("%s\n%s\n%d\n" % (JOURNAL_MAGIC, self.identity, self.programmed))
+        self.journaled = self.programmed
+
+    def _save_progress(self):
+        """ Journal the slots programmed so far"""
+        if self.state == _WRITING:
+            self._update_programmed()
+            self._write_journal()
+
+    def _update_programmed(self):
+        """ Move the programmed offset past the slots whose fence is reached"""
+        fence = self.eve.rd32(self.fence)
+        while self.pending and self.pending[0][0] <= fence:
+            self.programmed = self.pending.pop(0)[1]
+
+    def _advance(self):
+        """ Collect finished slots and upload the next one
+            :return: False when waiting for the coprocessor
+        """
+        eve = self.eve
+        if self.pending:
+            self._update_programmed()
+            if self.programmed - self.journaled >= FLASH_JOB_JOURNAL_INTERVAL:
+                self._write_journal()
+
+        if self.issued >= self.size:
+            if self.pending:
+                eve.getspace() # raises on coprocessor fault
+                return False
+            self._finish()
+            return False
+
+        if len(self.pending) >= self.slots:
+            eve.getspace()
+            return False
+
+        self.sequence += 1
+        slot = self.block.addr + (self.sequence - 1) % self.slots * self.chunk
+        self.file_handler.seek(self.start + self.issued)
+        data = self.file_handler.read(min(self.chunk, self.size - self.issued))
+        if len(data) == 0:
+            raise OSError("Unexpected end of file")
+        eve.write_mem(slot, data)
+
+        # Pad the last sector with erased flash value
+        padded = (len(data) + _SECTOR_SIZE - 1) // _SECTOR_SIZE * _SECTOR_SIZE
+        if padded > len(data):
+            eve.cmd_memset(slot + len(data), 0xff, padded - len(data))
+        eve.cmd_flashupdate(self.addr + self.issued, slot, padded)
+        eve.cmd_memwrite(self.fence, 4)
+        eve.cc(self.sequence.to_bytes(4, "little"))
+        eve.flush()
+
+        self.issued += len(data)
+        self.pending.append((self.sequence, self.issued))
+        return True
+
+    def _finish(self):
+        """ Everything is programmed: drop the journal"""
+        if self.journal:
+            try:
+                os.remove(self.journal)
+            except OSError:
+                pass
+        self._stop(_DONE)
+
+    def _stop(self, state):
+        """ Release the file and RAM_G"""
+        self.state = state
+        if self.file_handler:
+            self.file_handler.close()
+            self.file_handler = None
+        if self.block:
+            self.eve.ramg.free(self.block)
+            self.block = None
+
+    def _report(self):
+        """ Call on_progress, rate limited"""
+        if not self.on_progress or self.end_reported:
+            return
+        now = time.monotonic()
+        running = self.state in (_START, _WRITING)
+        if running and now - self.last_progress < self.progress_interval:
+            return
+        self.last_progress = now
+        self.end_reported = not running
+        self.on_progress(self)
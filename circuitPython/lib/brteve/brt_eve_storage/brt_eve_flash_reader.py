@@ -0,0 +1,103 @@
+""" Flash reads to a file, such as a backup of a whole flash image
+    Part of BrtEveStorage:
+
+        eve.storage.read_flash_to_file("/sd/flash.bin", 0, 16 * 1024 * 1024)
+
+    Data goes through RAM_G slots allocated from eve.ramg: cmd_flashread fills a slot
+    while the previous one is read back over SPI, and a fence written by cmd_memwrite
+    tells which slots are filled.
+"""
+from .brt_eve_storage_common import align_to, FLASH_READ_ALIGN_BYTE, FLASH_PIPELINE_SLOTS, \
+    FLASH_PIPELINE_SLOT_SIZE, FLASH_CMD_SUCCESS, FLASH_CMD_UNSUCCESS, FLASH_CMD_ALIGNED_ERR
+
+class BrtEveFlashReaderMixin():
+    """ Flash reads of BrtEveStorage, which provides eve, flash_state() and _stage()"""
+
+    def read_flash_to_file(self, file, address, size) :
+        """ Read data on flash into a file, such as a backup of the whole flash
+            :param file: Filename output
+            :param address: Address on flash. Must be 64-byte aligned
+            :param size: Size to read
+            :return: FLASH_CMD_SUCCESS on successful
+        """
+        eve = self.eve
+        if address % FLASH_READ_ALIGN_BYTE != 0:
+            return FLASH_CMD_ALIGNED_ERR
+
+        # Full mode reads flash in QSPI, basic mode is still able to read
+        if self.flash_state(eve.FLASH_STATUS_FULL) != 0:
+            self.flash_state(eve.FLASH_STATUS_BASIC)
+
+        try:
+            with open(file, "wb") as file_handler:
+                if self.flash_read_pipelined(file_handler, address, size) < 0:
+                    print("Unable to write file: ", file)
+                    return FLASH_CMD_UNSUCCESS
+        except OSError as exception:
+            print("Unable to open file: ", file)
+            print(exception)
+            return FLASH_CMD_UNSUCCESS
+
+        return FLASH_CMD_SUCCESS
+
+    def flash_read_pipelined(self, file_handler, src_flash, num, # pylint: disable=too-many-arguments
+                             slots=FLASH_PIPELINE_SLOTS, slot_size=FLASH_PIPELINE_SLOT_SIZE):
+        """ Read flash to a file, reading back a slot while flash fills the next one
+            A RAM_G block of eve.ramg is split in slots, followed by a fence word. Each slot
+            is filled by cmd_flashread, then cmd_memwrite stores its sequence number in the
+            fence.
+            While a slot is read back over SPI, cmd_flashread of the other slots runs.
+            Data goes to the file through one buffer reused for every slot.
+
+            :param file_handler: File opened in binary write mode
+            :param src_flash: Source in flash memory. Must be 64-byte aligned
+            :param num: Number of bytes to read
+            :param slots: Number of RAM_G slots, 1 for no overlap
+            :param slot_size: Size of a slot, multiple of 64
+            :return: Number of bytes read, -1 on file error
+        """
+        eve = self.eve
+        block = self._stage(slots * slot_size + 4)
+        try:
+            return self._flash_read_slots(file_handler, src_flash, num, block.addr,
+                                          slots, slot_size)
+        except OSError as exception:
+            print(exception)
+            eve.finish()
+            return -1
+        finally:
+            eve.ramg.free(block)
+
+    def _flash_read_slots(self, file_handler, src_flash, num, ram, # pylint: disable=too-many-arguments
+                          slots, slot_size):
+        """ flash_read_pipelined through the slots at ram
+            Every slot but the last is full: slot n holds the bytes from n * slot_size.
+
+            :return: Number of bytes read, raise OSError on file error
+        """
+        eve = self.eve
+        fence = ram + slots * slot_size
+        buff = memoryview(bytearray(min(slot_size, num)))
+        issued = 0 # Bytes queued
+
+        eve.finish()
+        eve.wr32(fence, 0)
+        for done, received in enumerate(range(0, num, slot_size), 1):
+            # Refill the slots read back, the next slots fill while this one is read back
+            while issued < min(num, (done + slots - 1) * slot_size):
+                sequence = issued // slot_size + 1
+                eve.cmd_flashread(ram + (sequence - 1) % slots * slot_size,
+                                  src_flash + issued, align_to(min(slot_size, num - issued), 4))
+                eve.cmd_memwrite(fence, 4)
+                eve.cc(sequence.to_bytes(4, "little"))
+                eve.flush()
+                issued += slot_size
+
+            while eve.rd32(fence) < done:
+                eve.getspace() # raises on coprocessor fault
+
+            data = buff[:min(slot_size, num - received)]
+            eve.read_mem_into(ram + (done - 1) % slots * slot_size, data)
+            file_handler.write(data)
+
+        return num
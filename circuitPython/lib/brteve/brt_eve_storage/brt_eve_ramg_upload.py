@@ -0,0 +1,195 @@
+""" Compressed uploads to RAM_G, through cmd_inflate
+    Part of BrtEveStorage. Files are zlib-compressed on the host when the measured ratio
+    and link speed make it faster than raw, or sent as is when they are zlib streams:
+
+        eve.storage.upload_file_to_ramg("car.raw", addr)
+        eve.storage.upload_file_to_ramg("car.raw.z", addr)
+        print(eve.storage.upload_stats)
+"""
+import time
+
+from ..brt_eve_common import const
+from .brt_eve_storage_common import FREAD_BLOCK, file_size_of, open_failed
+
+# CircuitPython's zlib only decompresses: compressed uploads then need .z files
+try:
+    import zlib
+    HOST_DEFLATE = hasattr(zlib, "compressobj")
+except ImportError:
+    HOST_DEFLATE = False
+
+# Output rate of cmd_inflate, an estimate used to decide whether compressing pays off
+INFLATE_RATE             = const(4 * 1024 * 1024)
+# Compress only when it is estimated at least this much faster than raw
+INFLATE_GAIN             = 0.9
+
+class BrtEveRamGUploadMixin():
+    """ Compressed RAM_G uploads of BrtEveStorage, which provides eve, link_rate,
+        upload_stats, _write_fifo(), _file_to_ramg() and the RAM_G verification
+    """
+
+    def inflate_to_ramg(self, file_handler, offset, addr, num):
+        """ Decompress a zlib stream of a file to RAM_G, such as a .z file
+            The stream follows cmd_inflate in the command FIFO.
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the stream in the file
+            :param addr: Address on RAM_G
+            :param num: Size of the stream
+            :return: Number of bytes decompressed, -1 on file error
+        """
+        eve = self.eve
+        eve.cmd_inflate(addr)
+        eve.flush()
+
+        file_handler.seek(offset)
+        sent = 0
+        while sent < num:
+            data = file_handler.read(min(FREAD_BLOCK, num - sent))
+            if len(data) == 0:
+                return -1 # The coprocessor waits for the end of the stream
+            sent += len(data)
+            if sent >= num:
+                data += bytes(-len(data) & 3)
+            self._write_fifo(data)
+
+        eve.cmd_getptr()
+        return eve.result() - addr
+
+    def deflate_to_ramg(self, file_handler, offset, addr, num):
+        """ Compress a part of a file on the host, and decompress it to RAM_G with cmd_inflate
+            Needs zlib with compression, see HOST_DEFLATE.
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param addr: Address on RAM_G
+            :param num: Number of bytes to write
+            :return: Number of compressed bytes sent, -1 on file error
+        """
+        eve = self.eve
+        compressor = zlib.compressobj()
+        eve.cmd_inflate(addr)
+        eve.flush()
+
+        file_handler.seek(offset)
+        pending = b""
+        sent = 0
+        pos = 0
+        error = False
+        while pos < num:
+            data = file_handler.read(min(FREAD_BLOCK, num - pos))
+            if len(data) == 0:
+                error = True # End the stream anyway, the coprocessor waits for it
+                break
+            pos += len(data)
+            pending += compressor.compress(data)
+
+            # Whole words only, the rest goes with the next block
+            whole = len(pending) & ~3
+            self._write_fifo(pending[:whole])
+            sent += whole
+            pending = pending[whole:]
+
+        pending += compressor.flush()
+        pending += bytes(-len(pending) & 3)
+        self._write_fifo(pending)
+        sent += len(pending)
+
+        eve.finish()
+        return -1 if error else sent
+
+    def _inflate_pays(self, sample, num):
+        """ Estimate whether compressing num bytes beats sending them raw
+            The ratio and compression speed are measured on a sample of the data,
+            the link speed on the last raw upload. cmd_inflate runs while data arrives.
+
+            :param sample: First bytes of the data
+            :param num: Number of bytes to send after the sample
+            :return: True to compress
+        """
+        if not HOST_DEFLATE or not self.link_rate or num < FREAD_BLOCK:
+            return False
+
+        start = time.monotonic()
+        ratio = len(zlib.compress(sample)) / len(sample)
+        compress_rate = len(sample) / max(time.monotonic() - start, 1e-6)
+
+        raw_time = num / self.link_rate
+        deflate_time = num / compress_rate + max(num * ratio / self.link_rate, num / INFLATE_RATE)
+        return deflate_time < raw_time * INFLATE_GAIN
+
+    def upload_file_to_ramg(self, file, addr, compress=None, verify=False):
+        """ Transfer a whole file to RAM_G, compressed when it is faster
+            The first block goes raw, which measures the link speed. The rest is
+            compressed on the host and inflated by EVE when the ratio of the first
+            block and the link speed make it faster. A .z file is a zlib stream,
+            always inflated. upload_stats holds mode (raw, deflate or inflate), size,
+            sent, ratio, seconds, rate, the effective bandwidth, and link_rate.
+
+            :param file: File to transfer
+            :param addr: Address on RAMG
+            :param compress: None to decide, True or False to force
+            :param verify: Set to True to check the RAM_G content by CRC32 after writing,
+                           except for .z files
+            :return: Number of bytes written to RAM_G, 0 on error
+        """
+        start = time.monotonic()
+        self.upload_stats = {'mode':'raw'}
+
+        try:
+            with open(file, "rb") as file_handler:
+                file_size = file_size_of(file_handler)
+
+                if file.endswith(".z"):
+                    self.upload_stats['mode'] = 'inflate'
+                    size = self.inflate_to_ramg(file_handler, 0, addr, file_size)
+                    sent = file_size
+                else:
+                    size, sent = self._upload_sampled(file_handler, addr, file_size, compress)
+                if size < 0:
+                    print("Error on reading file:", file)
+                    return 0 # Error
+
+                if verify and self.upload_stats['mode'] != 'inflate' and self._verify_failed(
+                        self.verify_ramg(file_handler, 0, addr, size), file):
+                    return 0 # Error
+        except OSError as exception:
+            return open_failed(file, exception)
+
+        duration = max(time.monotonic() - start, 1e-6)
+        self.upload_stats.update({'size':size, 'sent':sent, 'ratio':sent / max(size, 1),
+            'seconds':duration, 'rate':size / duration, 'link_rate':self.link_rate})
+        print("Uploaded %s: %d bytes, %d sent (%s), %.1f KB/s" % (
+            file, size, sent, self.upload_stats['mode'], size / 1024 / duration))
+        return size
+
+    def _upload_sampled(self, file_handler, addr, file_size, compress):
+        """ Upload a file which is not a zlib stream, its first block raw
+            The first block measures the link speed and the compression ratio, the rest
+            goes raw or deflated. The raw upload of the rest measures the link speed again.
+
+            :return: Bytes written to RAM_G and bytes sent, -1 written on file error
+        """
+        eve = self.eve
+        start = time.monotonic()
+        file_handler.seek(0)
+        sample = file_handler.read(FREAD_BLOCK)
+        eve.write_mem(addr, sample)
+        self.link_rate = len(sample) / max(time.monotonic() - start, 1e-6)
+        size = len(sample)
+
+        if compress is None:
+            compress = self._inflate_pays(sample, file_size - size)
+        if compress and HOST_DEFLATE and size < file_size:
+            self.upload_stats['mode'] = 'deflate'
+            sent = self.deflate_to_ramg(file_handler, size, addr + size, file_size - size)
+            if sent < 0:
+                return -1, 0
+            return file_size, size + sent
+
+        start = time.monotonic()
+        if not self._file_to_ramg(file_handler, addr + size, file_size - size):
+            return -1, 0
+        if file_size > size:
+            self.link_rate = (file_size - size) / max(time.monotonic() - start, 1e-6)
+        return file_size, file_size
@@ -9,14 +9,35 @@
         - Writing flash with progress bar:
             write_flash_with_progressbar
 
-        - Reading flash:
+        - Reading flash, see brt_eve_flash_reader:
             read_flash_to_file
             read_flash_via_ramg
+            flash_read_pipelined
+
+        - Writing flash in the background, see brt_eve_flash_job:
+            flash_job
 
         - Writing flash:
             flash_update_flash_from_ramg
             write_flash_via_ramg
             write_flash_via_fifo
+            flash_write_pipelined
+            flash_write_streamed
+            write_flash_diff
+
+        - Comparing flash, see brt_eve_flash_crc:
+            flash_crc_sectors
+            flash_update_changed_sectors
+
+        - Verifying, by CRC32 computed on EVE, see brt_eve_flash_crc:
+            verify_flash
+            verify_ramg
+            ramg_crc_regions
+
+        - Asset index, see brt_eve_flash_index:
+            flash_index
+            asset
+            write_flash_index
 
         - Reading ram_g:
             read_ramg_to_file
@@ -25,6 +46,11 @@
             write_ramg_n_bytes
             write_file_to_ramg
 
+        - Writing ram_g compressed, through cmd_inflate, see brt_eve_ramg_upload:
+            upload_file_to_ramg
+            deflate_to_ramg
+            inflate_to_ramg
+
         Blod update:
             flash_write_blob_file
             flash_write_blob_default
@@ -37,47 +63,32 @@
             flash_clearcache
 
 """
-
-from ..brt_eve_common import const
-
-def _align_mask(value, mask):
-    """ Alignment mask """
-    return ((value)+(mask))&~(mask)
-
-def align_to(value, align):
-    """ Alignment """
-    align=round(align)
-    value=round(value)
-    return _align_mask(value, align - 1)
-
-FREAD_BLOCK              = const(8 * 1024)
-BLOBSIZE                 = const(4096)
+import binascii
+
+from .brt_eve_storage_common import align_to, FREAD_BLOCK, BLOBSIZE, FIFO_SIZE_MASK, \
+    FLASH_WRITE_ALIGN_BYTE, FLASH_UPDATE_ALIGN_BYTE, FLASH_READ_ALIGN_BYTE, \
+    FLASH_SECTOR_SIZE, FLASH_DIFF_SECTORS, FLASH_PIPELINE_SLOTS, FLASH_PIPELINE_SLOT_SIZE, \
+    FLASH_CMD_SUCCESS, FLASH_CMD_UNSUCCESS, FLASH_CMD_ALIGNED_ERR, SEEK_SET, SEEK_END
+from .brt_eve_flash_job import BrtEveFlashJob
+from .brt_eve_flash_reader import BrtEveFlashReaderMixin
+from .brt_eve_flash_crc import BrtEveFlashCrcMixin
+from .brt_eve_ramg_upload import BrtEveRamGUploadMixin
+from .brt_eve_flash_index import BrtEveFlashIndex, FLASH_INDEX_ADDRESS, HEADER_SIZE, \
+    ENTRY_SIZE, pack_flash_index, unpack_flash_index_header
 
 FILE_BLOB_BT815          = "/lib/brteve/brt_eve_storage/BT815-unified.blob"
 FILE_BLOB_BT817          = "/lib/brteve/brt_eve_storage/BT817-unified.blob"
 
-EVE_CMD_FIFO_SIZE        = const(4 * 1024) # 4kB coprocessor FIFO size
-FIFO_SIZE_MASK           = const(4*1024-1)
-FIFO_BYTE_ALIGNMENT_MASK = const(4*1024-4+1)
-FLASH_WRITE_ALIGN_BYTE   = const(256)
-FLASH_UPDATE_ALIGN_BYTE  = const(4096)
-FLASH_READ_ALIGN_BYTE    = const(64)
-
-FLASH_CMD_SUCCESS     = 0
-FLASH_CMD_UNSUCCESS   = 1
-FLASH_CMD_ALIGNED_ERR = 2
-
-SEEK_SET = 0
-SEEK_CUR = 1
-SEEK_END = 2
-
 PROGESS_BAR_READ = 1
 PROGESS_BAR_WRITE = 2
 
-class BrtEveStorage(): # pylint: disable=too-many-public-methods
+class BrtEveStorage(BrtEveFlashReaderMixin, BrtEveFlashCrcMixin, BrtEveRamGUploadMixin): # pylint: disable=too-many-public-methods
     """ EVE storage read/write helper class """
     def __init__(self, eve) -> None:
         self.eve = eve
+        self.index = None
+        self.link_rate = 0 # Bytes per second of the last raw RAM_G upload
+        self.upload_stats = {}
 
     class _FlashProgressbar(): # pylint: disable=too-few-public-methods
         """ Internal Progress bar's global data """
@@ -91,6 +102,26 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         sent=''
         file_handler = ''
 
+    def _stage(self, size):
+        """ Allocate a RAM_G staging block from eve.ramg, free it with eve.ramg.free()
+            Staging never overwrites the bitmaps, media FIFOs and audio rings of the heap.
+
+            :param size: Number of bytes
+            :return: BrtEveRamGBlock, raise MemoryError when RAM_G is full
+        """
+        eve = self.eve
+        return eve.ramg.alloc(size, eve.ramg.ALIGN_FLASH_READ, name="storage")
+
+    def _read_flash_staged(self, src_flash, num):
+        """ read_flash_via_ramg through a staging block
+            :return: data buffer
+        """
+        block = self._stage(num)
+        try:
+            return self.read_flash_via_ramg(block.addr, src_flash, num)
+        finally:
+            self.eve.ramg.free(block)
+
     def flash_update_flash_from_ramg(self, dest_flash, src_ram, num):
         """ Writes the given data to flash.
             If the data matches the existing contents of flash, nothing is done.
@@ -194,11 +225,11 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         """
         # Try switch full mode
         eve = self.eve
-        eve.flash_state(eve.FLASH_STATUS_FULL)
+        self.flash_state(eve.FLASH_STATUS_FULL)
         if eve.FLASH_STATUS_FULL != eve.rd8(eve.REG_FLASH_STATUS):
             # Try update blob and switch full mode again
-            eve.flash_write_blob_default()
-            eve.flash_state(eve.FLASH_STATUS_FULL)
+            self.flash_write_blob_default()
+            self.flash_state(eve.FLASH_STATUS_FULL)
             if eve.FLASH_STATUS_FULL != eve.rd8(eve.REG_FLASH_STATUS):
                 return FLASH_CMD_UNSUCCESS
         # Erase the flash """
@@ -237,13 +268,17 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         """
         eve = self.eve
 
-        with open(blob_file, "rb") as file_hanfler:
-            self.flash_state(eve.FLASH_STATUS_BASIC) # basic mode
-            eve.write_mem(eve.RAM_G, file_hanfler.read(4096))
-            eve.finish()
+        block = self._stage(BLOBSIZE)
+        try:
+            with open(blob_file, "rb") as file_hanfler:
+                self.flash_state(eve.FLASH_STATUS_BASIC) # basic mode
+                eve.write_mem(block.addr, file_hanfler.read(4096))
+                eve.finish()
 
-        self.flash_update_flash_from_ramg(0, eve.RAM_G, BLOBSIZE)
-        eve.finish()
+            self.flash_update_flash_from_ramg(0, block.addr, BLOBSIZE)
+            eve.finish()
+        finally:
+            eve.ramg.free(block)
 
         ret = self.flash_state(eve.FLASH_STATUS_FULL) # fast mode
         if ret == FLASH_CMD_SUCCESS:
@@ -296,23 +331,24 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         progress.file = file
         progress.file_name = file.split("/")[-1].split("\\")[-1]
 
-        progress.file_handler = open(file, "rb") # pylint: disable=consider-using-with
-        progress.file_handler.seek(0, SEEK_END)
-        file_size = progress.file_handler.tell()
-        progress.file_handler.seek(0, SEEK_SET)
-        progress.file_handler.close()
-
-        if file_size > 16*1024*1024:
-            print("File size is too big, max 16Mb")
-            return 0
-
         if read_or_write == PROGESS_BAR_READ:
-            if file_size <= 0:
+            try:
+                progress.file_handler = open(file, "wb") # pylint: disable=consider-using-with
+            except OSError as exception:
                 print("Unable to open file: ", file)
+                print(exception)
                 return 0
 
             progress.message = "Reading " + progress.file_name + " from flash"
         else :
+            with open(file, "rb") as file_handler:
+                file_handler.seek(0, SEEK_END)
+                file_size = file_handler.tell()
+
+            if file_size > 16*1024*1024:
+                print("File size is too big, max 16Mb")
+                return 0
+
             # update blob from file first
             status = 0
             if addr == 0:
@@ -349,40 +385,26 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         return progress
 
     def progress_bar_write_chunk(self, progress: _FlashProgressbar) :
-        """ Write a block data of file to flash
+        """ Write a block data of file to flash, only the sectors which changed are sent
             :param progress: _FlashProgressbar struct
             :return: Percent of data transfered, 100 mean file transfer is done
         """
-        eve = self.eve
         sent = 0
-        ramg_sent = 0
-        block_size = 0
 
         # Tranfer 1 percent of file
         while (progress.sent < progress.file_size and sent < progress.byte_per_1percent) :
-            block_size = progress.byte_per_1percent\
-                if FREAD_BLOCK > progress.byte_per_1percent else FREAD_BLOCK
-
-            # Tranfer to eve.RAM_g
-            while (ramg_sent < eve.RAM_G_SIZE
-                   and progress.sent < progress.file_size
-                   and sent < progress.byte_per_1percent) :
-                data = progress.file_handler.read(block_size)
-                byte_num = len(data)
-                if byte_num == 0:
-                    print("Error on reading file:", progress.file)
-                    return 0
-
-                eve.write_mem(ramg_sent, data)
-                eve.finish()
-                ramg_sent += byte_num
-                sent += byte_num
-                progress.sent += byte_num
+            num = min(progress.byte_per_1percent - sent,
+                      progress.file_size - progress.sent,
+                      FLASH_DIFF_SECTORS * FLASH_SECTOR_SIZE)
+            written = self.flash_update_changed_sectors(progress.file_handler,
+                progress.sent, progress.addr, num)
+            if written < 0:
+                print("Error on reading file:", progress.file)
+                return 0
 
-            # Update flash from eve.RAM_g
-            ramg_sent = (ramg_sent + 4095) & (~4095)#to ensure 4KB alignment
-            self.flash_update_flash_from_ramg(progress.addr, 0, ramg_sent)
-            progress.addr += ramg_sent
+            sent += num
+            progress.sent += num
+            progress.addr += num
 
         return progress.sent * 100 / progress.file_size # Percent """
 
@@ -391,36 +413,15 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
             :param progress: _FlashProgressbar struct
             :return: Percent of data received, 100 mean data transfer is done
         """
-        eve = self.eve
-        buffer_size = FREAD_BLOCK
-        sent = 0
-        block_size = 0
-        gramaddr = eve.RAM_G
-
-        while (progress.sent < progress.file_size and sent < progress.byte_per_1percent) :
-            chunk_size = progress.byte_per_1percent\
-                if buffer_size > progress.byte_per_1percent else buffer_size
-
-            if (progress.file_size - progress.sent) < chunk_size:
-                chunk_size = progress.file_size - progress.sent
-
-            # source address in flash memory Must be 64-byte aligned.
-            block_size = align_to(chunk_size, 64)
-
-            fret = self.read_flash_via_ramg(gramaddr, progress.addr, block_size)
-
-            if len(fret) != block_size:
-                print("Error when reading flash\n")
+        num = min(progress.byte_per_1percent, progress.file_size - progress.sent)
+        if num > 0:
+            received = self.flash_read_pipelined(progress.file_handler, progress.addr, num)
+            if received < 0:
+                print("Unable to write file: ", progress.file)
                 return 0
 
-            sent += block_size
-            progress.sent += block_size
-            progress.addr += block_size
-            try:
-                progress.file_handler.write(fret)
-            except IOError as exception:
-                print("Unable to write file: ", progress.file)
-                print(exception)
+            progress.sent += received
+            progress.addr += received
 
         return (int)(progress.sent * 100 / progress.file_size) # Percent
 
@@ -468,16 +469,19 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
 
         return FLASH_CMD_SUCCESS
 
-    def write_flash_with_progressbar(self, file, address) :
+    def write_flash_with_progressbar(self, file, address, verify=False) :
         """ Write file to flash and show a default progress bar on LCD
 
             :param file: File to transfer
             :param address: Address on flash
-            :return: Number of bytes transfered
+            :param verify: Set to True to check the flash content by CRC32 after writing
+            :return: Number of bytes transfered, 0 on error
         """
         progress = self.progress_bar_init(file, address, PROGESS_BAR_WRITE)
         if progress == 0:
             return 0 # Error
+        offset = progress.sent
+        addr = progress.addr
 
         while 1:
             percent = self.progress_bar_write_chunk(progress)
@@ -486,6 +490,11 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
             if percent >= 100:
                 break
 
+        if verify and self._verify_failed(self.verify_flash(progress.file_handler,
+                offset, addr, progress.file_size - offset), file):
+            progress.file_handler.close()
+            return 0 # Error
+
         progress.file_handler.close()
         return progress.file_size
 
@@ -496,7 +505,11 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
             :return: Number of bytes received
         """
         progress = self.progress_bar_init(file, address, PROGESS_BAR_READ)
+        if progress == 0:
+            return 0 # Error
         progress.file_size = size
+        progress.byte_per_1percent = max(align_to(size / 100, FLASH_PIPELINE_SLOT_SIZE),
+                                         FLASH_PIPELINE_SLOT_SIZE)
 
         while 1:
             percent = self.progress_bar_read_chunk(progress)
@@ -508,16 +521,31 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         return progress.file_size
 
 
-    def write_flash_via_fifo(self, file, addr, is_erase) :
+    def flash_job(self, file, addr, journal=None, on_progress=None, progress_interval=0.5): # pylint: disable=too-many-arguments
+        """ Create a job writing file to flash in small steps, see BrtEveFlashJob
+            The application calls job.step() from its main loop until it returns False.
+
+            :param file: File to write
+            :param addr: Address on flash, 0 to update the blob from the file too
+            :param journal: Optional path of the progress journal, to resume after a power loss
+            :param on_progress: Optional function called with the job, rate limited
+            :param progress_interval: Minimum time between two on_progress calls, in seconds
+            :return: BrtEveFlashJob object
+        """
+        return BrtEveFlashJob(self, file, addr, journal, on_progress, progress_interval)
+
+    def write_flash_via_fifo(self, file, addr, is_erase, verify=False) :
         """ Write file to flash via CMD_FLASHWRITE
+            The flash must be erased, by is_erase or beforehand.
+
             :param file: File to write
-            :param addr: Address on flash
+            :param addr: Address on flash. Must be 256-byte aligned
             :param is_erase: set to True to erase flash before write data
+            :param verify: Set to True to check the flash content by CRC32 after writing
             :return: Number of bytes transfered on successful
         """
         eve=self.eve
         file_size = 0
-        blocklen = 0
 
         #Erase Flash
         if is_erase and FLASH_CMD_UNSUCCESS == self.flash_erase():
@@ -531,18 +559,15 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
 
         try:
             with open(file, "rb") as file_handler:
-                eve.wr32(0x45) # send CMD_FLASHWRITE
-                eve.wr32(addr)
-                eve.wr32(align_to(file_size, FLASH_WRITE_ALIGN_BYTE))
-
-                #/ Download data to Coprocessor
-                data = file_handler.read(EVE_CMD_FIFO_SIZE)
-                blocklen = len(data)
-                while blocklen > 0:
-                    byte_num = align_to(blocklen, FLASH_WRITE_ALIGN_BYTE)
-                    eve.write_mem(data, byte_num)
-                    data = file_handler.read(EVE_CMD_FIFO_SIZE)
-                    blocklen = len(data)
+                file_handler.seek(0, SEEK_END)
+                file_size = file_handler.tell()
+
+                if self.flash_write_streamed(file_handler, 0, addr, file_size) < 0:
+                    print("Error on writing file:", file)
+                    return 0 # Error
+                if verify and self._verify_failed(
+                        self.verify_flash(file_handler, 0, addr, file_size), file):
+                    return 0 # Error
         except OSError as exception:
             print("Unable to open file: ", file)
             print(exception)
@@ -550,30 +575,39 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
 
         return file_size # File size
 
-    def write_flash_via_ramg(self, file, addr):
+    def _flash_write_prepare(self, file, addr):
+        """ Update the blob from the file when it is written from address 0, otherwise
+            check the blob, writing the default one if flash cannot switch to full mode
+            :return: False if flash is not in full mode
+        """
+        eve = self.eve
+        if addr < BLOBSIZE:
+            self.flash_write_blob_file(file)
+            return True
+
+        #/ check and write blob
+        ret = self.flash_state(eve.FLASH_STATUS_FULL) # full mode
+        if ret != 0:
+            self.flash_write_blob_default()
+
+            ret = self.flash_state(eve.FLASH_STATUS_FULL) # full mode
+            if ret != 0:
+                print("Cannot switch flash to fullmode\n")
+                return False
+        return True
+
+    def write_flash_via_ramg(self, file, addr, verify=False):
         """ Write file to flash via RAM_G
             :param file: File to write
             :param addr: Address on flash
+            :param verify: Set to True to check the flash content by CRC32 after writing
             :return: Number of bytes transfered on successful
         """
-        eve = self.eve
-        buffer_size = FREAD_BLOCK
         sent = 0
-        ramg_sent = 0
 
         # update blob from file first
-        if addr < BLOBSIZE:
-            self.flash_write_blob_file(file)
-        else :
-            #/ check and write blob
-            ret = self.flash_state(eve.FLASH_STATUS_FULL) # full mode
-            if ret != 0:
-                self.flash_write_blob_default()
-
-                ret = self.flash_state(eve.FLASH_STATUS_FULL) # full mode
-                if ret != 0:
-                    print("Cannot switch flash to fullmode\n")
-                    return 0 # Error
+        if not self._flash_write_prepare(file, addr):
+            return 0 # Error
 
         try:
             with open(file, "rb") as file_handler:
@@ -587,24 +621,15 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
                     file_handler.seek(addr)
 
                 #/ Transfer rest of file to EVE (in fast mode)
-                while sent < file_size:
-                    # Fill up RAMG
-                    while (ramg_sent < eve.RAM_G_SIZE and sent < file_size) :
-                        data = file_handler.read(buffer_size)
-                        blocklen = len(data)
-                        if blocklen == 0:
-                            print("Error on reading file:", file)
-                            return 0 # Error
-
-                        eve.write_mem(ramg_sent, data, blocklen)
-
-                        ramg_sent += blocklen
-                        sent += blocklen
-
-                    # Send RAMG to Flash
-                    ramg_sent = (ramg_sent + 4095) & (~4095)#to ensure 4KB alignment
-                    self.flash_update_flash_from_ramg(addr, 0, ramg_sent)
-                    addr += ramg_sent
+                if sent < file_size:
+                    ret = self.flash_write_pipelined(file_handler, sent, addr, file_size - sent)
+                    if ret < 0:
+                        print("Error on reading file:", file)
+                        return 0 # Error
+                    if verify and self._verify_failed(
+                            self.verify_flash(file_handler, sent, addr, ret), file):
+                        return 0 # Error
+                    sent += ret
         except OSError as exception:
             print("Unable to open file: ", file)
             print(exception)
@@ -612,40 +637,198 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
 
         return sent # File size """
 
-    def read_flash_to_file(self, file, address, size) :
-        """ Read data on RAMG into a file
-            :param file: Filename output
-            :param address: Address on RAM_G
-            :param size: Size to read
-            :return: FLASH_CMD_SUCCESS on successful
+    def flash_write_pipelined(self, file_handler, offset, dest_flash, num, # pylint: disable=too-many-arguments
+                              slots=FLASH_PIPELINE_SLOTS, slot_size=FLASH_PIPELINE_SLOT_SIZE):
+        """ Write a part of a file to flash, uploading a slot while flash programs the previous one
+            A RAM_G block of eve.ramg is split in slots, followed by a fence word. Each slot
+            is programmed by cmd_flashupdate, then cmd_memwrite stores its sequence number
+            in the fence.
+            A slot is refilled once the fence shows the coprocessor is done with it, instead
+            of waiting with finish(), so SPI and flash are busy at the same time.
+            Flash must be in full mode.
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param dest_flash: Destination in flash memory. Must be 4096-byte aligned
+            :param num: Number of bytes to write
+            :param slots: Number of RAM_G slots, 1 for no overlap
+            :param slot_size: Size of a slot, multiple of 4096
+            :return: Number of bytes written, -1 on file error
         """
-        gramaddr = 0
-        block_size = 4 * 1024 #/ block_size must be less than RAMG size
-        address = align_to(address, 64)
-        size = align_to(size, 4)
-
+        eve = self.eve
+        block = self._stage(slots * slot_size + 4)
         try:
-            with open(file, "rb") as file_handler:
-                sent = 0
-                while size > 0:
-                    blocklen = size if block_size > size else block_size
-                    buff = self.read_flash_via_ramg(gramaddr, address, blocklen)
-                    size -= blocklen
-                    sent += blocklen
-                    address += blocklen
+            return self._flash_write_slots(file_handler, offset, dest_flash, num, block.addr,
+                                           slots, slot_size)
+        finally:
+            eve.ramg.free(block)
+
+    def _flash_write_slots(self, file_handler, offset, dest_flash, num, ram, # pylint: disable=too-many-arguments
+                           slots, slot_size):
+        """ flash_write_pipelined through the slots at ram, the coprocessor is idle on return"""
+        eve = self.eve
+        fence = ram + slots * slot_size
+        sequence = 0
+        sent = 0
 
-                    try:
-                        file_handler.write(buff, blocklen)
-                    except IOError as exception:
-                        print("Unable to write file: ", file)
-                        print(exception)
-                        return FLASH_CMD_UNSUCCESS
-        except OSError as exception:
-            print("Unable to open file: ", file)
-            print(exception)
-            return FLASH_CMD_UNSUCCESS
+        eve.finish()
+        eve.wr32(fence, 0)
+        file_handler.seek(offset)
+        while sent < num:
+            sequence += 1
+            slot = ram + (sequence - 1) % slots * slot_size
+
+            # The cmd_flashupdate of slots sequences ago reads this slot
+            while sequence > slots and eve.rd32(fence) < sequence - slots:
+                eve.getspace() # raises on coprocessor fault
+
+            size = min(slot_size, num - sent)
+            if not self._file_to_ramg(file_handler, slot, size):
+                eve.finish()
+                return -1
+
+            # Pad the last sector with erased flash value
+            padded = align_to(size, FLASH_SECTOR_SIZE)
+            if padded > size:
+                eve.cmd_memset(slot + size, 0xff, padded - size)
+            eve.cmd_flashupdate(dest_flash + sent, slot, padded)
+            eve.cmd_memwrite(fence, 4)
+            eve.cc(sequence.to_bytes(4, "little"))
+            eve.flush()
+            sent += size
 
-        return FLASH_CMD_SUCCESS
+        eve.finish()
+        return sent
+
+    def _file_to_ramg(self, file_handler, addr, num):
+        """ Upload the next num bytes of a file to RAM_G
+            :return: False if the file ends before
+        """
+        eve = self.eve
+        size = 0
+        while size < num:
+            data = file_handler.read(min(FREAD_BLOCK, num - size))
+            if len(data) == 0:
+                return False
+            eve.write_mem(addr + size, data)
+            size += len(data)
+        return True
+
+    def flash_write_streamed(self, file_handler, offset, dest_flash, num):
+        """ Write a part of a file to erased flash, streaming it through the command FIFO
+            The data of cmd_flashwrite follows the command inline. It is sent in chunks
+            sized to the FIFO space free at that time, straight to REG_CMDB_WRITE: no RAM_G
+            staging and no sector compare, so it is the fastest path to erased flash.
+            Flash must be in full mode.
+
+            :param file_handler: File opened in binary mode
+            :param offset: Offset of the data in the file
+            :param dest_flash: Destination in flash memory. Must be 256-byte aligned
+            :param num: Number of bytes to write, the last page is padded with 0xff
+            :return: Number of bytes written, -1 on error
+        """
+        eve = self.eve
+        if dest_flash % FLASH_WRITE_ALIGN_BYTE != 0:
+            print("Flash address must be 256-byte aligned")
+            return -1
+
+        padded = align_to(num, FLASH_WRITE_ALIGN_BYTE)
+        eve.cmd(0x45, "II", (dest_flash, padded)) # cmd_flashwrite, data follows
+        eve.flush()
+
+        file_handler.seek(offset)
+        sent = 0
+        error = False
+        while sent < num:
+            data = file_handler.read(min(FREAD_BLOCK, num - sent))
+            if len(data) == 0:
+                # The coprocessor still waits for data, give it erased bytes
+                data = b"\xff" * (num - sent)
+                error = True
+            if sent + len(data) >= num:
+                data += b"\xff" * (padded - num)
+
+            self._write_fifo(data)
+            sent += len(data)
+
+        eve.finish()
+        return -1 if error else num
+
+    def _write_fifo(self, data):
+        """ Write the data following a command to the command FIFO, as the FIFO space allows
+            :param data: Bytes, a multiple of 4
+        """
+        eve = self.eve
+        view = memoryview(data)
+        pos = 0
+        while pos < len(data):
+            # As much as the FIFO takes now, whole words only
+            chunk = min(len(data) - pos, eve.space & ~3, eve.write_chunk)
+            if chunk == 0:
+                eve.getspace()
+                continue
+            eve.write(bytes(view[pos:pos + chunk]))
+            pos += chunk
+
+    def flash_index(self, reload=False):
+        """ Read the asset index at FLASH_INDEX_ADDRESS, once
+            The index goes through a RAM_G staging block by cmd_flashread.
+
+            :param reload: Set to True to read the index from flash again
+            :return: BrtEveFlashIndex, empty if the flash has no valid index
+        """
+        eve = self.eve
+        if self.index is not None and not reload:
+            return self.index
+
+        self.index = BrtEveFlashIndex()
+        if self.flash_state(eve.FLASH_STATUS_FULL) != 0:
+            print("Cannot switch flash to fullmode\n")
+            return self.index
+
+        header = self._read_flash_staged(FLASH_INDEX_ADDRESS, FLASH_READ_ALIGN_BYTE)
+        count, crc = unpack_flash_index_header(header)
+        if count == 0:
+            return self.index
+
+        length = HEADER_SIZE + count * ENTRY_SIZE
+        data = self._read_flash_staged(FLASH_INDEX_ADDRESS, align_to(length, 4))
+        entries = data[HEADER_SIZE:length]
+        if binascii.crc32(entries) != crc:
+            print("Flash asset index is corrupted")
+            return self.index
+
+        self.index = BrtEveFlashIndex(entries)
+        return self.index
+
+    def asset(self, name):
+        """ Look an asset up by name in the flash index
+            :param name: Asset name
+            :return: dict with keys addr, size, format, width, height, crc, None if not found
+        """
+        return self.flash_index().get(name)
+
+    def write_flash_index(self, assets):
+        """ Write the asset index at FLASH_INDEX_ADDRESS, through a RAM_G staging block
+            The assets must not overlap the index sectors. Flash must be in full mode.
+
+            :param assets: List of dict with keys name, addr, size, and optionally
+                           format, width, height, crc
+            :return: FLASH_CMD_SUCCESS on successful
+        """
+        eve = self.eve
+        data = pack_flash_index(assets)
+        size = align_to(len(data), FLASH_SECTOR_SIZE)
+
+        block = self._stage(size)
+        try:
+            eve.write_mem(block.addr, data)
+            eve.cmd_memset(block.addr + len(data), 0xff, size - len(data))
+            ret = self.flash_update_flash_from_ramg(FLASH_INDEX_ADDRESS, block.addr, size)
+        finally:
+            eve.ramg.free(block)
+        self.index = None
+        return ret
 
     def flash_size(self):
         """ Get flash size
@@ -656,16 +839,17 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
         size = eve.rd32(eve.REG_FLASH_SIZE)
         return size
 
-    def write_ramg_n_bytes(self, file, addr, nbytes, offset) :
+    def write_ramg_n_bytes(self, file, addr, nbytes, offset, verify=False) : # pylint: disable=too-many-arguments
         """ Transfer a file to RAMG
             :param file: File to transfer
             :param addr: Address on RAMG
             :param nbytes: number of byte to write
             :param offset: file offset
-            :return: Number of bytes transfered
+            :param verify: Set to True to check the RAM_G content by CRC32 after writing
+            :return: Number of bytes transfered, 0 on error
         """
         eve = self.eve
-        buffer_size = FREAD_BLOCK
+        buffer_size = eve.write_chunk
         sent = 0
         file_size = 0
 
@@ -682,18 +866,17 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
                 if offset:
                     file_handler.seek(offset)
 
-                remain = nbytes
                 while (file_size > 0 and sent < nbytes) :
-                    blocklen = remain if buffer_size>remain else buffer_size
-                    if (sent + blocklen) > nbytes:
-                        blocklen = nbytes - sent
+                    blocklen = min(buffer_size, nbytes - sent)
                     data = file_handler.read(blocklen)
 
-                    eve.write_mem(addr, data)
+                    eve.write_mem(addr + sent, data)
                     file_size -= blocklen
-                    remain -= blocklen
                     sent += blocklen
-                    addr += blocklen
+
+                if verify and self._verify_failed(
+                        self.verify_ramg(file_handler, offset, addr, sent), file):
+                    return 0 # Error
         except OSError as exception:
             print("Unable to open file: ", file)
             print(exception)
@@ -701,13 +884,14 @@ class BrtEveStorage(): # pylint: disable=too-many-public-methods
 
         return sent
 
-    def write_file_to_ramg(self, file, addr):
+    def write_file_to_ramg(self, file, addr, verify=False):
         """ Transfer a whole file to RAM_G
             :param file: File to transfer
             :param addr: Address on RAMG
+            :param verify: Set to True to check the RAM_G content by CRC32 after writing
             :return: Number of bytes transfered on successful
         """
-        return self.write_ramg_n_bytes(file, addr, 0, 0)
+        return self.write_ramg_n_bytes(file, addr, 0, 0, verify)
 
     def read_ramg_to_file(self, file, address, size):
         """ Read data on RAMG into a file
@@ -0,0 +1,50 @@
+""" Sizes, alignments and result codes shared by the modules of BrtEveStorage"""
+from ..brt_eve_common import const
+
+def _align_mask(value, mask):
+    """ Alignment mask """
+    return ((value)+(mask))&~(mask)
+
+def align_to(value, align):
+    """ Alignment """
+    align=round(align)
+    value=round(value)
+    return _align_mask(value, align - 1)
+
+def file_size_of(file_handler):
+    """ Size of an open file, which is left positioned at its end"""
+    file_handler.seek(0, SEEK_END)
+    return file_handler.tell()
+
+def open_failed(file, exception):
+    """ Report a file which cannot be opened
+        :return: 0, the error result of the file transfers
+    """
+    print("Unable to open file: ", file)
+    print(exception)
+    return 0
+
+FREAD_BLOCK              = const(8 * 1024)
+BLOBSIZE                 = const(4096)
+
+EVE_CMD_FIFO_SIZE        = const(4 * 1024) # 4kB coprocessor FIFO size
+FIFO_SIZE_MASK           = const(4*1024-1)
+FIFO_BYTE_ALIGNMENT_MASK = const(4*1024-4+1)
+FLASH_WRITE_ALIGN_BYTE   = const(256)
+FLASH_UPDATE_ALIGN_BYTE  = const(4096)
+FLASH_READ_ALIGN_BYTE    = const(64)
+FLASH_SECTOR_SIZE        = const(4096)
+# Sectors compared per batch: staged in RAM_G, 16 bytes of commands each
+FLASH_DIFF_SECTORS       = const(64)
+# RAM_G staging of the pipelined writer and reader: flash programs or reads a slot
+# while SPI transfers the other one
+FLASH_PIPELINE_SLOTS     = const(2)
+FLASH_PIPELINE_SLOT_SIZE = const(64 * 1024)
+
+FLASH_CMD_SUCCESS     = 0
+FLASH_CMD_UNSUCCESS   = 1
+FLASH_CMD_ALIGNED_ERR = 2
+
+SEEK_SET = 0
+SEEK_CUR = 1
+SEEK_END = 2
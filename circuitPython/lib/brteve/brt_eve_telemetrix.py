@@ -26,6 +26,9 @@ PIN_DCX_EVE_ILI9488 = 8 #D/CX pin of ILI9488
 DUMMY_BYTE_LENGTH = 1  #2 for QSPI(Unsupported yet)
 FREQ = 1000 * 1000
 
+# Port and pico ID of the last successful connection, see TelemetrixRpiPico
+SESSION_CACHE = os.path.join(os.path.expanduser("~"), ".brteve_telemetrix_session.json")
+
 class _eve_report:
     data = None
     count_ack  = 0
@@ -55,10 +58,23 @@ class BrtEveTelemetrix():
      - write_ili9488_cmd()
      - write_ili9488_data()
      - spi_sdcard -- SPI object of SDcard interface
+
+    And may advertise its transfer capabilities, see BrtEveModule.setup_transfer_size():
+     - max_transfer_size -- largest efficient write, in bytes, address included
+     - max_read_size -- largest efficient read, in bytes, dummy byte included
+     - transfer_alignment -- preferred chunk alignment, in bytes
     """
-    def __init__(self):
-        # Instantiate the TelemetrixRpiPico class accepting all default parameters.
-        self.pico = TelemetrixRpiPico()
+
+    # 7 bytes header: 0xee, size_msb, size_lsb, command, port, size_msb, size_lsb
+    max_transfer_size = 4096 - 8
+    # SPI reports carry a one byte packet length: type, port and count, then the data
+    max_read_size = 255 - 3
+    transfer_alignment = 4
+
+    def __init__(self, com_port=None, pico_instance_id=None, session_cache=SESSION_CACHE):
+        # Instantiate the TelemetrixRpiPico class, reusing the port and pico ID
+        # of the previous run when they are still valid.
+        self.pico = TelemetrixRpiPico(com_port, pico_instance_id, session_cache=session_cache)
         # initialize the device
         # These are "non-standard" pin-numbers, and therefore
         # the qualify_pins parameter is set to FALSE
@@ -0,0 +1,60 @@
+"""asyncio variant of the Telemetrix host platform, for applications
+   that drive EVE from an async UI loop"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "telemetrix_rpi_pico")))
+
+# The Telemetrix clients import private_constants from the path set above
+# pylint: disable=wrong-import-position
+from .telemetrix_rpi_pico.telemetrix_rpi_pico_aio import TelemetrixRpiPicoAio
+from .brt_eve_telemetrix import BrtEveTelemetrix, SPI_PORT, MISO, MOSI, CLK, CS, CS_PIN, \
+    HIGH, LOW, FREQ
+# pylint: enable=wrong-import-position
+
+class BrtEveTelemetrixAio():
+    """ Host platform RP2040 running Telemetrix4RpiPico, driven by asyncio
+
+    Same as BrtEveTelemetrix, except that the transfer functions are
+    coroutines. Chip select, write and read commands of one transfer are
+    queued on the serial link back to back, then the replies are awaited.
+
+    Usage:
+        host = BrtEveTelemetrixAio()
+        await host.start()
+        data = await host.transfer(address, 5)
+    """
+
+    # Same transfers as BrtEveTelemetrix, see there
+    max_transfer_size = BrtEveTelemetrix.max_transfer_size
+    max_read_size = BrtEveTelemetrix.max_read_size
+    transfer_alignment = BrtEveTelemetrix.transfer_alignment
+
+    def __init__(self, com_port=None, pico_instance_id=None):
+        self.pico = TelemetrixRpiPicoAio(com_port, pico_instance_id)
+
+    async def start(self):
+        """ Connect to the Pico and configure SPI for EVE"""
+        await self.pico.start()
+        # These are "non-standard" pin-numbers, and therefore
+        # the qualify_pins parameter is set to FALSE
+        await self.pico.set_pin_mode_spi(SPI_PORT, MISO, MOSI, CLK, FREQ, CS,
+                                         qualify_pins=False)
+
+    async def transfer(self, write_data, bytes_to_read = 0):
+        """ Transfer data via SPI"""
+        pico = self.pico
+        pico.spi_cs_control(CS_PIN, LOW)
+        written = pico.spi_write_blocking(write_data, SPI_PORT)
+        read = None
+        if bytes_to_read != 0:
+            read = pico.spi_read_blocking(bytes_to_read, SPI_PORT)
+        pico.spi_cs_control(CS_PIN, HIGH)
+
+        await written
+        if read is None:
+            return None
+        return await read
+
+    async def shutdown(self):
+        """ Release the serial link"""
+        await self.pico.shutdown()
@@ -0,0 +1,462 @@
+"""Share one Pico running Telemetrix between several processes
+
+The broker owns the serial link and executes the SPI transfers of its
+clients, received over a Unix socket, one request at a time in round-robin
+order. A client may lock the link to keep a sequence of transfers, such as
+a coprocessor command stream, from being interleaved with other clients.
+A lock held longer than max_lock_time while other clients wait is preempted.
+
+Usage, in the process owning the Pico:
+    broker = TelemetrixBroker()
+    broker.serve_forever()
+
+And in every client process, instead of BrtEveTelemetrix:
+    host = BrtEveTelemetrixClient()
+    eve = BrtEve(host)
+"""
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import tempfile
+import time
+from collections import deque
+
+from .brt_eve_telemetrix import BrtEveTelemetrix, SPI_PORT
+
+BROKER_SOCKET = os.path.join(tempfile.gettempdir(), "brteve_telemetrix.sock")
+
+# Message: op, flags (status in replies), bytes to read, payload length, payload
+_HEADER = struct.Struct("<BBHI")
+
+# Errors of requests which are not replied are reported by the next reply of a read
+OP_TRANSFER = 1 # CS low, write, read, CS high. Replied when there is data to read
+OP_WRITE = 2    # Write without CS or D/CX control, for ILI9488. Not replied
+OP_LOCK = 3     # Wait for exclusive use of the link. Replied once acquired
+OP_UNLOCK = 4   # Not replied
+OP_STATS = 5    # Replied with the statistics of every client, in JSON
+OP_HELLO = 6    # Client name, for the statistics. Not replied
+
+FLAG_LOCK = 1   # Acquire the lock before executing the request
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Longest time a client keeps the lock while others wait, in seconds
+MAX_LOCK_TIME = 1.0
+
+# EVE registers the client watches to lock coprocessor command streams
+_REG_CMD_READ = 0x3020f8
+_REG_CMDB_SPACE = 0x302574
+_REG_CMDB_WRITE = 0x302578
+_FIFO_MAX = 0xffc
+
+def _recv_exactly(sock, size):
+    """ Read size bytes from a blocking socket"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Telemetrix broker closed the connection")
+        data += chunk
+    return bytes(data)
+
+class _BrokerClient: # pylint: disable=too-few-public-methods
+    """ State of a client connection, in the broker"""
+
+    def __init__(self, sock, number):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.requests = deque()
+        self.stats = {
+            "name": "client%d" % number,
+            "requests": 0,
+            "transfers": 0,
+            "bytes_written": 0,
+            "bytes_read": 0,
+            "wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "link_time": 0.0,
+            "lock_time": 0.0,
+            "preempted": 0,
+            "errors": 0,
+        }
+        self.locked_at = 0
+        self.error = None # Error of a request not replied, for the next reply of a read
+
+class TelemetrixBroker():
+    """ Serve the SPI link of a Pico to the clients of a Unix socket
+
+    Each request of a client is executed atomically, in the order it was sent.
+    Clients with pending requests are served in turn, one request each, except
+    while a client holds the lock: then only its requests are executed, until
+    it unlocks, or until it held the lock for max_lock_time while other clients
+    wait. The lock is then taken from it, and its requests run unlocked.
+
+    :param socket_path: Path of the Unix socket to listen on
+    :param host: BrtEveTelemetrix owning the serial link, opened with the
+                 following parameters when not given
+    :param com_port: Serial port of the Pico
+    :param pico_instance_id: ID of the Pico
+    :param max_lock_time: Longest time a client keeps the lock while others wait,
+                          in seconds, None for no limit
+    """
+
+    def __init__(self, socket_path=BROKER_SOCKET, host=None, com_port=None,
+                 pico_instance_id=None, max_lock_time=MAX_LOCK_TIME): # pylint: disable=too-many-arguments
+        self.host = host if host is not None else BrtEveTelemetrix(com_port, pico_instance_id)
+        self.socket_path = socket_path
+        self.max_lock_time = max_lock_time
+        self.clients = []
+        self.next_client = 0
+        self.lock_owner = None
+        self.client_count = 0
+        self.running = False
+        # Request handlers by op
+        self.handlers = {
+            OP_TRANSFER: self._op_transfer,
+            OP_WRITE: self._op_write,
+            OP_LOCK: self._op_lock,
+            OP_UNLOCK: self._op_unlock,
+            OP_STATS: self._op_stats,
+            OP_HELLO: self._op_hello,
+        }
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        self.server.listen()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+
+    def serve_forever(self):
+        """ Serve the clients until shutdown() is called"""
+        self.running = True
+        try:
+            while self.running:
+                runnable = self._runnable_client() is not None
+                timeout = 0.5 if self.max_lock_time is None else min(0.5, self.max_lock_time)
+                for key, _ in self.selector.select(0 if runnable else timeout):
+                    if key.fileobj is self.server:
+                        self._accept()
+                    else:
+                        self._receive(key.data)
+
+                client = self._runnable_client()
+                if client is not None:
+                    # The next turn starts after this client
+                    self.next_client = (self.clients.index(client) + 1) % len(self.clients)
+                    self._execute(client)
+        finally:
+            self._close()
+
+    def shutdown(self):
+        """ Stop serving, after the current request"""
+        self.running = False
+
+    def _close(self):
+        for client in list(self.clients):
+            self._disconnect(client)
+        self.selector.close()
+        self.server.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.host.pico.shutdown()
+
+    def _accept(self):
+        sock, _ = self.server.accept()
+        self.client_count += 1
+        client = _BrokerClient(sock, self.client_count)
+        self.clients.append(client)
+        self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def _disconnect(self, client):
+        """ Forget a client, releasing its lock"""
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        if self.lock_owner is client:
+            self._unlock(client)
+        index = self.clients.index(client)
+        self.clients.remove(client)
+        if index < self.next_client:
+            self.next_client -= 1
+        print("Telemetrix broker:", json.dumps(client.stats))
+
+    def _receive(self, client):
+        """ Queue the complete requests received from a client"""
+        try:
+            data = client.sock.recv(64 * 1024)
+        except OSError:
+            data = b""
+        if not data:
+            self._disconnect(client)
+            return
+
+        client.buffer += data
+        now = time.monotonic()
+        while len(client.buffer) >= _HEADER.size:
+            header = _HEADER.unpack_from(client.buffer)
+            size = _HEADER.size + header[3]
+            if len(client.buffer) < size:
+                break
+            payload = bytes(client.buffer[_HEADER.size:size])
+            del client.buffer[:size]
+            client.requests.append((header, payload, now))
+
+    def _runnable_client(self):
+        """ Next client in turn with a request that can run, or None"""
+        owner = self.lock_owner
+        if owner is not None and self._lock_expired(owner):
+            print("Telemetrix broker: lock of %s preempted" % owner.stats["name"])
+            owner.stats["preempted"] += 1
+            self._unlock(owner)
+        elif owner is not None:
+            return owner if owner.requests else None
+
+        count = len(self.clients)
+        for i in range(count):
+            client = self.clients[(self.next_client + i) % count]
+            if client.requests:
+                return client
+        return None
+
+    def _lock_expired(self, owner):
+        """ Whether the lock owner held it for max_lock_time, and other clients wait"""
+        if self.max_lock_time is None:
+            return False
+        if time.monotonic() - owner.locked_at < self.max_lock_time:
+            return False
+        return any(client.requests for client in self.clients if client is not owner)
+
+    def _lock(self, client):
+        if self.lock_owner is client:
+            return
+        self.lock_owner = client
+        client.locked_at = time.monotonic()
+
+    def _unlock(self, client):
+        if self.lock_owner is client:
+            client.stats["lock_time"] += time.monotonic() - client.locked_at
+            self.lock_owner = None
+
+    def _execute(self, client):
+        """ Execute the oldest request of a client, and reply when needed"""
+        (op, flags, bytes_to_read, _), payload, received_at = client.requests.popleft()
+        stats = client.stats
+        start = time.monotonic()
+        wait = start - received_at
+        stats["requests"] += 1
+        stats["wait_time"] += wait
+        stats["max_wait_time"] = max(stats["max_wait_time"], wait)
+
+        if flags & FLAG_LOCK or op == OP_LOCK:
+            self._lock(client)
+
+        reply, status = None, STATUS_OK
+        handler = self.handlers.get(op)
+        if handler is not None:
+            reply, status = handler(client, payload, bytes_to_read)
+        stats["link_time"] += time.monotonic() - start
+
+        if reply is not None:
+            try:
+                client.sock.sendall(_HEADER.pack(op, status, 0, len(reply)) + reply)
+            except OSError:
+                self._disconnect(client)
+
+    # Request handlers, return the reply, None when not replied, and its status
+
+    def _op_transfer(self, client, payload, bytes_to_read):
+        data = None
+        try:
+            data = self.host.transfer(payload, bytes_to_read)
+        except RuntimeError as exception:
+            self._error(client, exception)
+        client.stats["transfers"] += 1
+        client.stats["bytes_written"] += len(payload)
+        if not bytes_to_read:
+            return None, STATUS_OK
+        client.stats["bytes_read"] += bytes_to_read
+        if client.error is not None:
+            error, client.error = client.error, None
+            return error.encode(), STATUS_ERROR
+        return data, STATUS_OK
+
+    def _op_write(self, client, payload, _):
+        try:
+            self.host.spi_write_blocking(payload, SPI_PORT)
+        except RuntimeError as exception:
+            self._error(client, exception)
+        client.stats["bytes_written"] += len(payload)
+        return None, STATUS_OK
+
+    @staticmethod
+    def _op_lock(*_):
+        # The lock is acquired before the handler
+        return b"", STATUS_OK
+
+    def _op_unlock(self, client, *_):
+        self._unlock(client)
+        return None, STATUS_OK
+
+    def _op_stats(self, *_):
+        return json.dumps([c.stats for c in self.clients]).encode(), STATUS_OK
+
+    @staticmethod
+    def _op_hello(client, payload, _):
+        client.stats["name"] = payload.decode()
+        return None, STATUS_OK
+
+    @staticmethod
+    def _error(client, exception):
+        """ Keep the first error of a client until its next read reply"""
+        print("Telemetrix broker:", client.stats["name"], exception)
+        client.stats["errors"] += 1
+        if client.error is None:
+            client.error = str(exception)
+
+class BrtEveTelemetrixClient():
+    """ Host platform sharing a Pico running Telemetrix through TelemetrixBroker
+
+    Drop-in replacement for BrtEveTelemetrix. Writes are sent without waiting,
+    reads wait for their data. A failed write raises RuntimeError from the next read.
+
+    Coprocessor command streams are kept atomic: the link is locked on the
+    first write to REG_CMDB_WRITE, and released as soon as REG_CMDB_SPACE
+    reads back empty, so no other client can write between two halves of a
+    command. Before the release, REG_CMD_READ is read once and kept: result()
+    reads it back after finish(), when other clients may have written commands
+    since. Longer sequences, such as a whole frame, can be locked with
+    transaction():
+
+        with host.transaction():
+            eve.Clear()
+            ...
+            eve.swap()
+            eve.finish()
+
+    The ILI9488 writes only match what BrtEveTelemetrix does today: it never
+    drives the D/CX pin, so write_ili9488_cmd() and write_ili9488_data() both
+    go as a plain OP_WRITE, and the broker cannot tell commands from data.
+    Driving D/CX would need a flag for it in the request header.
+
+    :param socket_path: Path of the broker's Unix socket
+    :param name: Name of this client in the broker statistics
+    """
+
+    # Same transfers as BrtEveTelemetrix, see there
+    max_transfer_size = BrtEveTelemetrix.max_transfer_size
+    max_read_size = BrtEveTelemetrix.max_read_size
+    transfer_alignment = BrtEveTelemetrix.transfer_alignment
+
+    def __init__(self, socket_path=BROKER_SOCKET, name=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.lock_depth = 0
+        # Commands were written since REG_CMDB_SPACE last read back empty
+        self.stream = False
+        # Reply of the REG_CMD_READ read at the end of the last command stream
+        self.cmd_read = None
+        if name is None:
+            name = "%s-%d" % (os.path.basename(sys.argv[0]) or "python", os.getpid())
+        self._send(OP_HELLO, name.encode())
+
+    def _send(self, op, payload=b"", bytes_to_read=0, flags=0):
+        self.sock.sendall(_HEADER.pack(op, flags, bytes_to_read, len(payload)) + payload)
+
+    def _reply(self):
+        """ Wait for the reply of a request
+        :raise RuntimeError: if the request, or an earlier one not replied, failed
+        """
+        _, status, _, length = _HEADER.unpack(_recv_exactly(self.sock, _HEADER.size))
+        data = _recv_exactly(self.sock, length)
+        if status != STATUS_OK:
+            raise RuntimeError("Telemetrix broker: " + data.decode())
+        return data
+
+    def transfer(self, write_data, bytes_to_read = 0):
+        """ Transfer data via SPI"""
+        write_data = bytes(write_data)
+        address = int.from_bytes(write_data[:3], "big")
+        flags = 0
+        if address == 0x800000 | _REG_CMDB_WRITE:
+            if not self.stream and not self.lock_depth:
+                flags = FLAG_LOCK
+            self.stream = True
+            self.cmd_read = None
+        elif (address == _REG_CMD_READ and not self.stream and self.cmd_read is not None
+              and bytes_to_read <= len(self.cmd_read)):
+            return self.cmd_read[:bytes_to_read]
+
+        self._send(OP_TRANSFER, write_data, bytes_to_read, flags)
+        if bytes_to_read == 0:
+            return None
+        data = self._reply()
+
+        if self.stream and address == _REG_CMDB_SPACE and bytes_to_read >= 3:
+            space = struct.unpack("<H", data[1:3])[0] & 0xfff
+            if space == _FIFO_MAX:
+                self._end_stream()
+        return data
+
+    def _end_stream(self):
+        """ The command FIFO is empty: keep REG_CMD_READ, then release the link"""
+        self._send(OP_TRANSFER, _REG_CMD_READ.to_bytes(3, "big"), 5)
+        self.cmd_read = self._reply()
+        self.stream = False
+        if not self.lock_depth:
+            self._send(OP_UNLOCK)
+
+    def lock(self):
+        """ Get exclusive use of the link, until unlock()"""
+        if not self.lock_depth and not self.stream:
+            self._send(OP_LOCK)
+            self._reply()
+        self.lock_depth += 1
+
+    def unlock(self):
+        """ Release the link, unless a command stream is still pending"""
+        self.lock_depth -= 1
+        if not self.lock_depth and not self.stream:
+            self._send(OP_UNLOCK)
+
+    def transaction(self):
+        """ Context manager locking the link"""
+        client = self
+
+        class _Transaction:
+            def __enter__(self):
+                client.lock()
+                return client
+
+            def __exit__(self, *exc):
+                client.unlock()
+
+        return _Transaction()
+
+    def stats(self):
+        """ Statistics of every client of the broker
+        :return: List of dictionaries
+        """
+        self._send(OP_STATS)
+        return json.loads(self._reply())
+
+    def close(self):
+        """ Disconnect from the broker"""
+        self.sock.close()
+
+    def write_ili9488(self,cmd,data):
+        """ Write command and data to ili9488 LCD"""
+        self.write_ili9488_cmd(cmd)
+        self.write_ili9488_data(data)
+
+    def write_ili9488_cmd(self, cmd):
+        """ Write command to ili9488 LCD, without driving D/CX, as BrtEveTelemetrix"""
+        self._send(OP_WRITE, bytes(cmd))
+
+    def write_ili9488_data(self, data):
+        """ Write data to ili9488 LCD"""
+        self._send(OP_WRITE, bytes(data))
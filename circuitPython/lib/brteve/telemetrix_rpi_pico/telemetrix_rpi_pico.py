@@ -15,6 +15,7 @@
  Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 """
+import json
 import sys
 import threading
 import time
@@ -29,10 +30,13 @@ from serial.tools import list_ports
 
 # noinspection PyUnresolvedReferences
 from private_constants import PrivateConstants
+# noinspection PyUnresolvedReferences
+from telemetrix_rpi_pico_common import PICO_USB_VID, PICO_USB_PID, TelemetrixCommonMixin, \
+    encode_command, pico_pin_modes
 
 
 # noinspection PyPep8,PyMethodMayBeStatic,GrazieInspection
-class TelemetrixRpiPico(threading.Thread):
+class TelemetrixRpiPico(TelemetrixCommonMixin, threading.Thread):
     """
     This class exposes and implements a Telemetrix type
     API for the Raspberry Pi Pico.
@@ -45,7 +49,9 @@ class TelemetrixRpiPico(threading.Thread):
     def __init__(self, com_port=None, pico_instance_id=None,
                  sleep_tune=0.000001,
                  shutdown_on_exception=True,
-                 reset_on_shutdown=True):
+                 reset_on_shutdown=True,
+                 session_cache=None,
+                 reply_timeout=1.0):
 
         """
 
@@ -64,6 +70,13 @@ class TelemetrixRpiPico(threading.Thread):
                                       receiving a KeyboardInterrupt exception
 
         :para reset_on_shutdown: Reset the board upon shutdown
+
+        :param session_cache: Optional file to remember the com port and pico ID
+                              of the last successful connection. When com_port
+                              is not specified, the cached port is tried first
+                              and only accepted if it reports the cached ID.
+
+        :param reply_timeout: Seconds to wait for a handshake reply
         """
 
         # initialize threading parent
@@ -96,6 +109,12 @@ class TelemetrixRpiPico(threading.Thread):
         self.sleep_tune = sleep_tune
         self.shutdown_on_exception = shutdown_on_exception
         self.reset_on_shutdown = reset_on_shutdown
+        self.session_cache = session_cache
+        self.reply_timeout = reply_timeout
+
+        # set by the report handlers when the handshake replies arrive
+        self.pico_id_event = threading.Event()
+        self.firmware_event = threading.Event()
 
         # create a deque to receive and process data from the pico
         self.the_deque = deque()
@@ -104,21 +123,14 @@ class TelemetrixRpiPico(threading.Thread):
         # incoming report messages by looking up the report message
         # and executing its associated processing method.
 
-        self.report_dispatch = {}
+        # The reports shared with TelemetrixRpiPicoAio come from report_table().
+        self.report_dispatch = self.report_table()
 
         # To add a command to the command dispatch table, append here.
-        self.report_dispatch.update(
-            {PrivateConstants.LOOP_COMMAND: self._report_loop_data})
-        self.report_dispatch.update(
-            {PrivateConstants.DEBUG_PRINT: self._report_debug_data})
         self.report_dispatch.update(
             {PrivateConstants.DIGITAL_REPORT: self._digital_message})
         self.report_dispatch.update(
             {PrivateConstants.ANALOG_REPORT: self._analog_message})
-        self.report_dispatch.update(
-            {PrivateConstants.FIRMWARE_REPORT: self._firmware_message})
-        self.report_dispatch.update(
-            {PrivateConstants.UNIQUE_ID_REPORT: self._report_unique_id})
         self.report_dispatch.update(
             {PrivateConstants.SERVO_UNAVAILABLE: self._servo_unavailable})
         self.report_dispatch.update(
@@ -130,7 +142,6 @@ class TelemetrixRpiPico(threading.Thread):
         self.report_dispatch.update(
             {PrivateConstants.SONAR_DISTANCE: self._sonar_distance_report})
         self.report_dispatch.update({PrivateConstants.DHT_REPORT: self._dht_report})
-        self.report_dispatch.update({PrivateConstants.SPI_REPORT: self._spi_report})
 
         # up to 16 pwm pins may be simultaneously active
         self.pwm_active_count = 0
@@ -191,12 +202,7 @@ class TelemetrixRpiPico(threading.Thread):
         # This dictionary is a list of gpio pins updated with the pin mode when a pin mode
         # is set.
         # It is created initially using a dictionary comprehension.
-        self.pico_pins = {gpio_pin: PrivateConstants.AT_MODE_NOT_SET for gpio_pin in
-                          range(23)}
-
-        # skip over unavailable pins
-        for pin in range(25, 29):
-            self.pico_pins[pin] = PrivateConstants.AT_MODE_NOT_SET
+        self.pico_pins = pico_pin_modes()
 
         # creating a list of available sda and scl pins for i2c. If assigned the pins
         # value will be set to either 0 or 1 depending upon the i2c selected.
@@ -230,7 +236,8 @@ class TelemetrixRpiPico(threading.Thread):
         if not self.com_port:
             # user did not specify a com_port
             try:
-                self._find_pico()
+                if not self._open_cached_session():
+                    self._find_pico()
             except KeyboardInterrupt:
                 if self.shutdown_on_exception:
                     self.shutdown()
@@ -290,38 +297,124 @@ class TelemetrixRpiPico(threading.Thread):
         command = [PrivateConstants.RESET_DATA]
         self._send_command(command)
 
+        self._save_session()
+
     def _find_pico(self):
         """
         This method will search all potential serial ports for a pico
         board using its USB PID and VID.
+
+        All candidate ports are probed concurrently: each one is asked for
+        its unique ID and the first port answering with a valid (and, if
+        pico_instance_id is set, matching) ID is kept.
         """
+        candidates = [port.device for port in list_ports.comports()
+                      if port.pid == PICO_USB_PID and port.vid == PICO_USB_VID]
+        if not candidates:
+            return
 
-        # a list of serial ports to be checked
-        serial_ports = []
+        print('Probing potential serial ports...')
+        found = threading.Event()
+        lock = threading.Lock()
 
-        print('Opening all potential serial ports...')
-        the_ports_list = list_ports.comports()
-        for port in the_ports_list:
-            if port.pid is None:
-                continue
-            if port.pid != 10 or port.vid != 11914:
-                continue
-            try:
-                self.serial_port = serial.Serial(port.device, 115200,
-                                                 timeout=1, writeTimeout=0)
-            except SerialException:
-                continue
-            # create a list of serial ports that we opened
-            # make sure this is a pico board
-            if port.pid == 10 and port.vid == 11914:
-                serial_ports.append(self.serial_port)
+        def probe(device):
+            port = self._probe_port(device, self.pico_instance_id, found)
+            if port is None:
+                return
+            with lock:
+                if self.serial_port is None:
+                    print('\t' + device)
+                    self.serial_port = port
+                    found.set()
+                    return
+            port.close()
 
-                # display to the user
-                print('\t' + port.device)
+        probes = [threading.Thread(target=probe, args=(device,), daemon=True)
+                  for device in candidates]
+        for thread in probes:
+            thread.start()
+        for thread in probes:
+            thread.join(self.reply_timeout + 1)
+
+    def _probe_port(self, device, pico_id=None, found=None):
+        """
+        Open a serial port and check that a Telemetrix4RpiPico server
+        answers with a valid unique ID.
 
-                # clear out the serial buffers
-                self.serial_port.reset_input_buffer()
-                self.serial_port.reset_output_buffer()
+        :param device: serial port name
+
+        :param pico_id: if set, the reported ID must match it
+
+        :param found: optional event, stop waiting once it is set
+
+        :return: the open serial.Serial on success, otherwise None
+        """
+        try:
+            port = serial.Serial(device, 115200, timeout=0.05, writeTimeout=0)
+        except SerialException:
+            return None
+
+        try:
+            port.reset_input_buffer()
+            port.write(encode_command([PrivateConstants.RETRIEVE_PICO_UNIQUE_ID]))
+            deadline = time.monotonic() + self.reply_timeout
+            rx_buffer = bytearray()
+            while time.monotonic() < deadline and not (found and found.is_set()):
+                rx_buffer += port.read(max(1, port.in_waiting))
+                # skip stale reports, until the unique ID report comes in
+                while rx_buffer and len(rx_buffer) > rx_buffer[0]:
+                    packet_length = rx_buffer[0]
+                    report = list(rx_buffer[1:packet_length + 1])
+                    del rx_buffer[:packet_length + 1]
+                    if not report or report[0] != PrivateConstants.UNIQUE_ID_REPORT:
+                        continue
+                    if pico_id and report[1:] != pico_id:
+                        port.close()
+                        return None
+                    port.reset_input_buffer()
+                    port.timeout = 1
+                    return port
+        except (SerialException, OSError):
+            pass
+        port.close()
+        return None
+
+    def _open_cached_session(self):
+        """
+        Try the com port of the previous session, when a session cache
+        is configured. The cached pico ID is pinned, so a different board
+        plugged into the same port is rejected.
+
+        :return: True if the cached port was opened
+        """
+        if not self.session_cache:
+            return False
+        try:
+            with open(self.session_cache, 'r', encoding='utf-8') as cache:
+                session = json.load(cache)
+        except (OSError, ValueError):
+            return False
+
+        port = self._probe_port(session.get('com_port', ''),
+                                self.pico_instance_id or session.get('pico_id'))
+        if port is None:
+            return False
+        print(f'Reusing cached session on {port.port}')
+        self.serial_port = port
+        return True
+
+    def _save_session(self):
+        """
+        Remember the com port and pico ID for the next connection
+        """
+        if not self.session_cache or not self.serial_port:
+            return
+        try:
+            with open(self.session_cache, 'w', encoding='utf-8') as cache:
+                json.dump({'com_port': self.serial_port.port,
+                           'pico_id': self.reported_pico_id}, cache)
+        except OSError:
+            pass
 
     def _manual_open(self):
         """
@@ -333,29 +426,6 @@ class TelemetrixRpiPico(threading.Thread):
             print(f'Opening {self.com_port}...')
             self.serial_port = serial.Serial(self.com_port, 115200,
                                              timeout=1, writeTimeout=0)
-
-            self._run_threads()
-            # time.sleep(self.pico_wait)
-
-            self._get_pico_id()
-            if self.pico_instance_id:
-                if self.reported_pico_id != self.pico_instance_id:
-                    if self.shutdown_on_exception:
-                        self.shutdown()
-                    raise RuntimeError(f'Incorrect pico ID: {self.reported_pico_id}')
-            print('Valid pico ID Found.')
-            # get pico firmware version and print it
-            print('\nRetrieving Telemetrix4pico firmware ID...')
-            self._get_firmware_version()
-
-            if not self.firmware_version:
-                if self.shutdown_on_exception:
-                    self.shutdown()
-                raise RuntimeError(f'Telemetrix4pico Sketch Firmware Version Not Found')
-
-            else:
-                print(f'Telemetrix4pico firmware version: {self.firmware_version[0]}.'
-                      f'{self.firmware_version[1]}')
         except KeyboardInterrupt:
             if self.shutdown_on_exception:
                 self.shutdown()
@@ -472,10 +542,12 @@ class TelemetrixRpiPico(threading.Thread):
         Retrieve pico-telemetrix pico id
 
         """
+        self.reported_pico_id = []
+        self.pico_id_event.clear()
         command = [PrivateConstants.RETRIEVE_PICO_UNIQUE_ID]
         self._send_command(command)
-        # provide time for the reply
-        time.sleep(.5)
+        # wait for the reply
+        self.pico_id_event.wait(self.reply_timeout)
 
     def _get_firmware_version(self):
         """
@@ -483,10 +555,11 @@ class TelemetrixRpiPico(threading.Thread):
         pico-telemetrix firmware version
 
         """
+        self.firmware_event.clear()
         command = [PrivateConstants.GET_FIRMWARE_VERSION]
         self._send_command(command)
-        # provide time for the reply
-        time.sleep(.5)
+        # wait for the reply
+        self.firmware_event.wait(self.reply_timeout)
 
     # TBD
     def i2c_read(self, address, register, number_of_bytes,
@@ -1046,33 +1119,7 @@ class TelemetrixRpiPico(threading.Thread):
                     self.shutdown()
                 raise RuntimeError(f'SPI Chip select pin {pin} is already in use!')
 
-        # test for spi port 0
-        if not spi_port:
-            self.spi_0_active = True
-        # port 1
-        else:
-            self.spi_1_active = True
-
-        # freq_msb = clk_frequency >> 8
-        # freq_lsb = clk_frequency & 0x00ff
-        freq_bytes = clk_frequency.to_bytes(4, byteorder='big')
-
-        self.pico_pins[mosi] = PrivateConstants.AT_SPI
-        self.pico_pins[miso] = PrivateConstants.AT_SPI
-        self.pico_pins[clock_pin] = PrivateConstants.AT_SPI
-
-        command = [PrivateConstants.SPI_INIT, spi_port, mosi, miso, clock_pin]
-
-        for i in range(len(freq_bytes)):
-            command.append(freq_bytes[i])
-
-        command.append(len(chip_select_list))
-
-        for pin in chip_select_list:
-            command.append(pin)
-            self.pico_pins[pin] = PrivateConstants.AT_SPI
-
-        self._send_command(command)
+        self._spi_init(spi_port, mosi, miso, clock_pin, clk_frequency, chip_select_list)
 
     def servo_write(self, pin_number, value):
         """
@@ -1414,13 +1461,16 @@ class TelemetrixRpiPico(threading.Thread):
         # try:
         command = [PrivateConstants.STOP_ALL_REPORTS]
         self._send_command(command)
-        time.sleep(.2)
         if self.reset_on_shutdown:
             command = [PrivateConstants.RESET_BOARD]
             self._send_command(command)
-            time.sleep(.2)
-        
+
         if self.serial_port != None:
+            # wait until the commands above are on the wire
+            try:
+                self.serial_port.flush()
+            except (SerialException, OSError):
+                pass
             self.serial_port.close()
         self.serial_port = None
 
@@ -1493,6 +1543,7 @@ class TelemetrixRpiPico(threading.Thread):
         """
 
         self.firmware_version = [data[0], data[1]]
+        self.firmware_event.set()
 
     def _i2c_read_report(self, data):
         """
@@ -1545,25 +1596,7 @@ class TelemetrixRpiPico(threading.Thread):
 
         for i in range(len(data)):
             self.reported_pico_id.append(data[i])
-
-    def _report_debug_data(self, data):
-        """
-        Print debug data sent from pico
-        :param data: data[0] is a byte followed by 2
-                     bytes that comprise an integer
-        :return:
-        """
-        value = (data[1] << 8) + data[2]
-        print(f'DEBUG ID: {data[0]} Value: {value}')
-
-    def _report_loop_data(self, data):
-        """
-        Print data that was looped back
-        :param data: byte of loop back data
-        :return:
-        """
-        if self.loop_back_callback:
-            self.loop_back_callback(data)
+        self.pico_id_event.set()
 
     def _send_command(self, command):
         """
@@ -1573,13 +1606,7 @@ class TelemetrixRpiPico(threading.Thread):
         :param command:  command data in the form of a list
 
         """
-        # the length of the list is added at the head
-        len_msb, len_lsb = struct.pack('<H', len(command))
-        command.insert(0, 0xee) # start byte
-        command.insert(1, len_msb)
-        command.insert(2, len_lsb)
-        # print(command)
-        send_message = bytes(command)
+        send_message = encode_command(command)
 
         if self.serial_port:
             try:
@@ -0,0 +1,497 @@
+"""
+ Copyright (c) 2021 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import asyncio
+import struct
+import sys
+import time
+from collections import deque
+
+# noinspection PyPackageRequirements
+import serial_asyncio
+# noinspection PyPackageRequirements
+from serial.tools import list_ports
+
+# noinspection PyUnresolvedReferences
+from private_constants import PrivateConstants
+# noinspection PyUnresolvedReferences
+from telemetrix_rpi_pico_common import PICO_USB_VID, PICO_USB_PID, SPI_QUALIFIED_PINS, \
+    TelemetrixCommonMixin, encode_command, pico_pin_modes
+
+
+class _TelemetrixProtocol(asyncio.Protocol):
+    """
+    asyncio serial protocol for the Telemetrix4RpiPico server.
+
+    Incoming bytes are framed as [packet length, report type, data...]
+    and every complete report is dispatched as soon as it arrives,
+    from within the event loop.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = None
+        self.rx_buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        rx_buffer = self.rx_buffer
+        rx_buffer += data
+        while rx_buffer:
+            packet_length = rx_buffer[0]
+            if not packet_length:
+                self.client.protocol_error(
+                    'A report with a packet length of zero was received.')
+                return
+            if len(rx_buffer) < packet_length + 1:
+                return
+            report_type = rx_buffer[1]
+            report = list(rx_buffer[2:packet_length + 1])
+            del rx_buffer[:packet_length + 1]
+            self.client.dispatch(report_type, report)
+
+    def connection_lost(self, exc):
+        self.client.connection_lost(exc)
+
+
+# noinspection PyPep8,PyMethodMayBeStatic
+class TelemetrixRpiPicoAio(TelemetrixCommonMixin):
+    """
+    This class exposes an asyncio implementation of the Telemetrix
+    API for the Raspberry Pi Pico.
+
+    There are no worker threads: received reports are dispatched inline
+    by the serial protocol, and the blocking SPI requests return
+    awaitables that complete when the matching report arrives.
+
+    It covers the part of the API used by the EVE host adapters:
+    board discovery, ID and firmware checks, digital output, loop back
+    and the SPI commands.
+    """
+
+    def __init__(self, com_port=None, pico_instance_id=None,
+                 shutdown_on_exception=True,
+                 reset_on_shutdown=True,
+                 loop=None):
+        """
+
+        :param com_port: e.g. COM3 or /dev/ttyACM0.
+                         Only use if you wish to bypass auto com port
+                         detection.
+
+        :param pico_instance_id: If not specified, than don't do id check.
+                                 Else contains a board' s pico unique ID.
+                                 This is passed as an array.
+
+        :param shutdown_on_exception: call shutdown before raising
+                                      a RunTimeError exception
+
+        :param reset_on_shutdown: Reset the board upon shutdown
+
+        :param loop: event loop to use, the running loop if not specified
+        """
+
+        # check to make sure that Python interpreter is version 3.7 or greater
+        if sys.version_info < (3, 7):
+            raise RuntimeError("ERROR: Python 3.7 or greater is "
+                               "required for use of this program.")
+
+        self.com_port = com_port
+        self.pico_instance_id = pico_instance_id
+        self.shutdown_on_exception = shutdown_on_exception
+        self.reset_on_shutdown = reset_on_shutdown
+        self.loop = loop
+
+        self.transport = None
+        self.protocol = None
+
+        # The report_dispatch dictionary is used to process
+        # incoming report messages by looking up the report message
+        # and executing its associated processing method.
+        self.report_dispatch = self.report_table()
+        self.report_dispatch.update({
+            PrivateConstants.DIGITAL_REPORT: self._ignore_report,
+            PrivateConstants.ANALOG_REPORT: self._ignore_report,
+        })
+
+        # futures waiting for the replies, completed in arrival order
+        self.pending_id = None
+        self.pending_firmware = None
+        self.pending_spi = (deque(), deque())
+
+        self.spi_callback = None
+        self.spi_callback2 = None
+
+        self.spi_0_active = False
+        self.spi_1_active = False
+
+        # debug loopback callback method
+        self.loop_back_callback = None
+
+        # flag to indicate we are in shutdown mode
+        self.shutdown_flag = False
+
+        self.firmware_version = []
+        self.reported_pico_id = []
+
+        self.pico_pins = pico_pin_modes()
+
+    async def start(self, timeout=1.0):
+        """
+        Open the serial link, validate the board and reset the
+        server data structures.
+
+        :param timeout: seconds to wait for each handshake reply
+        """
+        if not self.loop:
+            self.loop = asyncio.get_running_loop()
+
+        print(f"TelemetrixRpiPicoAio:  Version {PrivateConstants.TELEMETRIX_VERSION}\n\n"
+              f"Copyright (c) 2020-2021 Alan Yorinks All Rights Reserved.\n")
+
+        if not self.com_port:
+            self.com_port = self._find_pico()
+        if not self.com_port:
+            raise RuntimeError('No pico Found or User Aborted Program')
+
+        print(f'Opening {self.com_port}...')
+        self.transport, self.protocol = await serial_asyncio.create_serial_connection(
+            self.loop, lambda: _TelemetrixProtocol(self), self.com_port, 115200)
+        self.transport.serial.reset_input_buffer()
+
+        print('Retrieving pico ID...')
+        await self._get_pico_id(timeout)
+        print(f'Pico Unique ID: {self.reported_pico_id}')
+
+        if self.pico_instance_id:
+            if self.reported_pico_id != self.pico_instance_id:
+                await self._fail(f'Incorrect pico ID: {self.reported_pico_id}')
+            print('Valid pico ID Found.')
+
+        print('\nRetrieving Telemetrix4pico firmware ID...')
+        await self._get_firmware_version(timeout)
+        if not self.firmware_version:
+            await self._fail('Telemetrix4pico firmware version')
+        print(f'Telemetrix4pico firmware version: {self.firmware_version[0]}.'
+              f'{self.firmware_version[1]}')
+
+        self._send_command([PrivateConstants.ENABLE_ALL_REPORTS])
+
+        # Have the server reset its data structures
+        self._send_command([PrivateConstants.RESET_DATA])
+
+    def _find_pico(self):
+        """
+        Return the first serial port with the pico USB PID and VID
+        """
+        for port in list_ports.comports():
+            if port.pid == PICO_USB_PID and port.vid == PICO_USB_VID:
+                return port.device
+        return None
+
+    async def _get_pico_id(self, timeout):
+        """
+        Retrieve pico-telemetrix pico id, waiting for the reply
+        """
+        self.reported_pico_id = []
+        self.pending_id = self.loop.create_future()
+        self._send_command([PrivateConstants.RETRIEVE_PICO_UNIQUE_ID])
+        try:
+            await asyncio.wait_for(self.pending_id, timeout)
+        except asyncio.TimeoutError:
+            await self._fail('No reply to pico ID request')
+
+    async def _get_firmware_version(self, timeout):
+        """
+        Retrieve the pico-telemetrix firmware version, waiting for the reply
+        """
+        self.pending_firmware = self.loop.create_future()
+        self._send_command([PrivateConstants.GET_FIRMWARE_VERSION])
+        try:
+            await asyncio.wait_for(self.pending_firmware, timeout)
+        except asyncio.TimeoutError:
+            self.firmware_version = []
+
+    async def _fail(self, message):
+        """
+        Shutdown if required, then raise a RuntimeError
+        """
+        if self.shutdown_on_exception:
+            await self.shutdown()
+        raise RuntimeError(message)
+
+    def digital_write(self, pin, value):
+        """
+        Set the specified pin to the specified value.
+
+        :param pin: pico GPIO pin number
+
+        :param value: pin value (1 or 0)
+        """
+        self._send_command([PrivateConstants.DIGITAL_WRITE, pin, value])
+
+    def set_pin_mode_digital_output(self, pin_number):
+        """
+        Set a pin as a digital output pin.
+
+        :param pin_number: pico GPIO pin number
+        """
+        self._send_command([PrivateConstants.SET_PIN_MODE, pin_number,
+                            PrivateConstants.AT_OUTPUT, 0])
+        self.pico_pins[pin_number] = PrivateConstants.AT_OUTPUT
+
+    def loop_back(self, start_character, callback=None):
+        """
+        This is a debugging method to send a character to the
+        pico device, and have the device loop it back.
+
+        :param start_character: The character to loop back. It should be
+                                an integer.
+
+        :param callback: Looped back character will appear in the callback method
+        """
+        self.loop_back_callback = callback
+        self._send_command([PrivateConstants.LOOP_COMMAND, ord(start_character)])
+
+    async def set_pin_mode_spi(self, spi_port=0, miso=16, mosi=19, clock_pin=18, # pylint: disable=too-many-arguments
+                               clk_frequency=500000, chip_select_list=None,
+                               qualify_pins=True):
+        """
+        Specify the SPI port, SPI pins, clock frequency and a list of
+        chip select pins. The SPI port is configured as a "master".
+
+        See TelemetrixRpiPico.set_pin_mode_spi for the parameters.
+        """
+        if spi_port not in [0, 1]:
+            await self._fail('spi port must be either a 0 or 1')
+
+        if qualify_pins:
+            expected = SPI_QUALIFIED_PINS[spi_port]
+            if (miso, mosi, clock_pin) != expected:
+                await self._fail(f'For spi{spi_port} miso, mosi and clock must be'
+                                 f' {expected[0]}, {expected[1]} and {expected[2]}.')
+
+        for pin in (mosi, miso, clock_pin):
+            if self.pico_pins[pin] != PrivateConstants.AT_MODE_NOT_SET:
+                await self._fail(f'SPI pin {pin} currently in use')
+
+        if not isinstance(chip_select_list, list) or not chip_select_list:
+            await self._fail('Chip select pins were not specified')
+        for pin in chip_select_list:
+            if self.pico_pins[pin] != PrivateConstants.AT_MODE_NOT_SET:
+                await self._fail(f'SPI Chip select pin {pin} is already in use!')
+
+        self._spi_init(spi_port, mosi, miso, clock_pin, clk_frequency, chip_select_list)
+
+    def spi_cs_control(self, chip_select_pin, select):
+        """
+        Control an SPI chip select line. There is no reply, so this
+        only queues the command on the serial link.
+
+        :param chip_select_pin: pin connected to CS
+
+        :param select: 0=select, 1=deselect
+        """
+        if self.pico_pins[chip_select_pin] != PrivateConstants.AT_SPI:
+            raise RuntimeError(f'spi_cs_control: Invalid chip select pin'
+                               f' {chip_select_pin}.')
+        self._send_command([PrivateConstants.SPI_CS_CONTROL, chip_select_pin, select])
+
+    def spi_read_blocking(self, number_of_bytes, spi_port=0, call_back=None,
+                          repeated_tx_data=0):
+        """
+        Read the specified number of bytes from the specified SPI port.
+
+        :param number_of_bytes: Number of bytes to read
+
+        :param spi_port: SPI port 0 or 1
+
+        :param call_back: Optional callback, called with
+                          [SPI_READ_REPORT, spi_port, count of data bytes, data bytes,
+                          time-stamp]
+
+        :param repeated_tx_data: repeated data to send
+
+        :return: a future completed with the bytes read
+        """
+        self._check_spi_port(spi_port, 'spi_read_blocking')
+        self._set_spi_callback(spi_port, call_back)
+
+        len_msb, len_lsb = struct.pack('<H', number_of_bytes)
+        future = self.loop.create_future()
+        self.pending_spi[spi_port].append(future)
+        self._send_command([PrivateConstants.SPI_READ_BLOCKING, spi_port, len_msb, len_lsb,
+                            repeated_tx_data])
+        return future
+
+    def spi_write_blocking(self, bytes_to_write, spi_port=0, call_back=None):
+        """
+        Write a list of bytes to the SPI device.
+
+        :param bytes_to_write: bytes or a list of bytes to write
+
+        :param spi_port: SPI port 0 or 1
+
+        :param call_back: Optional callback, called with the acknowledge report
+
+        :return: a future completed when the server acknowledges the write
+        """
+        self._check_spi_port(spi_port, 'spi_write_blocking')
+        self._set_spi_callback(spi_port, call_back)
+
+        len_msb, len_lsb = struct.pack('<H', len(bytes_to_write))
+        future = self.loop.create_future()
+        self.pending_spi[spi_port].append(future)
+        command = [PrivateConstants.SPI_WRITE_BLOCKING, spi_port, len_msb, len_lsb]
+        command.extend(bytes_to_write)
+        self._send_command(command)
+        return future
+
+    def _check_spi_port(self, spi_port, caller):
+        """
+        Raise RuntimeError if the SPI port was never configured
+        """
+        active = self.spi_1_active if spi_port else self.spi_0_active
+        if not active:
+            raise RuntimeError(
+                f'{caller}: set_pin_mode_spi never called for spi port {spi_port}.')
+
+    def _set_spi_callback(self, spi_port, call_back):
+        """
+        Remember the optional user callback for a SPI port
+        """
+        if spi_port == 0:
+            self.spi_callback = call_back
+        else:
+            self.spi_callback2 = call_back
+
+    async def shutdown(self):
+        """
+        This method attempts an orderly shutdown
+        If any exceptions are thrown, they are ignored.
+        """
+        self.shutdown_flag = True
+        if not self.transport:
+            return
+
+        self._send_command([PrivateConstants.STOP_ALL_REPORTS])
+        if self.reset_on_shutdown:
+            self._send_command([PrivateConstants.RESET_BOARD])
+
+        # let the transport drain its write buffer before closing
+        while self.transport.get_write_buffer_size():
+            await asyncio.sleep(0.001)
+        self.transport.close()
+        self.transport = None
+
+        for queue in self.pending_spi:
+            while queue:
+                queue.popleft().cancel()
+
+    def _send_command(self, command):
+        """
+        This is a private utility method.
+
+        :param command:  command data in the form of a list
+
+        """
+        if self.transport is None:
+            return
+        self.transport.write(encode_command(command))
+
+    # report message handlers, called by _TelemetrixProtocol
+
+    def dispatch(self, report_type, report):
+        """
+        Look up and run the handler of a report
+
+        :param report_type: report identifier
+
+        :param report: report data, without length and type
+        """
+        dispatch_entry = self.report_dispatch.get(report_type)
+        if dispatch_entry:
+            dispatch_entry(report)
+
+    def protocol_error(self, message):
+        """
+        Fail every waiter on an unrecoverable framing error
+        """
+        error = RuntimeError(message)
+        for queue in self.pending_spi:
+            while queue:
+                queue.popleft().set_exception(error)
+        if self.transport:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        """
+        Serial link closed, cancel everything that is still waiting
+        """
+        self.transport = None
+        for queue in self.pending_spi:
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    if exc:
+                        future.set_exception(exc)
+                    else:
+                        future.cancel()
+
+    def _ignore_report(self, data):
+        """
+        Reports for pin modes this implementation does not expose
+        """
+
+    def _firmware_message(self, data):
+        """
+        Telemetrix4pico firmware version message
+        :param data: data[0] = major number, data[1] = minor number
+        """
+        self.firmware_version = [data[0], data[1]]
+        if self.pending_firmware and not self.pending_firmware.done():
+            self.pending_firmware.set_result(self.firmware_version)
+
+    def _report_unique_id(self, data):
+        """
+        Reply to are_u_there message
+        :param data: pico id
+        """
+        self.reported_pico_id = list(data)
+        if self.pending_id and not self.pending_id.done():
+            self.pending_id.set_result(self.reported_pico_id)
+
+    def _spi_report(self, report):
+        """
+        Complete the oldest SPI request of the reporting port.
+
+        :param report: [spi_port, number of bytes read, data]
+        """
+        spi_port = report[0]
+        number_of_bytes = report[1]
+
+        call_back = self.spi_callback2 if spi_port else self.spi_callback
+        if call_back:
+            call_back([PrivateConstants.SPI_REPORT] + report + [time.time()])
+
+        queue = self.pending_spi[1 if spi_port else 0]
+        if queue:
+            future = queue.popleft()
+            if not future.done():
+                future.set_result(bytes(report[2:number_of_bytes + 2]))
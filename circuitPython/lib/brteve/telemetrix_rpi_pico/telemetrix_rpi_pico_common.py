@@ -0,0 +1,119 @@
+"""
+ Copyright (c) 2021 Alan Yorinks All rights reserved.
+
+ This program is free software; you can redistribute it and/or
+ modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+ Version 3 as published by the Free Software Foundation; either
+ or (at your option) any later version.
+ This library is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU AFFERO GENERAL PUBLIC LICENSE
+ along with this library; if not, write to the Free Software
+ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+ Command framing, pin tables and report handlers shared by
+ TelemetrixRpiPico and TelemetrixRpiPicoAio.
+"""
+import struct
+
+# noinspection PyUnresolvedReferences
+from private_constants import PrivateConstants
+
+PICO_USB_VID = 11914
+PICO_USB_PID = 10
+
+# SPI pins checked when qualify_pins is set: miso, mosi and clock of each port
+SPI_QUALIFIED_PINS = {0: (16, 19, 18), 1: (12, 15, 14)}
+
+
+def pico_pin_modes():
+    """
+    Pin mode of every pico GPIO, all unset. GPIOs 23 and 24 are not
+    available on the pico.
+
+    :return: dictionary of gpio pin: pin mode
+    """
+    pico_pins = {gpio_pin: PrivateConstants.AT_MODE_NOT_SET for gpio_pin in range(23)}
+    for pin in range(25, 29):
+        pico_pins[pin] = PrivateConstants.AT_MODE_NOT_SET
+    return pico_pins
+
+
+def encode_command(command):
+    """
+    Frame a command for the serial link: 0xee, then the length of the
+    command on 2 bytes, least significant first, then the command.
+
+    :param command:  command data in the form of a list
+    """
+    len_msb, len_lsb = struct.pack('<H', len(command))
+    return bytes([0xee, len_msb, len_lsb]) + bytes(command)
+
+
+class TelemetrixCommonMixin: # pylint: disable=too-few-public-methods
+    """
+    Report handlers and SPI setup common to both clients. The client sets
+    loop_back_callback, pico_pins, spi_0_active and spi_1_active, and
+    implements _send_command, _firmware_message, _report_unique_id and
+    _spi_report.
+    """
+
+    loop_back_callback = None
+
+    def report_table(self):
+        """
+        The report_dispatch entries of the reports both clients handle:
+        incoming report messages are processed by looking up the report
+        message and executing its associated processing method.
+
+        :return: dictionary of report type: handler
+        """
+        return {
+            PrivateConstants.LOOP_COMMAND: self._report_loop_data,
+            PrivateConstants.DEBUG_PRINT: self._report_debug_data,
+            PrivateConstants.FIRMWARE_REPORT: self._firmware_message,
+            PrivateConstants.UNIQUE_ID_REPORT: self._report_unique_id,
+            PrivateConstants.SPI_REPORT: self._spi_report,
+        }
+
+    def _report_debug_data(self, data):
+        """
+        Print debug data sent from pico
+        :param data: data[0] is a byte followed by 2
+                     bytes that comprise an integer
+        """
+        value = (data[1] << 8) + data[2]
+        print(f'DEBUG ID: {data[0]} Value: {value}')
+
+    def _report_loop_data(self, data):
+        """
+        Print data that was looped back
+        :param data: byte of loop back data
+        """
+        if self.loop_back_callback:
+            self.loop_back_callback(data)
+
+    def _spi_init(self, spi_port, mosi, miso, clock_pin, clk_frequency, chip_select_list): # pylint: disable=too-many-arguments
+        """
+        Mark the SPI port and its pins in use, then send the SPI_INIT
+        command. The pins are checked by the caller.
+
+        command message: [command, spi port, mosi, miso, clock, freq msb,
+                          freq 3, freq 2, freq 1, number of cs pins, cs pins...]
+        """
+        if not spi_port:
+            self.spi_0_active = True
+        else:
+            self.spi_1_active = True
+
+        for pin in [mosi, miso, clock_pin] + chip_select_list:
+            self.pico_pins[pin] = PrivateConstants.AT_SPI
+
+        command = [PrivateConstants.SPI_INIT, spi_port, mosi, miso, clock_pin]
+        command.extend(clk_frequency.to_bytes(4, byteorder='big'))
+        command.append(len(chip_select_list))
+        command.extend(chip_select_list)
+        self._send_command(command)
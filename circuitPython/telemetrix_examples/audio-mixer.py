@@ -0,0 +1,58 @@
+""" Mix music and sound effects on the Telemetrix host with EVE module MM817EV from BridgeTek
+    EVE has one playback channel: the host mixes the WAV files with NumPy, and the
+    playback ring holds 0.1 s, so an effect is heard at most 0.1 s after a tap.
+
+    py -3 audio-mixer.py music.wav effect.wav [serial port]
+"""
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../lib")))
+
+from lib.brteve.brt_eve_bt817_8 import BrtEve
+from lib.brteve.brt_eve_telemetrix import BrtEveTelemetrix
+from lib.brteve.brt_eve_audio_player import BrtEveAudioPlayer
+from lib.brteve.brt_eve_audio_mixer import BrtEveAudioMixer
+
+if len(sys.argv) < 3:
+    print(__doc__)
+    sys.exit(1)
+
+host = BrtEveTelemetrix(com_port=sys.argv[3] if len(sys.argv) > 3 else None)
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+
+FREQ = 22050
+mixer = BrtEveAudioMixer(FREQ, eve.ULAW_SAMPLES)
+effect = mixer.load(sys.argv[2])
+music = mixer.play(sys.argv[1], gain=0.6, loop=True)
+
+player = BrtEveAudioPlayer(eve, size=mixer.ring_size(0.1))
+player.play(mixer.chunks(), FREQ, eve.ULAW_SAMPLES)
+
+TAG_EFFECT = 1
+TAG_QUIT = 2
+pressed = 0
+while player.service():
+    eve.cmd_dlstart()
+    eve.ClearColorRGB(0, 0, 0)
+    eve.Clear()
+    eve.Tag(TAG_EFFECT)
+    eve.cmd_button(eve.lcd_width // 2 - 200, eve.lcd_height // 2 - 60, 400, 120, 31, 0, "Effect")
+    eve.Tag(TAG_QUIT)
+    eve.cmd_button(eve.lcd_width - 220, eve.lcd_height - 100, 200, 80, 30, 0, "Quit")
+    eve.cmd_text(20, 20, 30, 0, "%d sound(s), %d samples clipped" %
+        (len(mixer.voices), mixer.clipped))
+    eve.Display()
+    eve.cmd_swap()
+    eve.flush()
+
+    tag = eve.rd8(eve.REG_TOUCH_TAG)
+    if tag == TAG_EFFECT and pressed != TAG_EFFECT:
+        mixer.play(effect)
+    elif tag == TAG_QUIT:
+        mixer.close()
+    pressed = tag
+    time.sleep(0.01)
+player.close()
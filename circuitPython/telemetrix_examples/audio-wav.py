@@ -0,0 +1,44 @@
+""" Play a WAV file on the Telemetrix host with EVE module MM817EV from BridgeTek
+    The WAV file is transcoded on the host to u-law at 22050 Hz while it plays, and the
+    result is cached: the next runs play the cached file, which can seek.
+
+    py -3 audio-wav.py song.wav [serial port]
+"""
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../lib")))
+
+from lib.brteve.brt_eve_bt817_8 import BrtEve
+from lib.brteve.brt_eve_telemetrix import BrtEveTelemetrix
+from lib.brteve.brt_eve_audio_player import BrtEveAudioPlayer
+from lib.brteve.brt_eve_audio_transcode import BrtEveAudioTranscoder
+
+if len(sys.argv) < 2:
+    print(__doc__)
+    sys.exit(1)
+
+host = BrtEveTelemetrix(com_port=sys.argv[2] if len(sys.argv) > 2 else None)
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+
+FREQ = 22050
+transcoder = BrtEveAudioTranscoder(FREQ, eve.ULAW_SAMPLES,
+    cache_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio-cache"))
+source = transcoder.source(sys.argv[1])
+print("Playing", source if isinstance(source, str) else "while transcoding")
+
+player = BrtEveAudioPlayer(eve)
+player.play(source, FREQ, eve.ULAW_SAMPLES)
+while player.service():
+    eve.cmd_dlstart()
+    eve.ClearColorRGB(0, 0, 0)
+    eve.Clear()
+    eve.cmd_text(eve.lcd_width // 2, eve.lcd_height // 2, 31, eve.OPT_CENTER,
+        "%.1f s" % player.time())
+    eve.Display()
+    eve.cmd_swap()
+    eve.flush()
+    time.sleep(0.02)
+player.close()
@@ -0,0 +1,59 @@
+""" Measure flash write throughput of the Telemetrix host with EVE module MM817EV from BridgeTek
+    The RAM_G staging of flash_write_pipelined is tried with 1 slot (upload, then program)
+    and with several slots (upload while programming), then flash_write_streamed feeds
+    cmd_flashwrite through the command FIFO, to a range erased beforehand.
+    Last, flash_read_pipelined reads the range back, with 1 and 2 slots.
+"""
+import time
+import os
+import sys
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../lib")))
+
+from lib.brteve.brt_eve_bt817_8 import BrtEve
+from lib.brteve.brt_eve_telemetrix import BrtEveTelemetrix
+
+# Optional serial port, such as the one of tools/telemetrix_emulator
+host = BrtEveTelemetrix(com_port=sys.argv[1] if len(sys.argv) > 1 else None)
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+
+FILE = os.path.join(tempfile.gettempdir(), "flash-benchmark.bin")
+TOTAL = 256 * 1024
+ADDRESS = 1024 * 1024
+
+def report(name, size, duration):
+    """ Print the throughput of one measure"""
+    print("%-24s %6d bytes in %.3f s: %.1f KB/s" % (name, size, duration, size / 1024 / duration))
+
+if eve.storage.flash_state(eve.FLASH_STATUS_FULL) != 0:
+    print("Cannot switch flash to fullmode")
+    sys.exit(1)
+
+for run, slots in enumerate((1, 2, 4)):
+    # New content each run, cmd_flashupdate skips sectors which already match
+    with open(FILE, "wb") as f:
+        f.write(bytes((i * 7 + run) & 0xff for i in range(256)) * (TOTAL // 256))
+
+    with open(FILE, "rb") as f:
+        start = time.monotonic()
+        eve.storage.flash_write_pipelined(f, 0, ADDRESS, TOTAL, slots=slots)
+        report("flash %d slot(s)" % slots, TOTAL, time.monotonic() - start)
+
+# cmd_flashupdate of erased bytes erases the range, out of the measure
+eve.cmd_memset(eve.RAM_G, 0xff, TOTAL)
+eve.cmd_flashupdate(ADDRESS, eve.RAM_G, TOTAL)
+eve.finish()
+with open(FILE, "rb") as f:
+    start = time.monotonic()
+    eve.storage.flash_write_streamed(f, 0, ADDRESS, TOTAL)
+    report("flash fifo", TOTAL, time.monotonic() - start)
+
+for slots in (1, 2):
+    with open(FILE, "wb") as f:
+        start = time.monotonic()
+        eve.storage.flash_read_pipelined(f, ADDRESS, TOTAL, slots=slots)
+        report("read %d slot(s)" % slots, TOTAL, time.monotonic() - start)
+
+os.remove(FILE)
@@ -0,0 +1,18 @@
+""" Share the Pico between several example processes
+
+Run this first, then start the examples with BrtEveTelemetrixClient as host:
+    py -3 telemetrix-broker.py [com port]
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../lib")))
+
+from lib.brteve.brt_eve_telemetrix_broker import TelemetrixBroker
+
+broker = TelemetrixBroker(com_port=sys.argv[1] if len(sys.argv) > 1 else None)
+print("Telemetrix broker on", broker.socket_path)
+try:
+    broker.serve_forever()
+except KeyboardInterrupt:
+    pass
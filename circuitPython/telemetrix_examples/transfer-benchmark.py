@@ -0,0 +1,46 @@
+""" Measure SPI transfer throughput of the Telemetrix host with EVE module MM817EV from BridgeTek"""
+import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../lib")))
+
+from lib.brteve.brt_eve_bt817_8 import BrtEve
+from lib.brteve.brt_eve_telemetrix import BrtEveTelemetrix
+
+# Optional serial port, such as the one of tools/telemetrix_emulator
+host = BrtEveTelemetrix(com_port=sys.argv[1] if len(sys.argv) > 1 else None)
+eve = BrtEve(host)
+eve.init(resolution="1280x800", touch="goodix")
+
+TOTAL = 64 * 1024
+
+def report(name, size, duration):
+    """ Print the throughput of one measure"""
+    print("%-24s %6d bytes in %.3f s: %.1f KB/s"
+        % (name, size, duration, size / 1024 / duration))
+
+print("write_chunk=%d read_chunk=%d buffer_len=%d"
+    % (eve.write_chunk, eve.read_chunk, eve.buffer_len))
+
+data = bytes(range(256)) * (TOTAL // 256)
+for chunk in (256, 1024, eve.write_chunk):
+    start = time.monotonic()
+    for offset in range(0, TOTAL, chunk):
+        eve.transfer_write(eve.RAM_G + offset, data[offset:offset + chunk])
+    report("write %d" % chunk, TOTAL, time.monotonic() - start)
+
+start = time.monotonic()
+eve.write_mem(eve.RAM_G, data)
+report("write_mem", TOTAL, time.monotonic() - start)
+
+start = time.monotonic()
+readback = eve.read_mem(eve.RAM_G, TOTAL)
+report("read_mem", TOTAL, time.monotonic() - start)
+print("readback", "ok" if readback == data else "MISMATCH")
+
+start = time.monotonic()
+for i in range(TOTAL // 8):
+    eve.cmd_memset(eve.RAM_G, i & 0xff, 4)
+eve.finish()
+report("command buffer", TOTAL // 8 * 16, time.monotonic() - start)
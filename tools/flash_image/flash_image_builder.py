@@ -0,0 +1,181 @@
+""" EVE flash image builder
+
+Packs the assets listed in a JSON manifest into one flash image:
+
+    python flash_image_builder.py manifest.json -o BT81X_Flash.bin
+
+The unified blob comes first, then the asset index read by
+BrtEveStorage.flash_index(), then the assets. A .map file is written
+next to the image, in the format of the EVE Asset Builder.
+"""
+import argparse
+import binascii
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../circuitPython/lib")))
+
+# pylint: disable=wrong-import-position
+from brteve.brt_eve_bt817_8 import BrtEve as EVE
+from brteve.brt_eve_storage.brt_eve_flash_index import FLASH_INDEX_ADDRESS, HEADER_SIZE, \
+    ENTRY_SIZE, pack_flash_index
+
+BLOB_SIZE = 4096
+# cmd_flashread, cmd_flashsource and ASTC bitmaps in flash need 64-byte aligned addresses
+READ_ALIGNMENT = 64
+# cmd_flashupdate erases and rewrites 4096-byte sectors
+SECTOR_SIZE = 4096
+
+DEFAULT_BLOB = os.path.join(os.path.dirname(__file__), "../uf2/BT817-unified.blob")
+
+# Known asset types, every one is read from flash with a 64-byte aligned address
+ASSET_TYPES = ("bitmap", "font", "video", "audio", "display_list", "raw")
+
+def align(value, alignment):
+    """ Round value up to a multiple of alignment"""
+    return (value + alignment - 1) // alignment * alignment
+
+def bitmap_format(value):
+    """ Bitmap format from the manifest: a number or the name of a BrtEve constant"""
+    if isinstance(value, int):
+        return value
+    return getattr(EVE, value)
+
+class Asset: # pylint: disable=too-few-public-methods
+    """ One manifest entry and its place in the image"""
+
+    def __init__(self, entry, base_dir):
+        self.name = entry["name"]
+        self.file = os.path.join(base_dir, entry["file"])
+        self.type = entry.get("type", "raw")
+        if self.type not in ASSET_TYPES:
+            raise ValueError("%s: unknown type %s" % (self.name, self.type))
+        self.format = bitmap_format(entry.get("format", 0))
+        self.width = entry.get("width", 0)
+        self.height = entry.get("height", 0)
+        # Frequently updated assets get sectors of their own, so re-flashing them
+        # with write_flash_diff leaves the other sectors untouched
+        self.volatile = entry.get("volatile", False)
+        self.alignment = max(READ_ALIGNMENT, entry.get("align", READ_ALIGNMENT))
+        if self.alignment % READ_ALIGNMENT:
+            raise ValueError("%s: align must be a multiple of %d" % (self.name, READ_ALIGNMENT))
+
+        with open(self.file, "rb") as file:
+            self.data = file.read()
+        self.crc = binascii.crc32(self.data)
+        self.addr = 0
+
+    def index_entry(self):
+        """ Entry of the flash index"""
+        return {'name':self.name, 'addr':self.addr, 'size':len(self.data),
+            'format':self.format, 'width':self.width, 'height':self.height, 'crc':self.crc}
+
+def layout(assets, start):
+    """ Give every asset its flash address
+        Stable assets come first, the largest alignments first so that no gap is
+        left between them. Volatile assets follow, each on whole sectors, so a size
+        change of one of them moves neither the stable assets nor their sectors.
+
+        :param assets: List of Asset
+        :param start: First free address after the index
+        :return: End of the image
+    """
+    stable = sorted((a for a in assets if not a.volatile), key=lambda a: -a.alignment)
+    volatile = [a for a in assets if a.volatile]
+
+    addr = start
+    for asset in stable:
+        addr = align(addr, asset.alignment)
+        asset.addr = addr
+        addr += len(asset.data)
+
+    for asset in volatile:
+        addr = align(addr, max(SECTOR_SIZE, asset.alignment))
+        asset.addr = addr
+        addr = align(addr + len(asset.data), SECTOR_SIZE)
+
+    return addr
+
+def build_image(manifest_file, blob_file=None):
+    """ Build the flash image of a manifest
+        :param manifest_file: Path of the JSON manifest
+        :param blob_file: Unified blob, overrides the one of the manifest
+        :return: Image bytes and the list of Asset, in flash order
+    """
+    with open(manifest_file, encoding="utf-8") as file:
+        manifest = json.load(file)
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+
+    names = set()
+    assets = []
+    for entry in manifest["assets"]:
+        if entry["name"] in names:
+            raise ValueError("Duplicate asset name: " + entry["name"])
+        names.add(entry["name"])
+        assets.append(Asset(entry, base_dir))
+
+    if blob_file is None:
+        blob_file = os.path.join(base_dir, manifest["blob"]) if "blob" in manifest else DEFAULT_BLOB
+    with open(blob_file, "rb") as file:
+        blob = file.read()
+    if len(blob) != BLOB_SIZE:
+        raise ValueError("The blob must be %d bytes: %s" % (BLOB_SIZE, blob_file))
+
+    # The index has sectors of its own: it changes whenever an asset does
+    index_size = align(HEADER_SIZE + ENTRY_SIZE * len(assets), SECTOR_SIZE)
+    end = layout(assets, FLASH_INDEX_ADDRESS + index_size)
+    assets.sort(key=lambda a: a.addr)
+
+    image = bytearray(b"\xff") * end
+    image[:BLOB_SIZE] = blob
+    index = pack_flash_index([a.index_entry() for a in assets])
+    image[FLASH_INDEX_ADDRESS:FLASH_INDEX_ADDRESS + len(index)] = index
+    for asset in assets:
+        image[asset.addr:asset.addr + len(asset.data)] = asset.data
+
+    return bytes(image), assets
+
+def write_map(map_file, assets, index_size):
+    """ Write the map: name, address and size of every item, one per line"""
+    rows = [("unified.blob", 0, BLOB_SIZE), ("index", FLASH_INDEX_ADDRESS, index_size)]
+    rows += [(a.name, a.addr, len(a.data)) for a in assets]
+    name_width = max(len(row[0]) for row in rows)
+    addr_width = max(len(str(row[1])) for row in rows)
+    with open(map_file, "w", encoding="utf-8") as file:
+        for name, addr, size in rows:
+            file.write("%s : %s : %d\n"
+                       % (name.ljust(name_width), str(addr).ljust(addr_width), size))
+
+def main():
+    """ Build the image, then print its layout"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 2)[1])
+    parser.add_argument("manifest", help="JSON manifest of the assets")
+    parser.add_argument("-o", "--output", default="BT81X_Flash.bin", help="Flash image to write")
+    parser.add_argument("--map", help="Map file to write, next to the image by default")
+    parser.add_argument("--blob", help="Unified blob, overrides the one of the manifest")
+    parser.add_argument("--flash-size-mb", type=int, default=16, help="Size of the target flash")
+    args = parser.parse_args()
+
+    image, assets = build_image(args.manifest, args.blob)
+    if len(image) > args.flash_size_mb * 1024 * 1024:
+        print("Image of %d bytes does not fit in %d MB of flash" % (len(image), args.flash_size_mb))
+        sys.exit(1)
+
+    with open(args.output, "wb") as file:
+        file.write(image)
+    map_file = args.map or os.path.splitext(args.output)[0] + ".map"
+    index_size = HEADER_SIZE + ENTRY_SIZE * len(assets)
+    write_map(map_file, assets, index_size)
+
+    payload = sum(len(a.data) for a in assets)
+    print("%-28s %10s %10s" % ("asset", "address", "size"))
+    for asset in assets:
+        print("%-28s %10d %10d%s" % (asset.name, asset.addr, len(asset.data),
+            " volatile" if asset.volatile else ""))
+    print("Image %d bytes, assets %d bytes, padding %d bytes" % (
+        len(image), payload, len(image) - payload - BLOB_SIZE - index_size))
+    print("Wrote", args.output, "and", map_file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+""" Simulated BT815/BT817 behind an SPI bus, for the Telemetrix emulator
+
+Models the memory map (RAM_G, RAM_DL, RAM_CMD, registers), the attached
+flash and the parts of the coprocessor the library depends on: command FIFO
+bookkeeping, display list, memory, flash, CRC and inflate commands.
+Widgets and drawing commands are parsed and skipped.
+"""
+import os
+import sys
+import time
+import struct
+import zlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             "../../circuitPython/lib")))
+
+from brteve.brt_eve_bt817_8 import BrtEve # pylint: disable=wrong-import-position
+
+EVE = BrtEve
+
+CMD_FIFO_SIZE = 4096
+CMD_FIFO_MASK = CMD_FIFO_SIZE - 1
+CMD_FIFO_MAX = 0xffc
+DL_SIZE = 8 * 1024
+MEMORY_SIZE = 0x30a000
+ROM_CHIPID = 0xc0000
+
+# Size in bytes of the arguments of each coprocessor command, as sent by brteve
+# Commands missing from this table take no argument
+CMD_ARG_SIZE = {
+    0x02: 4, 0x09: 4, 0x0a: 4, 0x0b: 16, 0x0c: 8, 0x0d: 12, 0x0e: 12, 0x0f: 16,
+    0x10: 16, 0x11: 16, 0x12: 12, 0x13: 16, 0x14: 16, 0x16: 8, 0x18: 12, 0x19: 8,
+    0x1a: 8, 0x1b: 12, 0x1c: 8, 0x1d: 12, 0x1e: 8, 0x1f: 4, 0x21: 52, 0x22: 4,
+    0x23: 4, 0x24: 8, 0x25: 12, 0x27: 8, 0x28: 8, 0x29: 4, 0x2b: 8, 0x2c: 12,
+    0x2d: 12, 0x2e: 12, 0x30: 16, 0x33: 24, 0x34: 4, 0x36: 4, 0x37: 16, 0x38: 4,
+    0x39: 8, 0x3a: 4, 0x3b: 12, 0x3c: 4, 0x3f: 8, 0x41: 8, 0x43: 12, 0x45: 8,
+    0x46: 12, 0x47: 12, 0x4a: 4, 0x4c: 4, 0x4d: 8, 0x4e: 4, 0x50: 8, 0x51: 16,
+    0x53: 12, 0x54: 4, 0x55: 12, 0x56: 4, 0x57: 16, 0x58: 4, 0x59: 8, 0x5a: 12,
+    0x60: 12, 0x62: 4, 0x63: 4, 0x64: 20, 0x65: 4, 0x67: 4, 0x68: 4, 0x6a: 12,
+    0x6b: 12, 0x6c: 8, 0x6d: 12,
+}
+
+# Commands followed by a string: offset of their options argument
+CMD_STRING_OPTIONS = {
+    0x0c: 6,  # cmd_text
+    0x0d: 10, # cmd_button
+    0x0e: 10, # cmd_keys
+    0x12: 10, # cmd_toggle
+}
+
+def align4(num):
+    """ Round num up to a multiple of 4"""
+    return (num + 3) & ~3
+
+class _Sink:
+    """ Consume the data following a command in the command FIFO"""
+
+    def __init__(self, size, on_data=None):
+        self.size = size
+        self.on_data = on_data
+        self.received = 0
+
+    def feed(self, data):
+        """ Consume up to the remaining size
+        :param data: Bytes available in the command FIFO
+        :return: Number of bytes consumed, and whether the sink is complete
+        """
+        num = min(len(data), self.size - self.received)
+        if self.on_data and num:
+            self.on_data(self.received, bytes(data[:num]))
+        self.received += num
+        return num, self.received == self.size
+
+class _StringSink(_Sink):
+    """ Consume a nul terminated string, padded to 4 bytes, and its format arguments"""
+
+    def __init__(self, options):
+        super().__init__(0)
+        self.options = options
+        self.text = b""
+        self.tail = None
+
+    def feed(self, data):
+        if self.tail is not None:
+            return self.tail.feed(data)
+
+        data = bytes(data)
+        end = data.find(b"\0")
+        if end < 0:
+            # Only whole words are consumed, the terminator comes later
+            num = len(data) & ~3
+            self.text += data[:num]
+            return num, False
+
+        self.text += data[:end]
+        num = align4(len(self.text) + 1) - (len(self.text) - end)
+        args = 0
+        if self.options & EVE.OPT_FORMAT:
+            args = self.text.replace(b"%%", b"").count(b"%")
+        self.tail = _Sink(4 * args)
+        done = args == 0
+        return num, done
+
+class _InflateSink:
+    """ Inflate a zlib stream to RAM_G"""
+
+    def __init__(self, model, dest):
+        self.model = model
+        self.dest = dest
+        self.decompressor = zlib.decompressobj()
+        self.consumed = 0
+
+    def feed(self, data):
+        """ Decompress the available data
+        :param data: Bytes available in the command FIFO
+        :return: Number of bytes consumed, and whether the stream ended
+        """
+        data = bytes(data)
+        out = self.decompressor.decompress(data)
+        self.model.write_memory(self.dest, out)
+        self.dest += len(out)
+        if not self.decompressor.eof:
+            self.consumed += len(data)
+            return len(data), False
+
+        used = len(data) - len(self.decompressor.unused_data)
+        padded = align4(self.consumed + used) - self.consumed
+        self.model.result_pointer = self.dest
+        return min(padded, len(data)), True
+
+class _ImageSink:
+    """ Skip a PNG or JPEG file, up to its end marker"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def feed(self, data):
+        """ Search the end marker in the available data
+        :param data: Bytes available in the command FIFO
+        :return: Number of bytes consumed, and whether the image ended
+        """
+        start = len(self.data)
+        self.data += data
+        for marker, extra in ((b"IEND", 8), (b"\xff\xd9", 2)):
+            end = self.data.find(marker, max(0, start - len(marker)))
+            if end >= 0 and len(self.data) >= end + extra:
+                size = align4(end + extra)
+                if len(self.data) >= size:
+                    return size - start, True
+        num = len(data) & ~3
+        del self.data[start + num:]
+        return num, False
+
+class EveModel: # pylint: disable=too-many-instance-attributes
+    """ BT815/BT817 register, memory and flash model, accessed as an SPI device
+
+    SPI transactions follow the EVE protocol: a 3 bytes address, with bit 23
+    set for writes, or a 3 bytes host command. Reads return a dummy byte first.
+    """
+
+    def __init__(self, flash_size=16 * 1024 * 1024, chip_id=0x0817, flash_rate=None):
+        self.memory = bytearray(MEMORY_SIZE)
+        self.flash = bytearray(b"\xff") * flash_size
+        self.chip_id = chip_id
+        # Flash programming speed in bytes per second, None for instant
+        self.flash_rate = flash_rate
+        # Command in progress: completion time, action and read pointer after the command
+        self.busy = None
+        self.start_time = time.monotonic()
+        self.result_pointer = 0
+        self.flash_source = 0
+        self.sink = None
+
+        self.selected = False
+        self.header = bytearray()
+        self.mode = None
+        self.address = 0
+        self.dummy_pending = False
+
+        self.stats = {"commands": 0, "faults": 0, "host_commands": 0}
+        self.reset()
+
+    def reset(self):
+        """ Core reset: registers to their default value"""
+        self.memory[EVE.RAM_DL:EVE.RAM_DL + DL_SIZE] = bytes(DL_SIZE)
+        self.memory[0x302000:0x303000] = bytes(0x1000)
+        self.memory[0x309000:MEMORY_SIZE] = bytes(MEMORY_SIZE - 0x309000)
+        # Chip ID bytes: 0x08, chip number, 0x01, 0x00
+        struct.pack_into("<I", self.memory, ROM_CHIPID,
+                         0x00010000 | (self.chip_id & 0xff) << 8 | self.chip_id >> 8)
+        self.set_reg(EVE.REG_ID, 0x7c)
+        self.set_reg(EVE.REG_FLASH_SIZE, len(self.flash) >> 20)
+        self.set_reg(EVE.REG_FLASH_STATUS, EVE.FLASH_STATUS_DETACHED)
+        self.reset_coprocessor()
+
+    def reset_coprocessor(self):
+        """ Empty the command FIFO and drop any pending command"""
+        self.sink = None
+        self.busy = None
+        self.set_reg(EVE.REG_CMD_READ, 0)
+        self.set_reg(EVE.REG_CMD_WRITE, 0)
+        self.set_reg(EVE.REG_CMD_DL, 0)
+        self.set_reg(EVE.REG_CMDB_SPACE, CMD_FIFO_MAX)
+
+    def reg(self, address):
+        """ Read a 32 bits register"""
+        return struct.unpack_from("<I", self.memory, address)[0]
+
+    def set_reg(self, address, value):
+        """ Write a 32 bits register"""
+        struct.pack_into("<I", self.memory, address, value & 0xffffffff)
+
+    # SPI device
+
+    def spi_select(self):
+        """ Chip select asserted: a new transaction starts"""
+        self.selected = True
+        self.header = bytearray()
+        self.mode = None
+
+    def spi_deselect(self):
+        """ Chip select released: host commands run at the end of the transaction"""
+        if self.selected and len(self.header) == 3:
+            if self.mode == "command" or (self.mode == "read" and self.dummy_pending
+                                          and self.header[0] == 0):
+                self.host_command(self.header[0], self.header[1])
+        self.selected = False
+
+    def spi_write(self, data):
+        """ Bytes clocked out by the host"""
+        if not self.selected:
+            return
+        data = memoryview(data)
+        if len(self.header) < 3:
+            num = 3 - len(self.header)
+            self.header += data[:num]
+            data = data[num:]
+            if len(self.header) < 3:
+                return
+            self.address = int.from_bytes(self.header, "big") & 0x3fffff
+            self.mode = ("read", "command", "write", "command")[self.header[0] >> 6]
+            self.dummy_pending = True
+
+        if self.mode == "write" and len(data):
+            self.write_memory(self.address, data)
+            if self.address != EVE.REG_CMDB_WRITE:
+                self.address += len(data)
+
+    def spi_read(self, num):
+        """ Bytes clocked in by the host"""
+        if not self.selected or self.mode != "read":
+            return bytes(num)
+        out = bytearray()
+        if self.dummy_pending:
+            self.dummy_pending = False
+            out.append(0)
+            num -= 1
+        if num > 0:
+            out += self.read_memory(self.address, num)
+            self.address += num
+        return bytes(out)
+
+    def host_command(self, command, parameter):
+        """ Run a host command"""
+        self.stats["host_commands"] += 1
+        if command == EVE.CORERST:
+            self.reset()
+
+    # Memory map
+
+    def read_memory(self, address, num):
+        """ Read from the memory map, registers are updated first"""
+        if self.busy:
+            self.run_coprocessor()
+        now = time.monotonic() - self.start_time
+        self.set_reg(EVE.REG_FRAMES, int(now * 60))
+        self.set_reg(EVE.REG_CLOCK, int(now * 72000000))
+        if address + num > MEMORY_SIZE:
+            return bytes(num)
+        return bytes(self.memory[address:address + num])
+
+    def write_memory(self, address, data):
+        """ Write to the memory map, with the side effects of the registers"""
+        if address == EVE.REG_CMDB_WRITE:
+            self.cmdb_write(data)
+            return
+        if address + len(data) > MEMORY_SIZE:
+            return
+        self.memory[address:address + len(data)] = data
+
+        if address <= EVE.REG_CMD_WRITE < address + len(data):
+            self.run_coprocessor()
+        if address <= EVE.REG_CPURESET < address + len(data):
+            if self.memory[EVE.REG_CPURESET] & 1:
+                self.reset_coprocessor()
+
+    # Coprocessor
+
+    def cmd_space(self):
+        """ Free space in the command FIFO"""
+        fullness = (self.reg(EVE.REG_CMD_WRITE) - self.reg(EVE.REG_CMD_READ)) & CMD_FIFO_MASK
+        return CMD_FIFO_MAX - fullness
+
+    def cmdb_write(self, data):
+        """ Append data to the command FIFO, like a write to REG_CMDB_WRITE"""
+        data = bytes(data)
+        while data:
+            num = min(len(data), self.cmd_space())
+            if num == 0:
+                self.fault()
+                return
+            write_pointer = self.reg(EVE.REG_CMD_WRITE)
+            first = min(num, CMD_FIFO_SIZE - write_pointer)
+            base = EVE.RAM_CMD
+            self.memory[base + write_pointer:base + write_pointer + first] = data[:first]
+            self.memory[base:base + num - first] = data[first:num]
+            self.set_reg(EVE.REG_CMD_WRITE, (write_pointer + num) & CMD_FIFO_MASK)
+            data = data[num:]
+            self.run_coprocessor()
+
+    def fault(self):
+        """ Coprocessor fault, signaled by REG_CMD_READ = 0xfff"""
+        self.stats["faults"] += 1
+        self.sink = None
+        self.set_reg(EVE.REG_CMD_READ, 0xfff)
+        self.set_reg(EVE.REG_CMDB_SPACE, 0xfff)
+
+    def fifo_bytes(self, offset, num):
+        """ Read num bytes of the command FIFO ring at offset"""
+        base = EVE.RAM_CMD
+        offset &= CMD_FIFO_MASK
+        if offset + num <= CMD_FIFO_SIZE:
+            return bytes(self.memory[base + offset:base + offset + num])
+        first = CMD_FIFO_SIZE - offset
+        return (bytes(self.memory[base + offset:base + CMD_FIFO_SIZE])
+                + bytes(self.memory[base:base + num - first]))
+
+    def run_coprocessor(self):
+        """ Execute every complete command between REG_CMD_READ and REG_CMD_WRITE"""
+        if self.reg(EVE.REG_CMD_READ) == 0xfff:
+            return
+        if self.busy:
+            done_at, action, end_pointer = self.busy
+            if time.monotonic() < done_at:
+                self.set_reg(EVE.REG_CMDB_SPACE, self.cmd_space())
+                return
+            self.busy = None
+            action()
+            if end_pointer is not None:
+                self.set_reg(EVE.REG_CMD_READ, end_pointer)
+
+        while not self.busy:
+            read_pointer = self.reg(EVE.REG_CMD_READ)
+            available = (self.reg(EVE.REG_CMD_WRITE) - read_pointer) & CMD_FIFO_MASK
+            if self.sink:
+                # Feed the contiguous part of the ring only
+                available = min(available, CMD_FIFO_SIZE - read_pointer)
+                num, done = self.sink.feed(self.fifo_bytes(read_pointer, available))
+                self.set_reg(EVE.REG_CMD_READ, (read_pointer + num) & CMD_FIFO_MASK)
+                if done:
+                    self.sink = None
+                elif num == 0:
+                    break
+                continue
+
+            if available < 4:
+                break
+            word = struct.unpack("<I", self.fifo_bytes(read_pointer, 4))[0]
+            if word & 0xffffff00 != 0xffffff00:
+                self.display_list(word)
+                self.set_reg(EVE.REG_CMD_READ, (read_pointer + 4) & CMD_FIFO_MASK)
+                continue
+
+            opcode = word & 0xff
+            size = 4 + CMD_ARG_SIZE.get(opcode, 0)
+            if available < size:
+                break
+            args = self.fifo_bytes(read_pointer + 4, size - 4)
+            self.set_reg(EVE.REG_CMD_READ, (read_pointer + size) & CMD_FIFO_MASK)
+            self.stats["commands"] += 1
+            self.command(opcode, args, read_pointer + 4)
+            if self.reg(EVE.REG_CMD_READ) == 0xfff:
+                return
+
+        self.set_reg(EVE.REG_CMDB_SPACE, self.cmd_space())
+
+    def display_list(self, word):
+        """ Append a word to the display list"""
+        offset = self.reg(EVE.REG_CMD_DL) & (DL_SIZE - 1)
+        struct.pack_into("<I", self.memory, EVE.RAM_DL + offset, word)
+        self.set_reg(EVE.REG_CMD_DL, (offset + 4) & (DL_SIZE - 1))
+
+    def set_result(self, args_offset, index, value):
+        """ Write a result in place of the argument at index, like the coprocessor does"""
+        address = EVE.RAM_CMD + ((args_offset + 4 * index) & CMD_FIFO_MASK)
+        struct.pack_into("<I", self.memory, address, value & 0xffffffff)
+
+    def command(self, opcode, args, args_offset): # pylint: disable=too-many-branches,too-many-statements
+        """ Execute one coprocessor command
+        :param opcode: Command number, the low byte of 0xffffffxx
+        :param args: Argument bytes
+        :param args_offset: Offset of the arguments in the command FIFO ring
+        """
+        words = struct.unpack("<%dI" % (len(args) // 4), args)
+        flash = self.flash
+        memory = self.memory
+
+        if opcode == 0x00:   # cmd_dlstart
+            self.set_reg(EVE.REG_CMD_DL, 0)
+        elif opcode == 0x15: # cmd_coldstart
+            self.set_reg(EVE.REG_CMD_DL, 0)
+        elif opcode in CMD_STRING_OPTIONS:
+            options = struct.unpack_from("<H", args, CMD_STRING_OPTIONS[opcode])[0]
+            self.sink = _StringSink(options)
+        elif opcode == 0x18: # cmd_memcrc
+            ptr, num = words[0], words[1]
+            self.set_result(args_offset, 2, zlib.crc32(memory[ptr:ptr + num]))
+        elif opcode == 0x19: # cmd_regread
+            self.set_result(args_offset, 1, self.reg(words[0]))
+        elif opcode == 0x1a: # cmd_memwrite
+            ptr, num = words
+            self.sink = _Sink(align4(num),
+                lambda offset, data: self.write_memory(ptr + offset, data[:max(0, num - offset)]))
+        elif opcode == 0x1b: # cmd_memset
+            ptr, value, num = words
+            memory[ptr:ptr + num] = bytes([value & 0xff]) * num
+        elif opcode == 0x1c: # cmd_memzero
+            ptr, num = words
+            memory[ptr:ptr + num] = bytes(num)
+        elif opcode == 0x1d: # cmd_memcpy
+            dest, src, num = words
+            memory[dest:dest + num] = memory[src:src + num]
+        elif opcode == 0x1e: # cmd_append
+            ptr, num = words
+            for i in range(0, num, 4):
+                self.display_list(struct.unpack_from("<I", memory, ptr + i)[0])
+        elif opcode == 0x22: # cmd_inflate
+            self.sink = _InflateSink(self, words[0])
+        elif opcode == 0x50: # cmd_inflate2
+            if words[1] & EVE.OPT_FLASH:
+                self.inflate_from(words[0], bytes(flash[self.flash_source:]))
+            elif not words[1] & EVE.OPT_MEDIAFIFO:
+                self.sink = _InflateSink(self, words[0])
+        elif opcode == 0x23: # cmd_getptr
+            self.set_result(args_offset, 0, self.result_pointer)
+        elif opcode == 0x24: # cmd_loadimage
+            if not words[1] & (EVE.OPT_MEDIAFIFO | EVE.OPT_FLASH):
+                self.sink = _ImageSink()
+        elif opcode == 0x3a: # cmd_playvideo
+            if not words[0] & (EVE.OPT_MEDIAFIFO | EVE.OPT_FLASH):
+                self.fault()
+        elif opcode == 0x39: # cmd_mediafifo
+            self.set_reg(EVE.REG_MEDIAFIFO_READ, 0)
+            self.set_reg(EVE.REG_MEDIAFIFO_WRITE, 0)
+        elif opcode == 0x44: # cmd_flasherase
+            def erase():
+                flash[:] = b"\xff" * len(flash)
+            self.delay(len(flash), erase, args_offset)
+        elif opcode == 0x45: # cmd_flashwrite
+            ptr, num = words
+            def program(offset, data):
+                self.flash_program(ptr + offset, data)
+                if self.flash_rate:
+                    # Hold the following data until this part is programmed
+                    self.busy = (time.monotonic() + len(data) / self.flash_rate, lambda: None, None)
+            self.sink = _Sink(align4(num), program)
+        elif opcode == 0x46: # cmd_flashread
+            dest, src, num = words
+            memory[dest:dest + num] = flash[src:src + num]
+        elif opcode == 0x47: # cmd_flashupdate
+            dest, src, num = words
+            def update():
+                flash[dest:dest + num] = memory[src:src + num]
+            self.delay(num, update, args_offset)
+        elif opcode == 0x48: # cmd_flashdetach
+            self.set_reg(EVE.REG_FLASH_STATUS, EVE.FLASH_STATUS_DETACHED)
+        elif opcode == 0x49: # cmd_flashattach
+            self.set_reg(EVE.REG_FLASH_STATUS, EVE.FLASH_STATUS_BASIC)
+        elif opcode == 0x4a: # cmd_flashfast
+            self.set_reg(EVE.REG_FLASH_STATUS, EVE.FLASH_STATUS_FULL)
+            self.set_result(args_offset, 0, 0)
+        elif opcode == 0x4c: # cmd_flashspitx
+            self.sink = _Sink(align4(words[0]))
+        elif opcode == 0x4e: # cmd_flashsource
+            self.flash_source = words[0]
+
+    def delay(self, flash_bytes, action, args_offset):
+        """ Run a flash command after the time it takes to program flash_bytes
+            REG_CMD_READ stays on the command meanwhile, and RAM_G is read at the end.
+        """
+        if not self.flash_rate:
+            action()
+            return
+        end_pointer = self.reg(EVE.REG_CMD_READ)
+        self.set_reg(EVE.REG_CMD_READ, (args_offset - 4) & CMD_FIFO_MASK)
+        self.busy = (time.monotonic() + flash_bytes / self.flash_rate, action, end_pointer)
+
+    def flash_program(self, address, data):
+        """ Program flash, bits can only go from 1 to 0"""
+        data = data[:max(0, len(self.flash) - address)]
+        old = int.from_bytes(self.flash[address:address + len(data)], "little")
+        new = old & int.from_bytes(data, "little")
+        self.flash[address:address + len(data)] = new.to_bytes(len(data), "little")
+
+    def inflate_from(self, dest, data):
+        """ Inflate a complete zlib stream to RAM_G"""
+        decompressor = zlib.decompressobj()
+        out = decompressor.decompress(data)
+        self.write_memory(dest, out)
+        self.result_pointer = dest + len(out)
@@ -0,0 +1,286 @@
+""" Telemetrix4RpiPico emulator over a pseudo-terminal
+
+Speaks the Telemetrix serial protocol of the Pico firmware, with an
+emulated EVE on SPI0, so BrtEveTelemetrix can run and be benchmarked
+without hardware:
+
+    python telemetrix_emulator.py --link /tmp/ttyPICO --byte-latency-us 10
+
+then connect the client to the port:
+
+    host = BrtEveTelemetrix(com_port="/tmp/ttyPICO")
+
+Linux and macOS only, Windows has no pseudo-terminal.
+"""
+import argparse
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
+    "../../circuitPython/lib/brteve/telemetrix_rpi_pico")))
+
+# pylint: disable=wrong-import-position
+from private_constants import PrivateConstants
+from eve_model import EveModel
+
+# Pin of the EVE chip select, as wired by brt_eve_telemetrix
+EVE_CS_PIN = 5
+
+# GPIOs of the RP2040 SPI functions, per port: clock, MOSI (TX) and MISO (RX)
+SPI_PINS = {
+    0: ((2, 6, 18, 22), (3, 7, 19, 23), (0, 4, 16, 20)),
+    1: ((10, 14, 26), (11, 15, 27), (8, 12, 24, 28)),
+}
+
+class TelemetrixEmulator: # pylint: disable=too-many-instance-attributes
+    """ Serve the Telemetrix protocol on a pseudo-terminal
+
+    :param eve: EveModel connected to SPI0, a BT817 with 16 MB flash by default
+    :param byte_latency: Seconds spent per byte on the serial link, both ways
+    :param message_latency: Seconds spent per command, such as a USB frame turnaround
+    :param pico_id: Unique ID reported to the client
+    :param firmware_version: (major, minor) reported to the client
+    :param link: Optional path of a symlink to the pseudo-terminal
+    """
+
+    def __init__(self, eve=None, byte_latency=0.0, message_latency=0.0,
+                 pico_id=bytes(range(1, 9)), firmware_version=(1, 1), link=None):
+        self.eve = eve if eve is not None else EveModel()
+        self.byte_latency = byte_latency
+        self.message_latency = message_latency
+        self.pico_id = bytes(pico_id)
+        self.firmware_version = firmware_version
+        self.link = link
+
+        self.master = None
+        self.slave = None
+        self.port_name = None
+        self.thread = None
+        self.running = False
+
+        self.stats = {"messages": 0, "bytes_in": 0, "bytes_out": 0,
+                      "spi_written": 0, "spi_read": 0}
+        # SPI configuration of each port set up by SPI_INIT: pins, frequency, chip selects
+        self.spi = {}
+        # Protocol errors of the client, such as SPI traffic on a port never set up
+        self.errors = []
+
+        self.command_dispatch = {
+            PrivateConstants.LOOP_COMMAND: self._loop_back,
+            PrivateConstants.GET_FIRMWARE_VERSION: self._firmware_version,
+            PrivateConstants.RETRIEVE_PICO_UNIQUE_ID: self._unique_id,
+            PrivateConstants.SPI_INIT: self._spi_init,
+            PrivateConstants.SPI_SET_FORMAT: self._spi_set_format,
+            PrivateConstants.SPI_WRITE_BLOCKING: self._spi_write,
+            PrivateConstants.SPI_READ_BLOCKING: self._spi_read,
+            PrivateConstants.SPI_CS_CONTROL: self._spi_cs_control,
+        }
+
+    def start(self):
+        """ Open the pseudo-terminal and serve it from a thread
+        :return: Path of the serial port to give to the client
+        """
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        if self.link:
+            if os.path.lexists(self.link):
+                os.remove(self.link)
+            os.symlink(self.port_name, self.link)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        return self.link or self.port_name
+
+    def stop(self):
+        """ Stop serving and close the pseudo-terminal"""
+        self.running = False
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def _serve(self):
+        """ Read frames: 0xee, length lsb, length msb, command, parameters..."""
+        buffer = bytearray()
+        while self.running:
+            try:
+                data = os.read(self.master, 64 * 1024)
+            except OSError:
+                return
+            buffer += data
+            self.stats["bytes_in"] += len(data)
+
+            while len(buffer) >= 3:
+                if buffer[0] != 0xee:
+                    # Not synchronised, drop up to the next frame marker
+                    del buffer[0]
+                    continue
+                length = buffer[1] | buffer[2] << 8
+                if len(buffer) < 3 + length:
+                    break
+                command = bytes(buffer[3:3 + length])
+                del buffer[:3 + length]
+                self._handle(command)
+
+    def _handle(self, command):
+        """ Execute one command and send its report, after the link latency"""
+        self.stats["messages"] += 1
+        handler = self.command_dispatch.get(command[0])
+        report = handler(command[1:]) if handler else None
+
+        delay = self.message_latency + self.byte_latency * (3 + len(command))
+        if report:
+            delay += self.byte_latency * len(report)
+        if delay > 0:
+            time.sleep(delay)
+
+        if report:
+            self._send_report(report)
+
+    def _send_report(self, report):
+        """ Reports are prefixed with their length, on one byte"""
+        packet = bytes([len(report)]) + report
+        self.stats["bytes_out"] += len(packet)
+        try:
+            os.write(self.master, packet)
+        except OSError:
+            pass
+
+    def _error(self, message):
+        """ Record a protocol error of the client, the command is not executed"""
+        self.errors.append(message)
+        print("telemetrix emulator:", message, file=sys.stderr)
+
+    def _loop_back(self, data):
+        return bytes([PrivateConstants.LOOP_COMMAND, data[0]])
+
+    def _firmware_version(self, _data):
+        return bytes([PrivateConstants.FIRMWARE_REPORT]) + bytes(self.firmware_version)
+
+    def _unique_id(self, _data):
+        return bytes([PrivateConstants.UNIQUE_ID_REPORT]) + self.pico_id
+
+    def _spi_init(self, data):
+        """ [port, mosi, miso, clock, frequency (4 bytes, msb first), cs count, cs pins...]"""
+        if len(data) < 9 or len(data) < 9 + data[8]:
+            self._error("SPI_INIT: truncated command %s" % data.hex())
+            return None
+        port, mosi, miso, clock = data[0], data[1], data[2], data[3]
+        frequency = int.from_bytes(data[4:8], "big")
+        chip_selects = list(data[9:9 + data[8]])
+        if port not in SPI_PINS:
+            self._error("SPI_INIT: no SPI port %d" % port)
+            return None
+        clock_pins, mosi_pins, miso_pins = SPI_PINS[port]
+        if clock not in clock_pins or mosi not in mosi_pins or miso not in miso_pins:
+            self._error("SPI_INIT: clock %d, MOSI %d, MISO %d are not pins of SPI%d"
+                        % (clock, mosi, miso, port))
+            return None
+        if not chip_selects or frequency == 0:
+            self._error("SPI_INIT: SPI%d without chip select or clock frequency" % port)
+            return None
+        if port == 0 and EVE_CS_PIN not in chip_selects:
+            self._error("SPI_INIT: EVE chip select %d missing from %s" % (EVE_CS_PIN, chip_selects))
+
+        self.spi[port] = {"mosi": mosi, "miso": miso, "clock": clock,
+                          "frequency": frequency, "chip_selects": chip_selects,
+                          "data_bits": 8, "polarity": 0, "phase": 0}
+        return None
+
+    def _spi_set_format(self, data):
+        """ [port, data bits, polarity, phase]"""
+        config = self._spi_config(data[0], "SPI_SET_FORMAT")
+        if config is not None:
+            config["data_bits"], config["polarity"], config["phase"] = data[1], data[2], data[3]
+        return None
+
+    def _spi_config(self, port, command):
+        """ Configuration of an SPI port, None with an error if SPI_INIT did not set it up"""
+        config = self.spi.get(port)
+        if config is None:
+            self._error("%s: SPI%d used before SPI_INIT" % (command, port))
+        return config
+
+    def _spi_cs_control(self, data):
+        """ [pin, select], select = 0 asserts the chip select"""
+        pin, select = data[0], data[1]
+        if not any(pin in config["chip_selects"] for config in self.spi.values()):
+            self._error("SPI_CS_CONTROL: pin %d is not a chip select set up by SPI_INIT" % pin)
+            return None
+        if pin != EVE_CS_PIN:
+            return None
+        if select:
+            self.eve.spi_deselect()
+        else:
+            self.eve.spi_select()
+        return None
+
+    def _spi_write(self, data):
+        """ [port, length lsb, length msb, data...], acknowledged with an empty SPI report"""
+        port = data[0]
+        length = data[1] | data[2] << 8
+        payload = data[3:3 + length]
+        if self._spi_config(port, "SPI_WRITE_BLOCKING") is None:
+            return bytes([PrivateConstants.SPI_REPORT, port, 0])
+        if port == 0:
+            self.eve.spi_write(payload)
+        self.stats["spi_written"] += len(payload)
+        return bytes([PrivateConstants.SPI_REPORT, port, 0])
+
+    def _spi_read(self, data):
+        """ [port, length lsb, length msb, repeated tx], answered with the data read"""
+        port = data[0]
+        length = data[1] | data[2] << 8
+        # The report length is one byte: type, port and count come first
+        length = min(length, 255 - 3)
+        if self._spi_config(port, "SPI_READ_BLOCKING") is None:
+            # Nothing drives MISO
+            return bytes([PrivateConstants.SPI_REPORT, port, length]) + bytes(length)
+        payload = self.eve.spi_read(length) if port == 0 else bytes(length)
+        self.stats["spi_read"] += len(payload)
+        return bytes([PrivateConstants.SPI_REPORT, port, len(payload)]) + payload
+
+def main():
+    """ Run the emulator until interrupted, then print the link statistics"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--link", help="Symlink to create to the pseudo-terminal")
+    parser.add_argument("--byte-latency-us", type=float, default=0.0,
+                        help="Serial link time per byte, in microseconds")
+    parser.add_argument("--message-latency-us", type=float, default=0.0,
+                        help="Turnaround time per command, in microseconds")
+    parser.add_argument("--flash-size-mb", type=int, default=16,
+                        help="Size of the emulated EVE flash")
+    parser.add_argument("--flash-kbps", type=float, default=0,
+                        help="Flash programming speed in KB/s, 0 for instant")
+    parser.add_argument("--chip", choices=("bt815", "bt816", "bt817", "bt818"),
+                        default="bt817", help="Chip ID reported at ROM_CHIPID")
+    args = parser.parse_args()
+
+    eve = EveModel(flash_size=args.flash_size_mb * 1024 * 1024,
+                   chip_id=int(args.chip[2:], 16),
+                   flash_rate=args.flash_kbps * 1024 or None)
+    emulator = TelemetrixEmulator(eve, args.byte_latency_us / 1e6,
+                                  args.message_latency_us / 1e6, link=args.link)
+    print("Telemetrix emulator on", emulator.start())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        print(emulator.stats)
+        print(eve.stats)
+        if emulator.errors:
+            print("%d protocol errors, first: %s" % (len(emulator.errors), emulator.errors[0]))
+
+if __name__ == "__main__":
+    main()